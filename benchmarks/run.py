@@ -0,0 +1,186 @@
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Callable
+import json
+import platform
+import subprocess
+import sys
+import time
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import bs4
+
+from model import parser
+from model.database import Database
+from model.logger import logging
+from model.utils import extract_id, is_error
+
+
+FIXTURES = Path(__file__).resolve().parent.parent / 'tests' / 'fixtures'
+BACKENDS = ['html.parser'] + (['lxml'] if parser.DEFAULT_BACKEND == 'lxml' else [])
+
+PAGES = [
+    ('parse_track', parser.parse_track, 'track.html', 'ts3w7z5wq9t1h9'),
+    ('parse_track_multi', parser.parse_track, 'track_multi.html', 'tsvq3zb5qew1qh'),
+    ('parse_video', parser.parse_video, 'video.html', 'vs3zvdrrq12maa'),
+    ('parse_album', parser.parse_album, 'album.html', 'xsswv5zqq92h1e'),
+    ('parse_artist', parser.parse_artist, 'artist.html', 'zss7twqsqtf9e4'),
+]
+TABS = [('tab_music.html', 'music'), ('tab_album.html', 'album'), ('tab_video.html', 'video')]
+URLS = [
+    'https://chiasenhac.vn/mp3/ngo-kien-huy-thu-thuy/dinh-menh-ta-gap-nhau-ts36t0tbqkfnfq.html',
+    'https://chiasenhac.vn/nghe-album/cham-tay-vao-dieu-uoc-xssmqqr0q8eean.html',
+    'https://chiasenhac.vn/ca-si/khanh-phuong-zsswzmq7q918et.html',
+    'https://chiasenhac.vn/hd/video/us-uk-video-clip/tones-and-i-dance-monkey-vs3zvdrrq12maa.html',
+]
+DB_ROWS = 20000
+DB_BENCHMARKS = ('db_executemany', 'db_execute', 'db_select_scan', 'db_select_point')
+
+
+def fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding='utf-8')
+
+
+def measure(func: Callable, min_time: float, repeat: int) -> float:
+    """Return the best calls per second of `func` over `repeat` runs of at least `min_time` seconds."""
+    # Calibrate the number of calls per run
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= min_time:
+            break
+        number *= 2
+
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = max(best, number / (time.perf_counter() - start))
+    return best
+
+
+def parser_benchmarks() -> dict:
+    # Mapping of name to (unit, function)
+    cases = {}
+    for backend in BACKENDS:
+        for name, func, page, item_id in PAGES:
+            text = fixture(page)
+            cases[f'{name}[{backend}]'] = ('pages/s', lambda func=func, text=text, item_id=item_id, backend=backend: func(text, item_id, backend))
+        for page, tab in TABS:
+            text = fixture(page)
+            cases[f'parse_tab_{tab}[{backend}]'] = ('pages/s', lambda text=text, tab=tab, backend=backend: parser.parse_tab(text, tab, backend))
+    return cases
+
+
+def util_benchmarks() -> dict:
+    containers = []
+    for page in ('track.html', 'error.html'):
+        soup = parser.make_soup(fixture(page), parser.PAGE_STRAINER)
+        containers.append(soup.findChildren(class_='wrapper_content')[0].findChildren(class_='container', recursive=False)[0])
+
+    return {
+        'extract_id': ('calls/s', lambda: [extract_id(url) for url in URLS], len(URLS)),
+        'is_error': ('calls/s', lambda: [is_error(container) for container in containers], len(containers)),
+    }
+
+
+def database_benchmarks(repeat: int) -> dict:
+    rows = [(f'ts{i}', f'Track {i}', f'xs{i % 100}') for i in range(DB_ROWS)]
+    results = {}
+    with TemporaryDirectory() as temp_dir:
+        for run in range(repeat):
+            db = Database(str(Path(temp_dir) / f'bench{run}.db'))
+            db.flush()
+
+            start = time.perf_counter()
+            db.executemany('INSERT INTO tracks (id, name, album_id) VALUES (?, ?, ?)', rows)
+            db.flush()
+            bulk = DB_ROWS / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for row in rows[:DB_ROWS // 4]:
+                db.execute('INSERT OR REPLACE INTO tracks (id, name, album_id) VALUES (?, ?, ?)', row)
+            db.flush()
+            single = DB_ROWS // 4 / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            n = sum(1 for _ in db.select('SELECT id, name, album_id FROM tracks'))
+            scan = n / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for i in range(1000):
+                db.is_downloaded(f'ts{i}')
+            point = 1000 / (time.perf_counter() - start)
+
+            db.close()
+            db.join()
+            for name, value in zip(DB_BENCHMARKS, (bulk, single, scan, point)):
+                results[name] = max(results.get(name, 0.0), value)
+
+    units = ('rows/s', 'rows/s', 'rows/s', 'queries/s')
+    return {name: (unit, results[name]) for name, unit in zip(DB_BENCHMARKS, units)}
+
+
+def commit_hash() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).resolve().parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args):
+    # Keep table creation and other progress messages out of the results
+    logging.disable(logging.WARNING)
+    results = {}
+
+    def record(name: str, unit: str, value: float):
+        results[name] = {'value': round(value, 2), 'unit': unit}
+        print(f'{name:<32} {value:>14,.1f} {unit}')
+
+    for name, (unit, func) in parser_benchmarks().items():
+        if args.filter in name:
+            record(name, unit, measure(func, args.min_time, args.repeat))
+    for name, (unit, func, calls) in util_benchmarks().items():
+        if args.filter in name:
+            record(name, unit, measure(func, args.min_time, args.repeat) * calls)
+    if any(args.filter in name for name in DB_BENCHMARKS):
+        for name, (unit, value) in database_benchmarks(args.repeat).items():
+            if args.filter in name:
+                record(name, unit, value)
+
+    report = {
+        'commit': commit_hash(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'bs4': bs4.__version__,
+        'results': results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding='utf-8')
+
+    if args.compare:
+        base = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+        print(f'\nCompared to {base.get("commit")}:')
+        for name, result in results.items():
+            if name in base['results']:
+                ratio = result['value'] / base['results'][name]['value']
+                print(f'{name:<32} {ratio:>8.2f}x')
+
+
+if __name__ == '__main__':
+    argparser = ArgumentParser(description='Offline benchmarks of parsing, ID extraction and database access on the test fixtures.')
+    argparser.add_argument('--output', '-o', type=str, help='Write results as JSON to this file', default=None)
+    argparser.add_argument('--compare', type=str, help='JSON results of another commit to compare with', default=None)
+    argparser.add_argument('--filter', '-k', type=str, help='Only run benchmarks whose name contains this string', default='')
+    argparser.add_argument('--min-time', type=float, help='Minimum duration of each run in seconds', default=0.2)
+    argparser.add_argument('--repeat', type=int, help='Number of runs, the best one is reported', default=5)
+
+    main(argparser.parse_args())
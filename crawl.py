@@ -0,0 +1,58 @@
+from argparse import ArgumentParser
+
+from model.crawler import Crawler, url_kind
+from model.database import Database
+from model.metrics import enable_metrics
+from model.session import get_session
+from model.utils import enable_cache
+
+
+def main(args):
+    # Unsupported start URLs raise ValueError before the database is opened
+    for url in args.urls:
+        url_kind(url)
+
+    cache = enable_cache(args.cache_dir) if args.cache_dir else None
+    metrics = enable_metrics() if args.metrics else None
+    database = Database(args.database)
+    try:
+        crawler = Crawler(
+            database,
+            max_workers=args.workers,
+            max_depth=args.max_depth,
+            videos=not args.no_videos,
+            follow_artists=not args.no_follow_artists,
+            checkpoint_interval=args.checkpoint_interval
+        )
+        crawler.seed(args.urls)
+        stats = crawler.run(args.limit, args.retry_failed)
+
+        print(
+            f'Crawled {stats["done"]} pages, {stats["missing"]} not found, {stats["failed"]} failed '
+            f'in {stats["elapsed"]:.1f}s.'
+        )
+        print(f'Frontier: {database.get_crawl_stats()}')
+        print(f'Rate limits: {get_session().rate_limiter.stats()}')
+        if cache is not None:
+            print(f'Page cache: {cache.stats()}')
+        if metrics is not None:
+            metrics.write(args.metrics)
+    finally:
+        database.close()
+        database.join()
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Crawl catalog metadata of chiasenhac.vn into a database. Resumes an interrupted crawl of the same database.')
+    parser.add_argument('urls', type=str, nargs='*', help='Start URLs of artists, albums, tracks or videos')
+    parser.add_argument('--database', type=str, help='SQLite database storing the catalog and the crawl frontier', required=True)
+    parser.add_argument('--workers', type=int, help='Number of pages crawled concurrently', default=8)
+    parser.add_argument('--max-depth', type=int, help='Do not follow links of pages at this depth (start pages have depth 0)', default=None)
+    parser.add_argument('--limit', type=int, help='Stop after crawling this many pages', default=None)
+    parser.add_argument('--checkpoint-interval', type=int, help='Number of pages crawled between checkpoints', default=200)
+    parser.add_argument('--no-videos', action='store_true', help='Do not crawl videos of artists')
+    parser.add_argument('--no-follow-artists', action='store_true', help='Do not crawl artists of crawled tracks and videos')
+    parser.add_argument('--retry-failed', action='store_true', help='Crawl pages that failed in a previous run again')
+    parser.add_argument('--cache-dir', type=str, help='Cache fetched pages in this directory', default=None)
+    parser.add_argument('--metrics', type=str, help='Write request, download and parse metrics to this file (Prometheus text, or JSON if it ends with .json)', default=None)
+
+    main(parser.parse_args())
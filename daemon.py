@@ -0,0 +1,49 @@
+from argparse import ArgumentParser
+
+from model.cli import add_download_arguments, setup, teardown
+from model.daemon import JobManager, make_server
+from model.utils import set_base_url
+
+
+def main(args):
+    if args.base_url:
+        set_base_url(args.base_url)
+    database = setup(args)
+    try:
+        manager = JobManager(
+            args.output,
+            database,
+            max_queued=args.max_queued,
+            job_workers=args.job_workers,
+            metadata_workers=args.metadata_workers,
+            download_workers=args.download_workers
+        )
+        try:
+            # Fails if the port is in use
+            server = make_server(manager, args.host, args.port)
+            print(f'Listening on http://{args.host}:{server.server_address[1]}')
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.server_close()
+        finally:
+            manager.close()
+    finally:
+        teardown(args, database)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Run a local download service for chiasenhac.vn. Jobs are submitted, queried and cancelled over a JSON HTTP API.')
+    parser.add_argument('--output', '-o', type=str, help='Output directory', required=True)
+    parser.add_argument('--host', type=str, help='Listen address', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help='Listen port', default=8765)
+    parser.add_argument('--base-url', type=str, help='Fetch site pages from this URL instead of https://chiasenhac.vn, e.g. a mirror or a local stand-in', default=None)
+    add_download_arguments(parser, progress='none')
+    parser.add_argument('--max-queued', type=int, help='Reject new jobs while this many jobs are queued', default=100)
+    parser.add_argument('--job-workers', type=int, help='Number of jobs run concurrently', default=1)
+    parser.add_argument('--metadata-workers', type=int, help='Number of concurrent page fetches per job', default=4)
+    parser.add_argument('--download-workers', type=int, help='Number of concurrent downloads', default=2)
+
+    main(parser.parse_args())
@@ -1,34 +1,23 @@
 from argparse import ArgumentParser
-from pathlib import Path
 
-from model.track import Track
-from model.album import Album
+from model.batch import MediaJobs, expand
+from model.cli import add_download_arguments, setup, teardown
 from model.utils import extract_id
-from model.exceptions import NotFoundError
 
 
 def main(args):
     url = args.url
-    output_dir = Path(args.output)
-    quality = args.quality
-
     assert url.startswith('https://chiasenhac.vn/nghe-album/')
-    
-    Path(output_dir).mkdir(parents=True, exist_ok=True)
 
+    # Tracks keep their album numbering and are downloaded in album order
     a_id = extract_id(url)
-    album = Album(a_id)
-    
-    max_track_number = album.tracklist[-1]['number']
-    width = len(str(max_track_number))
-
-    for track in album.tracklist:
-        try:
-            _track = Track(track['id'])
-            numbering = str(track['number']).zfill(width) + '. '
-            _track.download(output_dir, quality, numbering)
-        except NotFoundError:
-            print(f'Skipped {_track.artists_name} - {_track.song_title} [{_track.track_id}] because no download link is available.')
+    database = setup(args)
+    try:
+        jobs = MediaJobs(args.output, args.quality, database)
+        stats = jobs.run(expand(('album', a_id), database=database), args.metadata_workers, args.download_workers)
+        print(stats.summary())
+    finally:
+        teardown(args, database)
 
 if __name__ == '__main__':
     parser = ArgumentParser(description='Download tracks by album from chiasenhac.vn.')
@@ -40,5 +29,8 @@ if __name__ == '__main__':
         default=0,
         choices=[0, 1, 2, 3, 4]
     )
+    add_download_arguments(parser)
+    parser.add_argument('--metadata-workers', type=int, help='Number of concurrent track info fetches', default=4)
+    parser.add_argument('--download-workers', type=int, help='Number of concurrent downloads', default=2)
 
     main(parser.parse_args())
@@ -0,0 +1,49 @@
+from argparse import ArgumentParser
+import sys
+
+from model.batch import MediaJobs, expand, read_manifest
+from model.cli import add_download_arguments, setup, teardown
+from model.utils import iter_concurrent
+
+
+def main(args):
+    if args.manifest == '-':
+        entries = read_manifest(sys.stdin)
+    else:
+        with open(args.manifest, encoding='utf-8') as f:
+            entries = read_manifest(f)
+    print(f'Read {len(entries)} unique URLs.')
+
+    # Albums and artists are expanded concurrently, and every media id is queued once
+    def iter_jobs():
+        expand_entry = lambda entry: expand(entry, args.discography, args.videos, database)
+        for jobs in iter_concurrent(expand_entry, entries, args.metadata_workers):
+            yield from jobs
+
+    database = setup(args)
+    try:
+        jobs = MediaJobs(args.output, args.quality, database)
+        stats = jobs.run(iter_jobs(), args.metadata_workers, args.download_workers)
+        print(f'Found {len(jobs.seen)} unique items ({jobs.listed - len(jobs.seen)} duplicates removed).')
+        print(stats.summary())
+    finally:
+        teardown(args, database)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Download many tracks, videos, albums and artists from chiasenhac.vn in one process.')
+    parser.add_argument('manifest', type=str, help='File with one track, video, album or artist URL per line, or - to read from stdin')
+    parser.add_argument('--output', '-o', type=str, help='Output directory', required=True)
+    parser.add_argument('--quality', '-q',
+        type=int,
+        help='Download quality. 0: FLAC, 1: M4A 500kbps, 2: MP3 320kbps, 3: MP3 128kbps, 4: M4A 32kbps.',
+        default=0,
+        choices=[0, 1, 2, 3, 4]
+    )
+    parser.add_argument('--discography', action='store_true', help='Also download tracks of all albums of listed artists')
+    parser.add_argument('--videos', action='store_true', help='Also download videos of listed artists')
+    add_download_arguments(parser)
+    parser.add_argument('--metadata-workers', type=int, help='Number of concurrent page fetches', default=4)
+    parser.add_argument('--download-workers', type=int, help='Number of concurrent downloads', default=2)
+
+    main(parser.parse_args())
@@ -1,38 +1,57 @@
 from argparse import ArgumentParser
-from pathlib import Path
 
-from model.track import Track
 from model.artist import Artist
+from model.batch import ArtistSync, MediaJobs, iter_artist
+from model.cli import add_download_arguments, setup, teardown
 from model.utils import extract_id
-from model.exceptions import NotFoundError
 
 
 def main(args):
     url = args.url
-    output_dir = Path(args.output)
-    quality = args.quality
-
     assert url.startswith('https://chiasenhac.vn/ca-si/')
-    
+
     a_id = extract_id(url)
-    artist = Artist(a_id)
-    
-    for track in artist.songs:
-        try:
-            _track = Track(track)
-            _track.download(output_dir, quality)
-        except NotFoundError:
-            print(f'Skipped {_track.artists_name} - {_track.song_title} [{_track.track_id}] because no download link is available.')
+    database = setup(args)
+    try:
+        artist = Artist(a_id, max_workers=args.metadata_workers)
+        if database is not None:
+            database.upsert_artist(artist)
+
+        # Jobs are streamed as listing pages arrive, so downloads start before the
+        # listings are complete. Each id is queued once.
+        if args.incremental:
+            # Only items not recorded by previous runs are listed, and they are recorded once downloaded
+            sync = ArtistSync(artist, database, args.discography, args.videos, args.metadata_workers)
+            listing = sync.iter_jobs()
+        else:
+            listing = iter_artist(artist, args.discography, args.videos, args.metadata_workers)
+        jobs = MediaJobs(args.output, args.quality, database)
+        stats = jobs.run(listing, args.metadata_workers, args.download_workers)
+        print(f'Found {len(jobs.seen)} unique items ({jobs.listed - len(jobs.seen)} duplicates removed).')
+        print(stats.summary())
+        if args.incremental:
+            print(f'Recorded {sync.commit()} new items of the artist.')
+    finally:
+        teardown(args, database)
 
 if __name__ == '__main__':
     parser = ArgumentParser(description='Download tracks by artist from chiasenhac.vn.')
     parser.add_argument('url', type=str, help='Artist URL. Format: https://chiasenhac.vn/ca-si/xxx.html')
     parser.add_argument('--output', '-o', type=str, help='Output directory', required=True)
-    parser.add_argument('--quality', '-q', 
+    parser.add_argument('--quality', '-q',
         type=int,
         help='Download quality. 0: FLAC, 1: M4A 500kbps, 2: MP3 320kbps, 3: MP3 128kbps, 4: M4A 32kbps.',
         default=0,
         choices=[0, 1, 2, 3, 4]
     )
+    parser.add_argument('--discography', action='store_true', help='Also download tracks of all albums of the artist')
+    parser.add_argument('--videos', action='store_true', help='Also download videos of the artist')
+    parser.add_argument('--incremental', action='store_true', help='Only download items added since the last incremental run. Requires --database')
+    add_download_arguments(parser)
+    parser.add_argument('--metadata-workers', type=int, help='Number of concurrent page fetches', default=4)
+    parser.add_argument('--download-workers', type=int, help='Number of concurrent downloads', default=2)
 
-    main(parser.parse_args())
+    args = parser.parse_args()
+    if args.incremental and args.database is None:
+        parser.error('--incremental requires --database')
+    main(args)
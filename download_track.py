@@ -1,19 +1,25 @@
 from argparse import ArgumentParser
-from pathlib import Path
 
-from model.track import Track
+from model.batch import MediaJobs
+from model.cli import add_download_arguments, setup, teardown
 from model.utils import extract_id
 
 
 def main(args):
     url = args.url
-    output_dir = Path(args.output)
-    quality = args.quality
-
     assert url.startswith('https://chiasenhac.vn/mp3/')
-    
+
     s_id = extract_id(url)
-    Track(s_id).download(output_dir, quality)
+    database = setup(args)
+    try:
+        jobs = MediaJobs(args.output, args.quality, database)
+        track = jobs.resolve((s_id, 'track', '', 0))
+        if track is None:
+            print(f'Skipped {s_id} because it is already downloaded.')
+        else:
+            jobs.download((s_id, 'track', '', 0), track)
+    finally:
+        teardown(args, database)
 
 
 if __name__ == '__main__':
@@ -26,4 +32,5 @@ if __name__ == '__main__':
         default=0,
         choices=[0, 1, 2, 3, 4]
     )
+    add_download_arguments(parser)
     main(parser.parse_args())
@@ -1,28 +1,39 @@
+from typing import Iterator
 import re
-
-from bs4 import BeautifulSoup
+import time
 
 from model.exceptions import *
 from model.logger import logging
-from model.utils import extract_id, is_error, get
+from model.parser import parse_artist, parse_tab
+from model.utils import get, iter_concurrent, site_url
 
 
 artist_id_pattern = re.compile('\'artist_id\': \'[0-9]+\'')
 NO_SONGS = re.compile('Chưa có bài hát nào')
 NO_ALBUMS = re.compile('Chưa có album nào')
 NO_VIDEOS = re.compile('Chưa có video nào')
+# Tab name -> (item name, pattern matching the "no items" message)
+TABS = {
+    'music': ('song', NO_SONGS),
+    'video': ('video', NO_VIDEOS),
+    'album': ('album', NO_ALBUMS),
+}
+FULL_SYNC_INTERVAL = 7 * 24 * 3600  # 1 week
+
 
 class Artist:
     def __init__(
         self,
         artist_id: str = None,
-        artist_id_number: int = None
+        artist_id_number: int = None,
+        max_workers: int = 8
     ):
         """Initialize Artist. Must be initialized with artist_id or artist_id_number.
 
         Args:
             artist_id (str): Artist id.
             artist_id_number (int): Artist id number.
+            max_workers (int): Maximum number of tab pages fetched concurrently. Defaults to 8.
 
         Raises:
             AssertionError:
@@ -33,6 +44,8 @@ class Artist:
         if artist_id is None and artist_id_number is None:
             raise AssertionError('Both artist_id and artist_id_number must not be empty')
 
+        self.max_workers = max_workers
+
         if artist_id is not None:
             a_id = artist_id
         elif artist_id_number is not None:
@@ -40,111 +53,129 @@ class Artist:
 
         # Parse page
         try:
-            page = get(f'https://chiasenhac.vn/ca-si/{a_id}.html')
+            page = get(site_url(f'/ca-si/{a_id}.html'))
         except NetworkError as e:
             logging.error(f'Failed to get info of artist {a_id}.')
             raise e
 
-        soup = BeautifulSoup(page.text, 'html.parser')
-        wrapper = soup.findChildren(class_='wrapper_content')[0]
-        container = wrapper.findChildren(class_='container', recursive=False)[0]
-
-        # Check for error
-        error_code = is_error(container)
-        if error_code == '404':
-            raise NotFoundError(f'Artist id {a_id} not found.')
-        elif error_code != False:
-            raise Error(f'Unknown error. Code: {error_code}')
-        
+        info = parse_artist(page.text, a_id)
+
         # Get info
         self.artist_id = page.url.split('/')[-1]
         self.artist_id = self.artist_id[self.artist_id.rfind('-') + 1:self.artist_id.rfind('.html')]
-        self.artist_name = wrapper.findChild(class_='artist_name_box').text
+        self.artist_name = info['artist_name']
         self.artist_id_number = int(re.findall('\\d+', artist_id_pattern.findall(page.text)[0])[0])
 
-    def get_all_songs(self) -> set:
-        """Get all songs of an artist.
+    def _get_first_tab_page(self, tab: str) -> tuple:
+        """Get the first page of a `tab_artist` tab.
+
+        Args:
+            tab (str): Tab name (music, video or album)
 
         Returns:
-            set: Song IDs.
+            tuple: (number of pages, item IDs on the first page). (0, []) if the tab is empty.
         """
-        song_ids = set()
-
-        logging.info(f'Getting song list of artist {self.artist_name} [{self.artist_id_number}] [{self.artist_id}].')
-        # Get total number of music pages
-        url = f'https://chiasenhac.vn/tab_artist?artist_id={self.artist_id_number}&tab=music'
+        name, empty_pattern = TABS[tab]
+        logging.info(f'Getting {name} list of artist {self.artist_name} [{self.artist_id_number}] [{self.artist_id}].')
+        # Get total number of pages
+        url = site_url(f'/tab_artist?artist_id={self.artist_id_number}&tab={tab}')
         try:
             page = get(url)
         except NetworkError as e:
-            logging.error(f'Failed to get songs of artist {self.artist_id}.')
+            logging.error(f'Failed to get {name}s of artist {self.artist_id}.')
             raise e
 
-        if NO_SONGS.search(page.text):
-            return song_ids
-        
-        soup = BeautifulSoup(page.text, 'html.parser')
-        pagination = soup.findAll(class_='pagination')[0]
-        number_of_pages = int(pagination.findAll('li')[-1].text)
-
-        for page_idx in range(number_of_pages):
-            logging.info(f'Parsing page {page_idx + 1}/{number_of_pages} of music tab of artist {self.artist_name} [{self.artist_id_number}].')
-            url = f'https://chiasenhac.vn/tab_artist?page={page_idx + 1}&artist_id={self.artist_id_number}&tab=music'
-            try:
-                page = get(url)
-            except NetworkError as e:
-                logging.error(f'Failed to get songs on page {page_idx + 1} of artist {self.artist_id}.')
-                raise e
-            soup = BeautifulSoup(page.text, 'html.parser')
-
-            songs = soup.findAll(class_='media')
-            for song in songs:
-                # Get song id
-                href = song.findChildren(class_='media-title')[0].find('a')['href']
-                song_ids.add(extract_id(href))
-
-        return song_ids
-    
-    def get_all_videos(self) -> set:
-        """Get all videos of an artist.
+        if empty_pattern.search(page.text):
+            return 0, []
+
+        return parse_tab(page.text, tab)
+
+    def _get_tab_page(self, tab: str, page_idx: int, number_of_pages: int) -> list:
+        """Get item IDs on a page of a `tab_artist` tab.
+
+        Args:
+            tab (str): Tab name (music, video or album)
+            page_idx (int): Page index, starting from 0
+            number_of_pages (int): Number of pages, for log messages
 
         Returns:
-            set: Video IDs.
+            list: Item IDs
         """
-        videos_ids = set()
-
-        logging.info(f'Getting video list of artist {self.artist_name} [{self.artist_id_number}] [{self.artist_id}].')
-        # Get total number of video pages
-        url = f'https://chiasenhac.vn/tab_artist?artist_id={self.artist_id_number}&tab=video'
+        name, _ = TABS[tab]
+        logging.info(f'Parsing page {page_idx + 1}/{number_of_pages} of {tab} tab of artist {self.artist_name} [{self.artist_id_number}].')
+        url = site_url(f'/tab_artist?page={page_idx + 1}&artist_id={self.artist_id_number}&tab={tab}')
         try:
             page = get(url)
         except NetworkError as e:
-            logging.error(f'Failed to get videos of artist {self.artist_id}.')
+            logging.error(f'Failed to get {name}s on page {page_idx + 1} of artist {self.artist_id}.')
             raise e
+        return parse_tab(page.text, tab)[1]
 
-        if NO_VIDEOS.search(page.text):
-            return videos_ids
-        
-        soup = BeautifulSoup(page.text, 'html.parser')
-        pagination = soup.findAll(class_='pagination')[0]
-        number_of_pages = int(pagination.findAll('li')[-1].text)
-
-        for page_idx in range(number_of_pages):
-            logging.info(f'Parsing page {page_idx + 1}/{number_of_pages} of video tab of artist {self.artist_name} [{self.artist_id_number}].')
-            url = f'https://chiasenhac.vn/tab_artist?page={page_idx + 1}&artist_id={self.artist_id_number}&tab=video'
-            try:
-                page = get(url)
-            except NetworkError as e:
-                logging.error(f'Failed to get videos on page {page_idx + 1} of artist {self.artist_id}.')
-                raise e
-            soup = BeautifulSoup(page.text, 'html.parser')
-
-            videos = soup.findAll(class_='card-title')
-            for video in videos:
-                # Get video id
-                href = video.find('a')['href']
-                videos_ids.add(extract_id(href))
-
-        return videos_ids
+    def _iter_tab_ids(self, tab: str) -> Iterator[str]:
+        """Yield item IDs listed on a `tab_artist` tab page by page, each ID once. The
+        first page is fetched to read the number of pages, then the remaining pages
+        are fetched concurrently, at most `max_workers` pages ahead of the consumer.
+
+        Args:
+            tab (str): Tab name (music, video or album)
+
+        Yields:
+            str: Item IDs, in page order
+        """
+        number_of_pages, first_page_ids = self._get_first_tab_page(tab)
+
+        def fetch_page(page_idx: int):
+            # First page was already fetched to read the pagination
+            if page_idx == 0:
+                return first_page_ids
+            return self._get_tab_page(tab, page_idx, number_of_pages)
+
+        seen = set()
+        for page_ids in iter_concurrent(fetch_page, range(number_of_pages), self.max_workers):
+            for item_id in page_ids:
+                if item_id not in seen:
+                    seen.add(item_id)
+                    yield item_id
+
+    def iter_songs(self) -> Iterator[str]:
+        """Yield song IDs of an artist as their pages are fetched.
+
+        Yields:
+            str: Song IDs
+        """
+        return self._iter_tab_ids('music')
+
+    def iter_videos(self) -> Iterator[str]:
+        """Yield video IDs of an artist as their pages are fetched.
+
+        Yields:
+            str: Video IDs
+        """
+        return self._iter_tab_ids('video')
+
+    def iter_albums(self) -> Iterator[str]:
+        """Yield album IDs of an artist as their pages are fetched.
+
+        Yields:
+            str: Album IDs
+        """
+        return self._iter_tab_ids('album')
+
+    def get_all_songs(self) -> set:
+        """Get all songs of an artist.
+
+        Returns:
+            set: Song IDs.
+        """
+        return set(self.iter_songs())
+
+    def get_all_videos(self) -> set:
+        """Get all videos of an artist.
+
+        Returns:
+            set: Video IDs.
+        """
+        return set(self.iter_videos())
 
     def get_all_albums(self) -> set:
         """Get all albums of an artist.
@@ -152,38 +183,80 @@ class Artist:
         Returns:
             set: Album IDs.
         """
-        albums_ids = set()
+        return set(self.iter_albums())
 
-        logging.info(f'Getting album list of artist {self.artist_name} [{self.artist_id_number}] [{self.artist_id}].')
-        # Get total number of album pages
-        url = f'https://chiasenhac.vn/tab_artist?artist_id={self.artist_id_number}&tab=album'
-        try:
-            page = get(url)
-        except NetworkError as e:
-            logging.error(f'Failed to get albums of artist {self.artist_id}.')
-            raise e
+    def _sync_tab(self, tab: str, database, full_sync_interval: float) -> set:
+        """Get item IDs of a tab that were not recorded in previous syncs.
+
+        Pages are assumed to list newest items first, so pagination stops at the first
+        page containing an item that was already recorded. A full sweep of all pages is done instead if the last
+        one is older than `full_sync_interval`. The IDs are not recorded here: record them with
+        `database.add_artist_items` once they are handled, so items that failed are listed again.
+
+        Args:
+            tab (str): Tab name (music, video or album)
+            database (Database): Database storing the IDs already recorded
+            full_sync_interval (float): Seconds between full sweeps
+
+        Returns:
+            set: New item IDs
+        """
+        known = database.get_artist_items(self.artist_id, tab)
+        last_full_sync = database.get_last_full_sync(self.artist_id, tab)
+
+        if last_full_sync is None or time.time() - last_full_sync >= full_sync_interval:
+            logging.info(f'Full sync of {tab} tab of artist {self.artist_name} [{self.artist_id}].')
+            new_ids = set(self._iter_tab_ids(tab)) - known
+            database.set_last_full_sync(self.artist_id, tab, time.time())
+        else:
+            new_ids = set()
+            number_of_pages, page_ids = self._get_first_tab_page(tab)
+            page_idx = 0
+            while page_idx < number_of_pages:
+                page_new_ids = set(page_ids) - known
+                new_ids.update(page_new_ids)
+                # Everything after an already recorded item is older, so it was recorded as well
+                if len(page_new_ids) < len(set(page_ids)):
+                    break
+                page_idx += 1
+                if page_idx < number_of_pages:
+                    page_ids = self._get_tab_page(tab, page_idx, number_of_pages)
+            logging.info(f'Incremental sync of {tab} tab of artist {self.artist_name} [{self.artist_id}] read {min(page_idx + 1, number_of_pages)} page(s).')
+
+        return new_ids
+
+    def sync_songs(self, database, full_sync_interval: float = FULL_SYNC_INTERVAL) -> set:
+        """Get songs of an artist that were not recorded in previous syncs.
+
+        Args:
+            database (Database): Database storing the song IDs already recorded
+            full_sync_interval (float, optional): Seconds between full sweeps of all pages. Defaults to FULL_SYNC_INTERVAL.
+
+        Returns:
+            set: New song IDs.
+        """
+        return self._sync_tab('music', database, full_sync_interval)
+
+    def sync_videos(self, database, full_sync_interval: float = FULL_SYNC_INTERVAL) -> set:
+        """Get videos of an artist that were not recorded in previous syncs.
+
+        Args:
+            database (Database): Database storing the video IDs already recorded
+            full_sync_interval (float, optional): Seconds between full sweeps of all pages. Defaults to FULL_SYNC_INTERVAL.
 
-        if NO_ALBUMS.search(page.text):
-            return albums_ids
-
-        soup = BeautifulSoup(page.text, 'html.parser')
-        pagination = soup.findAll(class_='pagination')[0]
-        number_of_pages = int(pagination.findAll('li')[-1].text)
-
-        for page_idx in range(number_of_pages):
-            logging.info(f'Parsing page {page_idx + 1}/{number_of_pages} of album tab of artist {self.artist_name} [{self.artist_id_number}].')
-            url = f'https://chiasenhac.vn/tab_artist?page={page_idx + 1}&artist_id={self.artist_id_number}&tab=album'
-            try:
-                page = get(url)
-            except NetworkError as e:
-                logging.error(f'Failed to get albums on page {page_idx + 1} of artist {self.artist_id}.')
-                raise e
-            soup = BeautifulSoup(page.text, 'html.parser')
-
-            albums = soup.findAll(class_='card-title')
-            for album in albums:
-                # Get album id
-                href = album.find('a')['href']
-                albums_ids.add(extract_id(href))
-
-        return albums_ids
\ No newline at end of file
+        Returns:
+            set: New video IDs.
+        """
+        return self._sync_tab('video', database, full_sync_interval)
+
+    def sync_albums(self, database, full_sync_interval: float = FULL_SYNC_INTERVAL) -> set:
+        """Get albums of an artist that were not recorded in previous syncs.
+
+        Args:
+            database (Database): Database storing the album IDs already recorded
+            full_sync_interval (float, optional): Seconds between full sweeps of all pages. Defaults to FULL_SYNC_INTERVAL.
+
+        Returns:
+            set: New album IDs.
+        """
+        return self._sync_tab('album', database, full_sync_interval)
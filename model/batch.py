@@ -0,0 +1,301 @@
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Union
+from urllib.parse import urlsplit
+
+from model.album import Album
+from model.artist import Artist
+from model.crawler import url_kind
+from model.exceptions import *
+from model.logger import logging
+from model.pipeline import Pipeline, PipelineStats
+from model.track import Track
+from model.utils import extract_id, iter_concurrent
+from model.video import Video
+
+
+def read_manifest(lines: Iterable[str]) -> list:
+    """Parse manifest lines into (kind, id) entries. Blank lines and lines starting
+    with # are ignored, and repeated IDs are kept once.
+
+    Args:
+        lines (Iterable[str]): Track, video, album or artist URLs, one per line
+
+    Returns:
+        list: (kind, id) tuples in manifest order
+    """
+    entries = {}
+    for line in lines:
+        url = line.strip()
+        if not url or url.startswith('#'):
+            continue
+        # IDs are read from the path, e.g. shared links carry a ?playlist= query
+        url = urlsplit(url)._replace(query='', fragment='').geturl()
+        try:
+            kind = url_kind(url)
+        except ValueError:
+            logging.warning(f'Skipped unsupported URL {url}.')
+            continue
+        entries.setdefault((kind, extract_id(url)), None)
+    return list(entries)
+
+
+def expand(entry: tuple, discography: bool = False, videos: bool = False, database=None, max_workers: int = 8) -> Iterable:
+    """Turn a manifest entry into download jobs.
+
+    Albums are fetched right away. Artist listings are returned as a generator,
+    so their pages are fetched while the jobs are consumed.
+
+    Args:
+        entry (tuple): (kind, id)
+        discography (bool, optional): Also list tracks of all albums of artists. Defaults to False.
+        videos (bool, optional): Also list videos of artists. Defaults to False.
+        database (Database, optional): Database recording albums and artists. Defaults to None.
+        max_workers (int, optional): Number of listing pages fetched concurrently for artists. Defaults to 8.
+
+    Returns:
+        Iterable: (id, kind, numbering, priority) jobs
+    """
+    kind, item_id = entry
+    try:
+        if kind in ('track', 'video'):
+            return [(item_id, kind, '', 0)]
+        if kind == 'album':
+            album = Album(item_id)
+            if database is not None:
+                database.upsert_album(album)
+            width = len(str(album.tracklist[-1]['number'])) if album.tracklist else 1
+            return [
+                (track['id'], 'track', str(track['number']).zfill(width) + '. ', track['number'])
+                for track in album.tracklist
+            ]
+
+        artist = Artist(item_id, max_workers=max_workers)
+        if database is not None:
+            database.upsert_artist(artist)
+        return iter_artist(artist, discography, videos, max_workers)
+    except NotFoundError:
+        logging.warning(f'Skipped {kind} {item_id} because it was not found.')
+    except Exception as e:
+        logging.error(f'Failed to get {kind} {item_id}: {e}')
+    return []
+
+
+def _iter_listing(items: Iterable, label: str) -> Iterator:
+    # Listing pages are fetched while iterating: end this listing at its first
+    # error instead of failing the whole batch
+    try:
+        yield from items
+    except NotFoundError:
+        logging.warning(f'Stopped listing {label} because a page was not found.')
+    except Exception as e:
+        logging.error(f'Failed to list {label}: {e}')
+
+
+def _album_track_ids(album_id: str) -> list:
+    try:
+        return [track['id'] for track in Album(album_id).tracklist]
+    except NotFoundError:
+        logging.warning(f'Skipped album {album_id} because it was not found.')
+    except Exception as e:
+        logging.error(f'Failed to get album {album_id}: {e}')
+    return []
+
+
+def iter_artist(artist: Artist, discography: bool, videos: bool, max_workers: int = 8) -> Iterator[tuple]:
+    """List download jobs of an artist while its listing pages are fetched.
+
+    Args:
+        artist (Artist): Artist
+        discography (bool): Also list tracks of all albums of the artist
+        videos (bool): Also list videos of the artist
+        max_workers (int, optional): Number of album pages fetched concurrently. Defaults to 8.
+
+    Yields:
+        tuple: (id, kind, numbering, priority) jobs
+    """
+    label = f'artist {artist.artist_id}'
+    yield from ((track_id, 'track', '', 0) for track_id in _iter_listing(artist.iter_songs(), f'songs of {label}'))
+    if discography:
+        album_ids = _iter_listing(artist.iter_albums(), f'albums of {label}')
+        for track_ids in iter_concurrent(_album_track_ids, album_ids, max_workers):
+            yield from ((track_id, 'track', '', 0) for track_id in track_ids)
+    if videos:
+        yield from ((video_id, 'video', '', 0) for video_id in _iter_listing(artist.iter_videos(), f'videos of {label}'))
+
+
+class ArtistSync:
+    def __init__(self, artist: Artist, database, discography: bool = False, videos: bool = False, max_workers: int = 8):
+        """List download jobs of the items of an artist that were not recorded in previous syncs.
+        Items are recorded by `commit` once all their tracks or videos are downloaded, so items
+        that failed are listed again by the next sync.
+
+        Args:
+            artist (Artist): Artist
+            database (Database): Database storing the recorded items and finished downloads
+            discography (bool, optional): Also list tracks of new albums of the artist. Defaults to False.
+            videos (bool, optional): Also list new videos of the artist. Defaults to False.
+            max_workers (int, optional): Number of album pages fetched concurrently. Defaults to 8.
+        """
+        self.artist = artist
+        self.database = database
+        self.discography = discography
+        self.videos = videos
+        self.max_workers = max_workers
+        # (tab, item id) -> media ids that must be downloaded before the item is recorded
+        self.pending = {}
+
+    def _sync(self, tab: str) -> list:
+        sync = {'music': self.artist.sync_songs, 'album': self.artist.sync_albums, 'video': self.artist.sync_videos}[tab]
+        try:
+            return sorted(sync(self.database))
+        except NotFoundError:
+            logging.warning(f'Stopped syncing {tab} tab of artist {self.artist.artist_id} because a page was not found.')
+        except Exception as e:
+            logging.error(f'Failed to sync {tab} tab of artist {self.artist.artist_id}: {e}')
+        return []
+
+    def iter_jobs(self) -> Iterator[tuple]:
+        """List download jobs of new items.
+
+        Yields:
+            tuple: (id, kind, numbering, priority) jobs
+        """
+        for track_id in self._sync('music'):
+            self.pending[('music', track_id)] = [track_id]
+            yield (track_id, 'track', '', 0)
+        if self.discography:
+            album_ids = self._sync('album')
+            for album_id, track_ids in zip(album_ids, iter_concurrent(_album_track_ids, album_ids, self.max_workers)):
+                # An album that failed to load lists no tracks and is not recorded
+                if track_ids:
+                    self.pending[('album', album_id)] = track_ids
+                yield from ((track_id, 'track', '', 0) for track_id in track_ids)
+        if self.videos:
+            for video_id in self._sync('video'):
+                self.pending[('video', video_id)] = [video_id]
+                yield (video_id, 'video', '', 0)
+
+    def commit(self) -> int:
+        """Record the listed items whose tracks or videos are all downloaded.
+
+        Returns:
+            int: Number of items recorded
+        """
+        done = {}
+        for (tab, item_id), media_ids in self.pending.items():
+            if all(self.database.is_downloaded(media_id) for media_id in media_ids):
+                done.setdefault(tab, []).append(item_id)
+        for tab, item_ids in done.items():
+            self.database.add_artist_items(self.artist.artist_id, tab, item_ids)
+        return sum(len(item_ids) for item_ids in done.values())
+
+
+def fetch_media(kind: str, media_id: str, database=None) -> Union[Track, Video]:
+    """Fetch a track or video and record it in `database`.
+
+    Args:
+        kind (str): 'track' or 'video'
+        media_id (str): Track or video id
+        database (Database, optional): Database recording the catalog. Defaults to None.
+
+    Returns:
+        Union[Track, Video]: Track or video
+    """
+    if kind == 'video':
+        obj = Video(media_id)
+        if database is not None:
+            database.upsert_video(obj)
+    else:
+        obj = Track(media_id)
+        if database is not None:
+            database.upsert_track(obj)
+    return obj
+
+
+class MediaJobs:
+    def __init__(
+        self,
+        output_dir: Union[str, Path],
+        quality: int = 0,
+        database=None,
+        priority: int = None,
+        media: Callable = None
+    ):
+        """Download (id, kind, numbering, priority) jobs of tracks and videos through a `Pipeline`.
+        Each media id is downloaded once, and already downloaded ones are skipped if
+        `database` records them.
+
+        Args:
+            output_dir (Union[str, Path]): Download directory
+            quality (int, optional): Download quality ID. Defaults to 0.
+            database (Database, optional): Database recording the catalog and finished downloads. Defaults to None.
+            priority (int, optional): Scheduler priority of all downloads. Defaults to the priority of each job.
+            media (Callable, optional): `media(kind, media_id)` returns the track or video. Defaults to `fetch_media`.
+        """
+        self.output_dir = Path(output_dir)
+        self.quality = quality
+        self.database = database
+        self.priority = priority
+        self.media = media or (lambda kind, media_id: fetch_media(kind, media_id, database))
+        self.listed = 0
+        self.seen = set()
+        self.paths = []
+
+    def unique(self, jobs: Iterable) -> Iterator[tuple]:
+        """Yield the jobs whose media id was not listed before."""
+        for job in jobs:
+            self.listed += 1
+            if job[0] not in self.seen:
+                self.seen.add(job[0])
+                yield job
+
+    def resolve(self, job: tuple) -> Union[Track, Video, None]:
+        media_id, kind, _, _ = job
+        if self.database is not None and self.database.is_downloaded(media_id):
+            return None
+        return self.media(kind, media_id)
+
+    def download(self, job: tuple, obj: Union[Track, Video]) -> Path:
+        media_id, kind, numbering, priority = job
+        priority = priority if self.priority is None else self.priority
+        if kind == 'video':
+            path = obj.download(self.output_dir, self.quality, database=self.database, priority=priority)
+            if self.database is not None:
+                self.database.mark_video_downloaded(media_id, path.absolute())
+        else:
+            path = obj.download(self.output_dir, self.quality, numbering, self.database, priority=priority)
+            if self.database is not None:
+                self.database.mark_track_downloaded(media_id, path.absolute())
+        self.paths.append(str(path))
+        return path
+
+    def describe(self, job: tuple, obj: Union[Track, Video, None]) -> str:
+        media_id, kind, _, _ = job
+        if obj is None:
+            return f'{kind} {media_id}'
+        title = obj.video_title if kind == 'video' else obj.song_title
+        return f'{obj.artists_name} - {title} [{media_id}]'
+
+    def run(self, jobs: Iterable, metadata_workers: int = 4, download_workers: int = 2) -> PipelineStats:
+        """Download all unique jobs and wait for completion.
+
+        Args:
+            jobs (Iterable): (id, kind, numbering, priority) jobs
+            metadata_workers (int, optional): Number of concurrent page fetches. Defaults to 4.
+            download_workers (int, optional): Number of concurrent downloads. Defaults to 2.
+
+        Raises:
+            Exception: Whatever iterating `jobs` raised
+
+        Returns:
+            PipelineStats: Counters, wall-clock time and throughput
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        pipeline = Pipeline(
+            self.resolve,
+            self.download,
+            self.describe,
+            metadata_workers=metadata_workers,
+            download_workers=download_workers
+        )
+        return pipeline.run(self.unique(jobs))
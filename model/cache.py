@@ -0,0 +1,196 @@
+from hashlib import sha1
+from pathlib import Path
+from threading import Lock
+from typing import Union
+import json
+import os
+import re
+import time
+import zlib
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from model.logger import logging
+
+
+# Time to live in seconds per URL class, first match wins
+DEFAULT_TTLS = [
+    (re.compile(r'/tab_artist\?'), 6 * 3600),
+    (re.compile(r'/ca-si/'), 24 * 3600),
+    (re.compile(r'/nghe-album/'), 7 * 24 * 3600),
+    (re.compile(r'/mp3/'), 7 * 24 * 3600),
+    (re.compile(r'/hd/'), 7 * 24 * 3600),
+]
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024  # 512 MiB
+
+
+class CacheEntry:
+    def __init__(self, meta: dict, content: bytes):
+        self.meta = meta
+        self.content = content
+
+    @property
+    def stored_at(self) -> float:
+        return self.meta['stored_at']
+
+    def validators(self) -> dict:
+        """Return headers for a conditional request revalidating this entry."""
+        headers = {}
+        if 'ETag' in self.meta['headers']:
+            headers['If-None-Match'] = self.meta['headers']['ETag']
+        if 'Last-Modified' in self.meta['headers']:
+            headers['If-Modified-Since'] = self.meta['headers']['Last-Modified']
+        return headers
+
+    def to_response(self) -> requests.Response:
+        """Build a Response equivalent to the cached one."""
+        resp = requests.Response()
+        resp.status_code = self.meta['status_code']
+        resp.url = self.meta['url']
+        resp.encoding = self.meta['encoding']
+        resp.headers = CaseInsensitiveDict(self.meta['headers'])
+        resp._content = self.content
+        return resp
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttls: list = None,
+        default_ttl: int = 3600
+    ):
+        """On-disk cache of metadata pages. Entries are zlib-compressed, expire after
+        a TTL depending on the URL class, are revalidated with ETag/Last-Modified once
+        expired and evicted least-recently-used first when the cache exceeds `max_size`.
+
+        Args:
+            directory (Union[str, Path]): Cache directory
+            max_size (int, optional): Maximum total size of the cache in bytes. Defaults to DEFAULT_MAX_SIZE.
+            ttls (list, optional): List of (pattern, ttl in seconds) matched against URLs. Defaults to DEFAULT_TTLS.
+            default_ttl (int, optional): TTL of URLs matching no pattern. Defaults to 3600.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.default_ttl = default_ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = Lock()
+        self._size = sum(f.stat().st_size for f in self.directory.glob('*/*') if f.is_file())
+
+    def ttl(self, url: str) -> int:
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return self.default_ttl
+
+    def _path(self, url: str) -> Path:
+        key = sha1(url.encode('utf-8')).hexdigest()
+        return self.directory / key[:2] / key
+
+    def lookup(self, url: str) -> Union[CacheEntry, None]:
+        """Return the cached entry of `url`, fresh or not, or None.
+
+        Args:
+            url (str): URL
+
+        Returns:
+            Union[CacheEntry, None]: Cached entry
+        """
+        path = self._path(url)
+        try:
+            data = zlib.decompress(path.read_bytes())
+        except (OSError, zlib.error):
+            return None
+        header, _, content = data.partition(b'\n')
+        meta = json.loads(header)
+        if meta['request_url'] != url:
+            return None
+        # Record access time for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return CacheEntry(meta, content)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.stored_at < self.ttl(entry.meta['request_url'])
+
+    def store(self, url: str, resp: requests.Response):
+        """Store a successful response.
+
+        Args:
+            url (str): Requested URL
+            resp (requests.Response): Response
+        """
+        meta = {
+            'request_url': url,
+            'url': resp.url,
+            'status_code': resp.status_code,
+            'encoding': resp.encoding,
+            'headers': {k: v for k, v in resp.headers.items() if k in ('Content-Type', 'ETag', 'Last-Modified')},
+            'stored_at': time.time(),
+        }
+        self._write(url, CacheEntry(meta, resp.content))
+
+    def refresh(self, url: str, entry: CacheEntry):
+        """Mark an entry as fresh again after a 304 Not Modified response."""
+        entry.meta['stored_at'] = time.time()
+        self._write(url, entry)
+        with self._lock:
+            self.revalidated += 1
+
+    def _write(self, url: str, entry: CacheEntry):
+        path = self._path(url)
+        path.parent.mkdir(exist_ok=True)
+        data = zlib.compress(json.dumps(entry.meta).encode('utf-8') + b'\n' + entry.content)
+        old_size = path.stat().st_size if path.exists() else 0
+        tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._size += len(data) - old_size
+            over = self._size > self.max_size
+        if over:
+            self.evict(keep=path)
+
+    def evict(self, keep: Path = None):
+        """Remove least recently used entries until the cache fits in `max_size`.
+
+        Args:
+            keep (Path, optional): Entry that must not be evicted, e.g. the one just written. Defaults to None.
+        """
+        with self._lock:
+            files = [f for f in self.directory.glob('*/*') if f.is_file() and not f.name.endswith('.tmp') and f != keep]
+            files.sort(key=lambda f: f.stat().st_mtime_ns)
+            for f in files:
+                if self._size <= self.max_size:
+                    break
+                try:
+                    size = f.stat().st_size
+                    f.unlink()
+                    self._size -= size
+                except OSError:
+                    continue
+        logging.info(f'Evicted cache entries, cache size is now {self._size} bytes.')
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidated': self.revalidated,
+            'size': self._size,
+        }
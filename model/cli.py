@@ -0,0 +1,69 @@
+from argparse import ArgumentParser, Namespace
+from typing import Union
+
+from model.database import Database
+from model.metrics import enable_metrics, get_metrics
+from model.scheduler import configure_scheduler, get_scheduler
+from model.session import get_session
+from model.utils import configure_segments, enable_cache, get_cache
+
+
+def add_download_arguments(parser: ArgumentParser, progress: str = 'bar'):
+    """Add the database, download, cache and metrics options shared by the download scripts.
+
+    Args:
+        parser (ArgumentParser): Parser of the script
+        progress (str, optional): Default of --progress. Defaults to 'bar'.
+    """
+    parser.add_argument('--database', type=str, help='SQLite database recording the catalog and finished downloads', default=None)
+    parser.add_argument('--segments', type=int, help='Parallel connections per file for files larger than 32 MiB', default=1)
+    parser.add_argument('--bandwidth', type=float, help='Total download bandwidth limit in KiB/s', default=None)
+    parser.add_argument('--host-bandwidth', type=float, help='Download bandwidth limit per server in KiB/s', default=None)
+    parser.add_argument('--progress', type=str, help='Progress display: one aggregated bar, JSON lines events or none', default=progress, choices=['bar', 'events', 'none'])
+    parser.add_argument('--cache-dir', type=str, help='Cache fetched pages in this directory', default=None)
+    parser.add_argument('--metrics', type=str, help='Write request, download and parse metrics to this file (Prometheus text, or JSON if it ends with .json)', default=None)
+
+
+def setup(args: Namespace) -> Union[Database, None]:
+    """Enable the page cache and metrics, configure segmented downloads and the
+    download scheduler from the options of `add_download_arguments`, and open the database.
+
+    Args:
+        args (Namespace): Parsed arguments. `download_workers`, if present, caps concurrent transfers.
+
+    Returns:
+        Union[Database, None]: Database, or None without --database
+    """
+    if args.cache_dir:
+        enable_cache(args.cache_dir)
+    if args.metrics:
+        enable_metrics()
+    configure_segments(args.segments)
+
+    kwargs = {}
+    if getattr(args, 'download_workers', None) is not None:
+        kwargs['max_transfers'] = args.download_workers
+    configure_scheduler(
+        bandwidth=args.bandwidth * 1024 if args.bandwidth else None,
+        host_bandwidth=args.host_bandwidth * 1024 if args.host_bandwidth else None,
+        progress=args.progress,
+        **kwargs
+    )
+    return Database(args.database) if args.database else None
+
+
+def teardown(args: Namespace, database: Union[Database, None]):
+    """Close the progress display, print cache and rate limit statistics, write metrics and close the database."""
+    get_scheduler().close()
+    limits = get_session().rate_limiter.stats()
+    if limits:
+        print(f'Rate limits: {limits}')
+    cache = get_cache()
+    if cache is not None:
+        print(f'Page cache: {cache.stats()}')
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.write(args.metrics)
+    if database is not None:
+        database.close()
+        database.join()
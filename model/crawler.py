@@ -0,0 +1,164 @@
+from typing import Iterable
+import time
+
+from model.album import Album
+from model.artist import Artist
+from model.exceptions import *
+from model.logger import logging
+from model.track import Track
+from model.utils import extract_id, iter_concurrent
+from model.video import Video
+
+
+# Path prefix of each page kind on chiasenhac.vn
+URL_KINDS = {
+    '/ca-si/': 'artist',
+    '/nghe-album/': 'album',
+    '/mp3/': 'track',
+    '/hd/': 'video',
+}
+
+
+def url_kind(url: str) -> str:
+    """Return the kind of page of a chiasenhac.vn URL.
+
+    Args:
+        url (str): URL, e.g. https://chiasenhac.vn/nghe-album/xxx.html
+
+    Raises:
+        ValueError: If the URL is not an artist, album, track or video page
+
+    Returns:
+        str: 'artist', 'album', 'track' or 'video'
+    """
+    for prefix, kind in URL_KINDS.items():
+        if prefix in url:
+            return kind
+    raise ValueError(f'Unsupported URL {url}.')
+
+
+class Crawler:
+    def __init__(
+        self,
+        database,
+        max_workers: int = 8,
+        max_depth: int = None,
+        videos: bool = True,
+        follow_artists: bool = True,
+        checkpoint_interval: int = 200
+    ):
+        """Breadth-first crawler of the artist -> album -> track/video graph.
+
+        Every crawled page is upserted into `database`, which also holds the frontier:
+        each discovered page is stored once with its depth and state, so the visited
+        set is never refetched and an interrupted crawl resumes where it stopped.
+        Pages are crawled in rounds of `checkpoint_interval`, whose discoveries and
+        outcomes are committed together.
+
+        Args:
+            database (Database): Database storing the catalog and the frontier
+            max_workers (int, optional): Number of pages crawled concurrently. Defaults to 8.
+            max_depth (int, optional): Do not follow links of pages at this depth. Defaults to None (unbounded).
+            videos (bool, optional): Follow the video tab of artists. Defaults to True.
+            follow_artists (bool, optional): Follow artists of tracks and videos. Defaults to True.
+            checkpoint_interval (int, optional): Number of pages per round. Defaults to 200.
+        """
+        self.database = database
+        self.max_workers = max_workers
+        self.max_depth = max_depth
+        self.videos = videos
+        self.follow_artists = follow_artists
+        self.checkpoint_interval = max(1, checkpoint_interval, max_workers)
+
+    def seed(self, urls: Iterable):
+        """Add start pages to the frontier at depth 0.
+
+        Args:
+            urls (Iterable): Artist, album, track or video URLs
+        """
+        self.database.add_to_frontier([(url_kind(url), extract_id(url), 0) for url in urls])
+
+    def _links(self, kind: str, obj) -> list:
+        # (kind, id) of pages linked from a crawled page
+        if kind == 'artist':
+            links = [('album', album_id) for album_id in sorted(obj.get_all_albums())]
+            links += [('track', track_id) for track_id in sorted(obj.get_all_songs())]
+            if self.videos:
+                links += [('video', video_id) for video_id in sorted(obj.get_all_videos())]
+            return links
+        if kind == 'album':
+            return [('track', track['id']) for track in obj.tracklist]
+
+        links = [('artist', artist_id) for artist_id in obj.artist_ids] if self.follow_artists else []
+        if kind == 'track' and obj.album_id:
+            links.append(('album', obj.album_id))
+        return links
+
+    def _visit(self, item: tuple) -> tuple:
+        """Crawl one page and store it.
+
+        Returns:
+            tuple: (state, links) where state is 'done', 'missing' or 'failed'
+        """
+        kind, page_id, depth = item
+        try:
+            if kind == 'artist':
+                obj = Artist(page_id)
+                self.database.upsert_artist(obj)
+            elif kind == 'album':
+                obj = Album(page_id)
+                self.database.upsert_album(obj)
+            elif kind == 'track':
+                obj = Track(page_id)
+                self.database.upsert_track(obj)
+            else:
+                obj = Video(page_id)
+                self.database.upsert_video(obj)
+            if self.max_depth is not None and depth >= self.max_depth:
+                return 'done', []
+            return 'done', self._links(kind, obj)
+        except NotFoundError:
+            logging.warning(f'Skipped {kind} {page_id} because it was not found.')
+            return 'missing', []
+        except Exception as e:
+            logging.error(f'Failed to crawl {kind} {page_id}: {e}')
+            return 'failed', []
+
+    def run(self, limit: int = None, retry_failed: bool = False) -> dict:
+        """Crawl until the frontier is exhausted or `limit` pages were crawled.
+
+        Args:
+            limit (int, optional): Maximum number of pages crawled by this call. Defaults to None.
+            retry_failed (bool, optional): Crawl pages that failed in a previous run again. Defaults to False.
+
+        Returns:
+            dict: Number of pages crawled by this call per state, and elapsed time
+        """
+        if retry_failed:
+            self.database.requeue_failed_crawls()
+
+        stats = {'done': 0, 'missing': 0, 'failed': 0}
+        started = time.monotonic()
+        while limit is None or sum(stats.values()) < limit:
+            size = self.checkpoint_interval if limit is None else min(self.checkpoint_interval, limit - sum(stats.values()))
+            items = self.database.get_frontier(size)
+            if not items:
+                break
+
+            links = []
+            states = []
+            try:
+                for item, (state, item_links) in zip(items, iter_concurrent(self._visit, items, self.max_workers)):
+                    kind, page_id, depth = item
+                    links += [(link_kind, link_id, depth + 1) for link_kind, link_id in item_links]
+                    states.append((state, kind, page_id))
+                    stats[state] += 1
+            finally:
+                # Checkpoint: discoveries are queued before the states of the pages they came from
+                self.database.add_to_frontier(links)
+                self.database.set_crawl_states(states)
+                self.database.flush()
+            logging.info(f'Crawled {sum(stats.values())} pages, frontier: {self.database.get_crawl_stats()}.')
+
+        stats['elapsed'] = time.monotonic() - started
+        return stats
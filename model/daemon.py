@@ -0,0 +1,419 @@
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from pathlib import Path
+from queue import PriorityQueue
+from threading import Event, Lock, Thread
+from typing import Union
+import json
+import time
+
+from model.batch import MediaJobs, expand, fetch_media, read_manifest
+from model.exceptions import *
+from model.logger import logging
+from model.session import get_session
+from model.track import Track
+from model.utils import get_cache
+from model.video import Video
+
+
+FINISHED_STATES = ('done', 'failed', 'cancelled')
+
+
+class Job:
+    def __init__(
+        self,
+        job_id: int,
+        url: str,
+        kind: str,
+        item_id: str,
+        priority: int = 0,
+        quality: int = 0,
+        discography: bool = False,
+        videos: bool = False
+    ):
+        """Download job of one track, video, album or artist URL.
+
+        Args:
+            job_id (int): Job id
+            url (str): Submitted URL
+            kind (str): 'track', 'video', 'album' or 'artist'
+            item_id (str): Id of the track, video, album or artist
+            priority (int, optional): Lower values run first. Defaults to 0.
+            quality (int, optional): Download quality ID. Defaults to 0.
+            discography (bool, optional): Also download tracks of all albums of an artist. Defaults to False.
+            videos (bool, optional): Also download videos of an artist. Defaults to False.
+        """
+        self.id = job_id
+        self.url = url
+        self.kind = kind
+        self.item_id = item_id
+        self.priority = priority
+        self.quality = quality
+        self.discography = discography
+        self.videos = videos
+
+        self.state = 'queued'
+        self.error = None
+        self.items = 0
+        self.files = []
+        self.stats = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancelled = Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def to_dict(self) -> dict:
+        res = {
+            'id': self.id,
+            'url': self.url,
+            'kind': self.kind,
+            'item_id': self.item_id,
+            'priority': self.priority,
+            'quality': self.quality,
+            'state': self.state,
+            'cancel_requested': self.cancelled,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'items': self.items,
+            'files': list(self.files),
+            'error': self.error,
+        }
+        if self.stats is not None:
+            res.update(
+                downloaded=self.stats.downloaded,
+                skipped=self.stats.skipped,
+                failed=self.stats.failed,
+                bytes=self.stats.bytes,
+            )
+        return res
+
+
+class JobManager:
+    def __init__(
+        self,
+        output_dir: Union[str, Path],
+        database=None,
+        max_queued: int = 100,
+        job_workers: int = 1,
+        metadata_workers: int = 4,
+        download_workers: int = 2,
+        metadata_cache_size: int = 4096,
+        max_history: int = 1000
+    ):
+        """Resident job runner. Jobs wait in a bounded priority queue and are run by
+        `job_workers` threads, all sharing the HTTP session, the download scheduler,
+        `database` and an in-memory cache of track and video metadata, so they stay
+        warm between jobs.
+
+        Args:
+            output_dir (Union[str, Path]): Download directory
+            database (Database, optional): Database recording the catalog and finished downloads. Defaults to None.
+            max_queued (int, optional): Maximum number of queued jobs. Defaults to 100.
+            job_workers (int, optional): Number of jobs run concurrently. Defaults to 1.
+            metadata_workers (int, optional): Number of concurrent page fetches per job. Defaults to 4.
+            download_workers (int, optional): Number of concurrent downloads per job. Defaults to 2.
+            metadata_cache_size (int, optional): Number of tracks and videos kept in memory. Defaults to 4096.
+            max_history (int, optional): Number of finished jobs kept for status queries. Defaults to 1000.
+        """
+        self.output_dir = Path(output_dir)
+        self.database = database
+        self.max_queued = max(1, int(max_queued))
+        self.metadata_workers = metadata_workers
+        self.download_workers = download_workers
+        self.metadata_cache_size = metadata_cache_size
+        self.max_history = max_history
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.jobs = OrderedDict()
+        self.queue = PriorityQueue()
+        self._queued = 0
+        self._ids = count(1)
+        self._seq = count()
+        self._lock = Lock()
+        self._metadata = OrderedDict()
+        self._metadata_hits = 0
+        self._metadata_misses = 0
+        self._closed = False
+        self._workers = [Thread(target=self._worker, daemon=True) for _ in range(max(1, int(job_workers)))]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(
+        self,
+        url: str,
+        priority: int = 0,
+        quality: int = 0,
+        discography: bool = False,
+        videos: bool = False
+    ) -> Job:
+        """Queue a download job.
+
+        Args:
+            url (str): Track, video, album or artist URL
+            priority (int, optional): Lower values run first. Defaults to 0.
+            quality (int, optional): Download quality ID. Defaults to 0.
+            discography (bool, optional): Also download tracks of all albums of an artist. Defaults to False.
+            videos (bool, optional): Also download videos of an artist. Defaults to False.
+
+        Raises:
+            ValueError: Unsupported URL
+            InvalidQualityError: `quality` not in range [0, 4]
+            QueueFullError: `max_queued` jobs are already waiting
+
+        Returns:
+            Job: Queued job
+        """
+        entries = read_manifest([url])
+        if not entries:
+            raise ValueError(f'Unsupported URL {url}.')
+        if int(quality) > 4 or int(quality) < 0:
+            raise InvalidQualityError(quality)
+        kind, item_id = entries[0]
+
+        with self._lock:
+            if self._closed:
+                raise Error('Job manager is closed.')
+            if self._queued >= self.max_queued:
+                raise QueueFullError(self.max_queued)
+            job = Job(next(self._ids), url, kind, item_id, int(priority), int(quality), discography, videos)
+            self.jobs[job.id] = job
+            self._queued += 1
+            self._prune()
+        self.queue.put((job.priority, next(self._seq), job))
+        logging.info(f'Queued job {job.id} for {kind} {item_id}.')
+        return job
+
+    def get(self, job_id: int) -> Union[Job, None]:
+        return self.jobs.get(job_id)
+
+    def list(self) -> list:
+        with self._lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id: int) -> Job:
+        """Cancel a job. A queued job never runs, a running job stops listing new items
+        and finishes the downloads already started.
+
+        Args:
+            job_id (int): Job id
+
+        Raises:
+            KeyError: Unknown job
+
+        Returns:
+            Job: Cancelled job, unchanged if it had already finished
+        """
+        with self._lock:
+            job = self.jobs[job_id]
+            if job.state in FINISHED_STATES:
+                return job
+            job._cancelled.set()
+            if job.state == 'queued':
+                job.state = 'cancelled'
+                job.finished = time.time()
+                self._queued -= 1
+        logging.info(f'Cancelled job {job_id}.')
+        return job
+
+    def status(self) -> dict:
+        """Return queue, cache, connection and rate limit statistics."""
+        with self._lock:
+            states = {}
+            for job in self.jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+            metadata = {
+                'size': len(self._metadata),
+                'hits': self._metadata_hits,
+                'misses': self._metadata_misses,
+            }
+        cache = get_cache()
+        return {
+            'jobs': states,
+            'max_queued': self.max_queued,
+            'metadata_cache': metadata,
+            'page_cache': cache.stats() if cache is not None else None,
+            'connections': get_session().stats(),
+            'rate_limits': get_session().rate_limiter.stats(),
+        }
+
+    def close(self):
+        """Cancel all jobs and wait for the running ones to stop."""
+        with self._lock:
+            self._closed = True
+            job_ids = [job.id for job in self.jobs.values() if job.state not in FINISHED_STATES]
+        for job_id in job_ids:
+            self.cancel(job_id)
+        for _ in self._workers:
+            self.queue.put((float('-inf'), next(self._seq), None))
+        for worker in self._workers:
+            worker.join()
+
+    def _prune(self):
+        # Forget the oldest finished jobs, called with the lock held
+        finished = [job_id for job_id, job in self.jobs.items() if job.state in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self.jobs[job_id]
+
+    def _worker(self):
+        while True:
+            _, _, job = self.queue.get()
+            if job is None:
+                break
+            with self._lock:
+                if job.state != 'queued':
+                    continue
+                job.state = 'running'
+                job.started = time.time()
+                self._queued -= 1
+            try:
+                stats = self._run(job)
+                state = 'cancelled' if job.cancelled else 'failed' if stats.failed else 'done'
+            except Exception as e:
+                logging.error(f'Job {job.id} failed: {e}')
+                job.error = str(e)
+                state = 'failed'
+            with self._lock:
+                job.state = state
+                job.finished = time.time()
+            logging.info(f'Finished job {job.id} ({state}).')
+
+    def _media(self, kind: str, media_id: str) -> Union[Track, Video]:
+        # Track or video metadata, kept in memory across jobs
+        key = (kind, media_id)
+        with self._lock:
+            obj = self._metadata.get(key)
+            if obj is not None:
+                self._metadata.move_to_end(key)
+                self._metadata_hits += 1
+                return obj
+            self._metadata_misses += 1
+
+        obj = fetch_media(kind, media_id, self.database)
+
+        with self._lock:
+            self._metadata[key] = obj
+            while len(self._metadata) > self.metadata_cache_size:
+                self._metadata.popitem(last=False)
+        return obj
+
+    def _run(self, job: Job):
+        media_jobs = MediaJobs(self.output_dir, job.quality, self.database, job.priority, self._media)
+        job.files = media_jobs.paths
+
+        def iter_jobs():
+            for item in expand((job.kind, job.item_id), job.discography, job.videos, self.database):
+                if job.cancelled:
+                    break
+                job.items += 1
+                yield item
+
+        job.stats = media_jobs.run(iter_jobs(), self.metadata_workers, self.download_workers)
+        return job.stats
+
+
+class JobHandler(BaseHTTPRequestHandler):
+    """JSON API of `JobManager`:
+
+        POST /jobs                  Submit {"url", "priority", "quality", "discography", "videos"}
+        GET /jobs                   List jobs
+        GET /jobs/<id>              Job status
+        DELETE /jobs/<id>           Cancel a job (also POST /jobs/<id>/cancel)
+        GET /status                 Queue, cache, connection and rate limit statistics
+    """
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def manager(self) -> JobManager:
+        return self.server.manager
+
+    def _send(self, code: int, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _job_id(self, part: str) -> Union[int, None]:
+        return int(part) if part.isdigit() else None
+
+    def _parts(self) -> list:
+        return [part for part in self.path.split('?')[0].split('/') if part]
+
+    def do_GET(self):
+        parts = self._parts()
+        if parts == ['jobs']:
+            return self._send(200, [job.to_dict() for job in self.manager.list()])
+        if parts == ['status']:
+            return self._send(200, self.manager.status())
+        if len(parts) == 2 and parts[0] == 'jobs':
+            job = self.manager.get(self._job_id(parts[1]))
+            if job is not None:
+                return self._send(200, job.to_dict())
+        self._send(404, {'error': 'Not found.'})
+
+    def do_POST(self):
+        parts = self._parts()
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'cancel':
+            return self._cancel(parts[1])
+        if parts != ['jobs']:
+            return self._send(404, {'error': 'Not found.'})
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            job = self.manager.submit(
+                body['url'],
+                priority=int(body.get('priority', 0)),
+                quality=int(body.get('quality', 0)),
+                discography=bool(body.get('discography', False)),
+                videos=bool(body.get('videos', False))
+            )
+        except QueueFullError as e:
+            return self._send(503, {'error': e.message})
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return self._send(400, {'error': 'Expected a JSON object with a supported "url".'})
+        except Error as e:
+            return self._send(400, {'error': e.message})
+        self._send(201, job.to_dict())
+
+    def do_DELETE(self):
+        parts = self._parts()
+        if len(parts) == 2 and parts[0] == 'jobs':
+            return self._cancel(parts[1])
+        self._send(404, {'error': 'Not found.'})
+
+    def _cancel(self, part: str):
+        try:
+            job = self.manager.cancel(self._job_id(part))
+        except KeyError:
+            return self._send(404, {'error': 'Not found.'})
+        if job.state in ('done', 'failed'):
+            return self._send(409, job.to_dict())
+        self._send(200, job.to_dict())
+
+    def log_message(self, format, *args):
+        logging.debug(f'{self.address_string()} {format % args}')
+
+
+def make_server(manager: JobManager, host: str = '127.0.0.1', port: int = 8765) -> ThreadingHTTPServer:
+    """Create the HTTP server of the job API. Call `serve_forever` to start it.
+
+    Args:
+        manager (JobManager): Job manager
+        host (str, optional): Listen address. Defaults to '127.0.0.1'.
+        port (int, optional): Listen port, 0 picks a free port. Defaults to 8765.
+
+    Returns:
+        ThreadingHTTPServer: Server
+    """
+    server = ThreadingHTTPServer((host, port), JobHandler)
+    server.daemon_threads = True
+    server.manager = manager
+    return server
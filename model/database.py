@@ -1,169 +1,676 @@
-from queue import Queue
-from threading import Thread
+from concurrent.futures import Future
+from itertools import islice
+from pathlib import Path
+from queue import Empty, Queue
+from threading import Condition, Event, Thread
+from typing import Iterable, Union
+import time
 
 import apsw
 
 from model.logger import logging
 
+
+# Schema migrations as (description, script). Migration i (starting from 1) upgrades a
+# database from `user_version` i - 1 to i. Append new migrations, never edit applied ones.
+# Tables are created with IF NOT EXISTS, so databases created before versioning
+# (user_version 0) are upgraded in place.
+MIGRATIONS = [
+    ('catalog tables', """
+        CREATE TABLE IF NOT EXISTS artists (
+            id text PRIMARY KEY,
+            name text,
+            id_number integer UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS albums (
+            id text PRIMARY KEY,
+            name text,
+            year_published integer
+        );
+        CREATE TABLE IF NOT EXISTS tracks (
+            id text PRIMARY KEY,
+            name text,
+            composer text,
+            album_id text DEFAULT NULL REFERENCES albums(id),
+            year_published integer,
+            download_path text DEFAULT NULL,
+            base_download_path text,
+            filename text
+        );
+        CREATE TABLE IF NOT EXISTS videos (
+            id text PRIMARY KEY,
+            name text,
+            composer text,
+            year_published integer,
+            download_path text DEFAULT NULL
+        );
+        CREATE TABLE IF NOT EXISTS album_tracks (
+            album_id text,
+            track_id text,
+            track_idx integer,
+            FOREIGN KEY (album_id) REFERENCES albums(id),
+            FOREIGN KEY (track_id) REFERENCES tracks(id)
+        );
+        CREATE TABLE IF NOT EXISTS artists_tracks (
+            artists_id text,
+            track_id text,
+            FOREIGN KEY (artists_id) REFERENCES artists(id),
+            FOREIGN KEY (track_id) REFERENCES tracks(id)
+        );
+        CREATE TABLE IF NOT EXISTS artists_videos (
+            artists_id text,
+            video_id text,
+            FOREIGN KEY (artists_id) REFERENCES artists(id),
+            FOREIGN KEY (video_id) REFERENCES videos(id)
+        );
+    """),
+    ('indexes on link tables', """
+        -- Old databases may contain duplicate links, which the unique indexes reject
+        DELETE FROM album_tracks WHERE rowid NOT IN (SELECT min(rowid) FROM album_tracks GROUP BY album_id, track_id);
+        DELETE FROM artists_tracks WHERE rowid NOT IN (SELECT min(rowid) FROM artists_tracks GROUP BY artists_id, track_id);
+        DELETE FROM artists_videos WHERE rowid NOT IN (SELECT min(rowid) FROM artists_videos GROUP BY artists_id, video_id);
+        CREATE UNIQUE INDEX IF NOT EXISTS album_tracks_album_id_track_id ON album_tracks (album_id, track_id);
+        CREATE INDEX IF NOT EXISTS album_tracks_track_id ON album_tracks (track_id);
+        CREATE UNIQUE INDEX IF NOT EXISTS artists_tracks_artists_id_track_id ON artists_tracks (artists_id, track_id);
+        CREATE INDEX IF NOT EXISTS artists_tracks_track_id ON artists_tracks (track_id);
+        CREATE UNIQUE INDEX IF NOT EXISTS artists_videos_artists_id_video_id ON artists_videos (artists_id, video_id);
+        CREATE INDEX IF NOT EXISTS artists_videos_video_id ON artists_videos (video_id);
+        CREATE INDEX IF NOT EXISTS tracks_album_id ON tracks (album_id);
+    """),
+    ('available qualities and artist syncs', """
+        CREATE TABLE IF NOT EXISTS media_qualities (
+            media_id text PRIMARY KEY,
+            qualities text
+        );
+        CREATE TABLE IF NOT EXISTS artist_items (
+            artist_id text,
+            tab text,
+            item_id text,
+            PRIMARY KEY (artist_id, tab, item_id)
+        );
+        CREATE TABLE IF NOT EXISTS artist_syncs (
+            artist_id text,
+            tab text,
+            last_full_sync real,
+            PRIMARY KEY (artist_id, tab)
+        );
+    """),
+    ('crawl frontier', """
+        CREATE TABLE IF NOT EXISTS crawl_frontier (
+            kind text,
+            id text,
+            depth integer,
+            state text DEFAULT 'pending',
+            PRIMARY KEY (kind, id)
+        );
+        CREATE INDEX IF NOT EXISTS crawl_frontier_state_depth ON crawl_frontier (state, depth);
+    """),
+]
+
+# Queued by `flush` so the pending batch is committed without waiting for `max_latency`
+_FLUSH = object()
+# Milliseconds a read-only connection retries while the database is locked, e.g. during recovery
+READER_BUSY_TIMEOUT = 5000
+
+
 class Database(Thread):
-    def __init__(self, db_path: str):
+    def __init__(
+        self,
+        db_path: str,
+        max_batch_size: int = 1000,
+        max_latency: float = 0.05,
+        select_chunk_size: int = 1000,
+        statement_cache_size: int = 256,
+        readers: int = 4
+    ):
+        """Initialize Database. All writes are executed by this thread, which
+        groups queued statements into a single transaction per batch. The database
+        runs in WAL mode, and selects are served by a pool of read-only connections
+        in the calling threads, so reads and writes do not block each other.
+
+        Args:
+            db_path (str): Path to SQLite database
+            max_batch_size (int, optional): Maximum number of statements committed in one transaction. Defaults to 1000.
+            max_latency (float, optional): Maximum time in seconds a statement waits for its batch to fill. Defaults to 0.05.
+            select_chunk_size (int, optional): Number of rows handed over to `select` callers at once. Defaults to 1000.
+            statement_cache_size (int, optional): Number of prepared statements kept by SQLite. Defaults to 256.
+            readers (int, optional): Maximum number of read-only connections, 0 to run selects on this thread. Defaults to 4.
+        """
         super().__init__()
         self.db_path = db_path
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.select_chunk_size = max(1, select_chunk_size)
+        self.statement_cache_size = statement_cache_size
+        # An in-memory database is private to the writer connection
+        self.readers = readers if db_path != ':memory:' else 0
         self.queue = Queue()
 
+        self.connection = None
         self.cursor = None
+        self._ready = Event()
+        # Error that stopped this thread before it was ready, raised to callers
+        self._error = None
+        self._reader_pool = Queue()
+        self._reader_count = 0
+        # Numbers of queued and executed statements, for read-your-writes selects
+        self._progress = Condition()
+        self._queued = 0
+        self._executed = 0
         self.start()
 
-    def check_if_table_exists(self, table_name: str) -> bool:
-        """Return True if table with specified name exists, else False.
-
-        Args:
-            table_name (str): name of table
+    def get_schema_version(self) -> int:
+        return self.cursor.execute('PRAGMA user_version').fetchone()[0]
 
-        Returns:
-            bool: True if table exists in database, else False
+    def check_and_init_db(self):
+        """Bring the schema up to date. Migrations newer than the `user_version` of the
+        database are applied in order, each in its own transaction together with the
+        new `user_version`, so an up to date database only costs one pragma read.
         """
-        return self.cursor.execute("SELECT count(name) FROM sqlite_master WHERE type='table' AND name=(?)", (table_name,)).fetchone()[0] == 1
+        version = self.get_schema_version()
+        if version > len(MIGRATIONS):
+            logging.warning(f'Database schema version {version} is newer than the supported version {len(MIGRATIONS)}.')
+            return
+
+        for number, (description, script) in enumerate(MIGRATIONS[version:], start=version + 1):
+            logging.info(f'Migrating database to version {number}: {description}.')
+            self.cursor.execute('BEGIN')
+            try:
+                self.cursor.execute(script)
+                self.cursor.execute(f'PRAGMA user_version = {number}')
+            except apsw.Error as e:
+                logging.error(f'Failed to migrate database to version {number}: {e}')
+                self.cursor.execute('ROLLBACK')
+                raise
+            self.cursor.execute('COMMIT')
 
-    def has_required_tables(self) -> bool:
-        """Check if database has all required tables
+    def _next_batch(self) -> list:
+        """Wait for a statement, then collect more until the batch is full, `max_latency`
+        has elapsed or a statement returning results is queued.
 
         Returns:
-            bool: True if database has all required tables, else False.
+            list: Queued requests
         """
-        return self.check_if_table_exists('artists') and \
-            self.check_if_table_exists('albums') and \
-            self.check_if_table_exists('tracks') and \
-            self.check_if_table_exists('videos') and \
-            self.check_if_table_exists('album_tracks') and \
-            self.check_if_table_exists('artists_tracks') and \
-            self.check_if_table_exists('artists_videos')
-
-    def check_and_init_db(self):
-        if self.has_required_tables():
-            logging.info('Database has all required table.')
-            return
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            req, _, res, _ = batch[-1]
+            # Stop on close, and do not delay statements whose caller is waiting
+            if req is None or req is _FLUSH or isinstance(res, Queue):
+                break
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait())
+            except Empty:
+                break
+        return batch
 
-        # Create table artists
-        if not self.check_if_table_exists('artists'):
-            logging.info('Creating table `artists`')
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS artists (
-                    id text PRIMARY KEY,
-                    name text,
-                    id_number integer UNIQUE
-                );
-            """)
-
-        # Create table albums
-        if not self.check_if_table_exists('albums'):
-            logging.info('Creating table `albums`')
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS albums (
-                    id text PRIMARY KEY,
-                    name text,
-                    year_published integer
-                );
-            """)
-        
-        # Create table tracks
-        if not self.check_if_table_exists('tracks'):
-            logging.info('Creating table `tracks`')
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS tracks (
-                    id text PRIMARY KEY,
-                    name text,
-                    composer text,
-                    album_id text DEFAULT NULL REFERENCES albums(id),
-                    year_published integer,
-                    download_path text DEFAULT NULL,
-                    base_download_path text,
-                    filename text
-                );
-            """)
-
-        # Create table videos
-        if not self.check_if_table_exists('videos'):
-            logging.info('Creating table `videos`')
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS videos (
-                    id text PRIMARY KEY,
-                    name text,
-                    composer text,
-                    year_published integer,
-                    download_path text DEFAULT NULL
-                );
-            """)
-
-        # Create table album_tracks
-        if not self.check_if_table_exists('album_tracks'):
-            logging.info('Creating table `album_tracks`')
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS album_tracks (
-                    album_id text,
-                    track_id text,
-                    track_idx integer,
-                    FOREIGN KEY (album_id) REFERENCES albums(id),
-                    FOREIGN KEY (track_id) REFERENCES tracks(id)
-                );
-            """)
-
-        # Create table artists_tracks
-        if not self.check_if_table_exists('artists_tracks'):
-            logging.info('Creating table `artists_tracks`')
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS artists_tracks (
-                    artists_id text,
-                    track_id text,
-                    FOREIGN KEY (artists_id) REFERENCES artists(id),
-                    FOREIGN KEY (track_id) REFERENCES tracks(id)
-                );
-            """)
-
-        # Create table artists_videos
-        if not self.check_if_table_exists('artists_videos'):
-            logging.info('Creating table `artists_videos`')
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS artists_videos (
-                    artists_id text,
-                    video_id text,
-                    FOREIGN KEY (artists_id) REFERENCES artists(id),
-                    FOREIGN KEY (video_id) REFERENCES videos(id)
-                );
-            """)
+    def _execute_batch(self, batch: list):
+        # Futures of writes are resolved once their transaction is committed
+        done = []
+        self.cursor.execute('BEGIN')
+        for req, args, res, many in batch:
+            try:
+                changes = self.connection.total_changes()
+                if many:
+                    self.cursor.executemany(req, args)
+                else:
+                    self.cursor.execute(req, args)
+                    if isinstance(res, Queue):
+                        # Hand rows over in chunks rather than one queue hop per row
+                        while True:
+                            chunk = list(islice(self.cursor, self.select_chunk_size))
+                            if not chunk:
+                                break
+                            res.put(chunk)
+                if isinstance(res, Future):
+                    done.append((res, self.connection.total_changes() - changes))
+            except apsw.Error as e:
+                logging.error(f'Failed to execute `{req.strip()}`: {e}')
+                if isinstance(res, Future):
+                    res.set_exception(e)
+                elif isinstance(res, Queue):
+                    res.put(e)
+            finally:
+                if isinstance(res, Queue):
+                    res.put(None)
+        try:
+            self.cursor.execute('COMMIT')
+        except apsw.Error as e:
+            logging.error(f'Failed to commit: {e}')
+            self.cursor.execute('ROLLBACK')
+            for future, _ in done:
+                future.set_exception(e)
+        else:
+            for future, changes in done:
+                future.set_result(changes)
 
     def run(self):
-        db = apsw.Connection(self.db_path)
-        self.cursor = db.cursor()
+        try:
+            db = apsw.Connection(self.db_path, statementcachesize=self.statement_cache_size)
+            self.connection = db
+            self.cursor = db.cursor()
 
-        self.check_and_init_db()
+            if self.readers > 0:
+                self.cursor.execute('PRAGMA journal_mode = WAL')
+                # Durable at checkpoints, consistent after a crash
+                self.cursor.execute('PRAGMA synchronous = NORMAL')
+            self.check_and_init_db()
+        except apsw.Error as e:
+            logging.error(f'Failed to open database {self.db_path}: {e}')
+            if self.connection is not None:
+                self.connection.close()
+            # Wake up callers waiting for this thread, they raise the error
+            with self._progress:
+                self._error = e
+                self._progress.notify_all()
+            self._ready.set()
+            return
+        self._ready.set()
 
-        while True:
-            req, args, res = self.queue.get()
+        running = True
+        while running:
+            batch = self._next_batch()
 
             # Close if req is None
-            if req is None:
-                break
+            if batch[-1][0] is None:
+                running = False
+                batch.pop()
 
-            self.cursor.execute(req, args)
-            if res:
-                for rec in self.cursor:
-                    res.put(rec)
-                res.put(None)
+            statements = [item for item in batch if item[0] is not _FLUSH]
+            if len(statements) > 0:
+                self._execute_batch(statements)
+            with self._progress:
+                self._executed += len(batch) + (0 if running else 1)
+                self._progress.notify_all()
 
         db.close()
-    
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _put(self, item: tuple):
+        with self._progress:
+            self._raise_error()
+            self._queued += 1
+            self.queue.put(item)
+
     def execute(self, request, args=None, res=None):
-        self.queue.put((request, args or tuple(), res))
-    
-    def select(self, request, args=None):
+        self._put((request, args or tuple(), res, False))
+
+    def executemany(self, request, args: Iterable, res: Future = None):
+        """Queue one statement executed for every item of `args`, e.g. a bulk insert.
+
+        Args:
+            request (str): SQL statement
+            args (Iterable): Sequence of bindings
+            res (Future, optional): Resolved like the future returned by `submit`. Defaults to None.
+        """
+        self._put((request, list(args), res, True))
+
+    def submit(self, request, args=None, many: bool = False) -> Future:
+        """Queue a write and return a future resolved once its transaction is committed.
+
+        Args:
+            request (str): SQL statement
+            args (optional): Bindings, or a sequence of bindings if `many`. Defaults to None.
+            many (bool, optional): Execute the statement for every item of `args`. Defaults to False.
+
+        Returns:
+            Future: Number of changed rows, or the `apsw.Error` raised by the statement or the commit
+        """
+        res = Future()
+        if many:
+            self.executemany(request, args, res)
+        else:
+            self.execute(request, args, res)
+        return res
+
+    def flush(self):
+        """Wait until all statements queued before this call are executed.
+
+        Raises:
+            apsw.Error: If the database could not be opened or migrated
+        """
+        with self._progress:
+            self._raise_error()
+            if self._executed >= self._queued:
+                return
+            self._put((_FLUSH, None, None, False))
+            target = self._queued
+            self._progress.wait_for(lambda: self._executed >= target or self._error is not None)
+            self._raise_error()
+
+    def _acquire_reader(self) -> apsw.Connection:
+        try:
+            return self._reader_pool.get_nowait()
+        except Empty:
+            pass
+        with self._progress:
+            create = self._reader_count < self.readers
+            if create:
+                self._reader_count += 1
+        self._ready.wait()
+        self._raise_error()
+        if not create:
+            return self._reader_pool.get()
+        connection = apsw.Connection(
+            self.db_path,
+            flags=apsw.SQLITE_OPEN_READONLY,
+            statementcachesize=self.statement_cache_size
+        )
+        connection.setbusytimeout(READER_BUSY_TIMEOUT)
+        return connection
+
+    def select(self, request, args=None, wait: bool = True):
+        """Run a query and yield its rows.
+
+        Args:
+            request (str): SQL query
+            args (optional): Bindings. Defaults to None.
+            wait (bool, optional): Wait for writes queued before this call, so they are visible. Defaults to True.
+
+        Raises:
+            apsw.Error: If the query fails, so a failed read is not mistaken for missing rows
+
+        Yields:
+            tuple: Rows
+        """
+        if self.readers == 0:
+            yield from self._select_on_writer(request, args)
+            return
+
+        if wait:
+            self.flush()
+        connection = self._acquire_reader()
+        cursor = connection.cursor()
+        try:
+            yield from cursor.execute(request, args or tuple())
+        except apsw.Error as e:
+            logging.error(f'Failed to execute `{request.strip()}`: {e}')
+            raise
+        finally:
+            # Ends the read transaction, even if the caller stopped early
+            cursor.close()
+            self._reader_pool.put(connection)
+
+    def _select_on_writer(self, request, args=None):
         res = Queue()
         self.execute(request, args, res)
         while True:
-            rec = res.get()
-            if rec is None:
+            chunk = res.get()
+            if chunk is None:
                 break
-            yield rec
+            if isinstance(chunk, apsw.Error):
+                raise chunk
+            yield from chunk
+
+    def get_available_qualities(self, media_id: str) -> Union[list, None]:
+        """Get recorded available quality IDs of a track or video.
+
+        Args:
+            media_id (str): Track or video id
+
+        Returns:
+            Union[list, None]: Available quality IDs, or None if never probed
+        """
+        for rec in self.select('SELECT qualities FROM media_qualities WHERE media_id = ?', (media_id,)):
+            return [int(q) for q in rec[0].split(',') if q != '']
+        return None
+
+    def set_available_qualities(self, media_id: str, qualities: list):
+        """Record available quality IDs of a track or video.
+
+        Args:
+            media_id (str): Track or video id
+            qualities (list): Available quality IDs
+        """
+        self.execute(
+            'INSERT OR REPLACE INTO media_qualities (media_id, qualities) VALUES (?, ?)',
+            (media_id, ','.join(str(q) for q in sorted(qualities)))
+        )
+
+    def clear_available_qualities(self, media_id: str):
+        """Forget recorded available qualities of a track or video, e.g. after a recorded link disappeared.
+
+        Args:
+            media_id (str): Track or video id
+        """
+        self.execute('DELETE FROM media_qualities WHERE media_id = ?', (media_id,))
+
+    def upsert_artist(self, artist):
+        """Insert or update an artist.
+
+        Args:
+            artist (Artist): Artist
+        """
+        self.execute("""
+            INSERT INTO artists (id, name, id_number) VALUES (?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET name = excluded.name, id_number = excluded.id_number
+        """, (artist.artist_id, artist.artist_name, artist.artist_id_number))
+
+    def upsert_album(self, album):
+        """Insert or update an album and its tracklist.
+
+        Args:
+            album (Album): Album
+        """
+        self.execute("""
+            INSERT INTO albums (id, name, year_published) VALUES (?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET name = excluded.name, year_published = excluded.year_published
+        """, (album.album_id, album.album_name, album.year_published))
+        # Register tracks by title until their own page is crawled
+        self.executemany(
+            'INSERT INTO tracks (id, name, album_id) VALUES (?, ?, ?) ON CONFLICT (id) DO NOTHING',
+            [(track['id'], track['title'], album.album_id) for track in album.tracklist]
+        )
+        self.executemany("""
+            INSERT INTO album_tracks (album_id, track_id, track_idx) VALUES (?, ?, ?)
+            ON CONFLICT (album_id, track_id) DO UPDATE SET track_idx = excluded.track_idx
+        """, [(album.album_id, track['id'], track['number']) for track in album.tracklist])
+
+    def upsert_track(self, track):
+        """Insert or update a track and link it to its artists and album.
+
+        Args:
+            track (Track): Track
+        """
+        self.execute("""
+            INSERT INTO tracks (id, name, composer, album_id, year_published, base_download_path, filename)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                name = excluded.name,
+                composer = excluded.composer,
+                album_id = excluded.album_id,
+                year_published = excluded.year_published,
+                base_download_path = excluded.base_download_path,
+                filename = excluded.filename
+        """, (
+            track.track_id, track.song_title, track.composers, track.album_id,
+            track.published_year, track.base_download_path, track.filename
+        ))
+        if track.album_id is not None:
+            self.execute(
+                'INSERT INTO albums (id, name) VALUES (?, ?) ON CONFLICT (id) DO NOTHING',
+                (track.album_id, track.album)
+            )
+        self.executemany(
+            'INSERT INTO artists (id) VALUES (?) ON CONFLICT (id) DO NOTHING',
+            [(artist_id,) for artist_id in track.artist_ids]
+        )
+        self.executemany(
+            'INSERT INTO artists_tracks (artists_id, track_id) VALUES (?, ?) ON CONFLICT DO NOTHING',
+            [(artist_id, track.track_id) for artist_id in track.artist_ids]
+        )
+
+    def upsert_video(self, video):
+        """Insert or update a video and link it to its artists.
+
+        Args:
+            video (Video): Video
+        """
+        self.execute("""
+            INSERT INTO videos (id, name, composer, year_published) VALUES (?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                name = excluded.name,
+                composer = excluded.composer,
+                year_published = excluded.year_published
+        """, (video.video_id, video.video_title, video.composers, video.published_year))
+        self.executemany(
+            'INSERT INTO artists (id) VALUES (?) ON CONFLICT (id) DO NOTHING',
+            [(artist_id,) for artist_id in video.artist_ids]
+        )
+        self.executemany(
+            'INSERT INTO artists_videos (artists_id, video_id) VALUES (?, ?) ON CONFLICT DO NOTHING',
+            [(artist_id, video.video_id) for artist_id in video.artist_ids]
+        )
+
+    def mark_track_downloaded(self, track_id: str, download_path: Union[str, Path]):
+        self.execute('UPDATE tracks SET download_path = ? WHERE id = ?', (str(download_path), track_id))
+
+    def mark_video_downloaded(self, video_id: str, download_path: Union[str, Path]):
+        self.execute('UPDATE videos SET download_path = ? WHERE id = ?', (str(download_path), video_id))
+
+    def tracks_for_album(self, album_id: str) -> list:
+        """Get tracks of an album ordered by track number.
+
+        Args:
+            album_id (str): Album id
+
+        Returns:
+            list: List of (track id, track number, name, download path)
+        """
+        return list(self.select("""
+            SELECT album_tracks.track_id, album_tracks.track_idx, tracks.name, tracks.download_path
+            FROM album_tracks LEFT JOIN tracks ON tracks.id = album_tracks.track_id
+            WHERE album_tracks.album_id = ?
+            ORDER BY album_tracks.track_idx
+        """, (album_id,)))
+
+    def tracks_for_artist(self, artist_id: str) -> list:
+        """Get tracks of an artist.
+
+        Args:
+            artist_id (str): Artist id
+
+        Returns:
+            list: List of (track id, name, download path)
+        """
+        return list(self.select("""
+            SELECT artists_tracks.track_id, tracks.name, tracks.download_path
+            FROM artists_tracks LEFT JOIN tracks ON tracks.id = artists_tracks.track_id
+            WHERE artists_tracks.artists_id = ?
+        """, (artist_id,)))
+
+    def is_downloaded(self, media_id: str) -> bool:
+        """Return True if the track or video was downloaded and the file still exists.
+
+        Args:
+            media_id (str): Track or video id
+
+        Returns:
+            bool: True if downloaded
+        """
+        for rec in self.select("""
+            SELECT download_path FROM tracks WHERE id = ? AND download_path IS NOT NULL
+            UNION ALL
+            SELECT download_path FROM videos WHERE id = ? AND download_path IS NOT NULL
+        """, (media_id, media_id)):
+            if Path(rec[0]).exists():
+                return True
+        return False
+
+    def get_artist_items(self, artist_id: str, tab: str) -> set:
+        """Get IDs already seen on a tab of an artist.
+
+        Args:
+            artist_id (str): Artist id
+            tab (str): Tab name (music, video or album)
+
+        Returns:
+            set: Item IDs
+        """
+        return {rec[0] for rec in self.select(
+            'SELECT item_id FROM artist_items WHERE artist_id = ? AND tab = ?', (artist_id, tab)
+        )}
+
+    def add_artist_items(self, artist_id: str, tab: str, item_ids: Iterable):
+        self.executemany(
+            'INSERT INTO artist_items (artist_id, tab, item_id) VALUES (?, ?, ?) ON CONFLICT DO NOTHING',
+            [(artist_id, tab, item_id) for item_id in item_ids]
+        )
+
+    def get_last_full_sync(self, artist_id: str, tab: str) -> Union[float, None]:
+        """Get the time of the last full sweep of a tab of an artist.
+
+        Args:
+            artist_id (str): Artist id
+            tab (str): Tab name (music, video or album)
+
+        Returns:
+            Union[float, None]: Unix timestamp, or None if never swept
+        """
+        for rec in self.select('SELECT last_full_sync FROM artist_syncs WHERE artist_id = ? AND tab = ?', (artist_id, tab)):
+            return rec[0]
+        return None
+
+    def set_last_full_sync(self, artist_id: str, tab: str, timestamp: float):
+        self.execute(
+            'INSERT OR REPLACE INTO artist_syncs (artist_id, tab, last_full_sync) VALUES (?, ?, ?)',
+            (artist_id, tab, timestamp)
+        )
+
+    def add_to_frontier(self, items: Iterable):
+        """Queue pages for crawling. Pages already in the frontier, crawled or not, are ignored.
+
+        Args:
+            items (Iterable): (kind, id, depth) tuples
+        """
+        self.executemany(
+            'INSERT INTO crawl_frontier (kind, id, depth) VALUES (?, ?, ?) ON CONFLICT DO NOTHING',
+            items
+        )
+
+    def get_frontier(self, limit: int) -> list:
+        """Get pending pages, shallowest first.
+
+        Args:
+            limit (int): Maximum number of pages
+
+        Returns:
+            list: (kind, id, depth) tuples
+        """
+        return list(self.select(
+            "SELECT kind, id, depth FROM crawl_frontier WHERE state = 'pending' ORDER BY depth, rowid LIMIT ?",
+            (limit,)
+        ))
+
+    def set_crawl_states(self, items: Iterable):
+        """Record the outcome of crawled pages.
+
+        Args:
+            items (Iterable): (state, kind, id) tuples, state is one of 'done', 'missing' or 'failed'
+        """
+        self.executemany('UPDATE crawl_frontier SET state = ? WHERE kind = ? AND id = ?', items)
+
+    def requeue_failed_crawls(self):
+        self.execute("UPDATE crawl_frontier SET state = 'pending' WHERE state = 'failed'")
+
+    def get_crawl_stats(self) -> dict:
+        """Count frontier pages by state.
+
+        Returns:
+            dict: Mapping of state to number of pages
+        """
+        return dict(self.select('SELECT state, count(*) FROM crawl_frontier GROUP BY state'))
 
     def close(self):
-        self.execute(None)
+        # The thread has already stopped if it failed to open the database
+        if self._error is None:
+            self.execute(None)
+        while True:
+            try:
+                self._reader_pool.get_nowait().close()
+            except Empty:
+                break
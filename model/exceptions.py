@@ -14,3 +14,7 @@ class NetworkError(Error):
 class NotFoundError(Error):
     def __init__(self, message: str):
         super().__init__(message)
+
+class QueueFullError(Error):
+    def __init__(self, max_queued: int):
+        super().__init__(f'Job queue is full ({max_queued} jobs queued).')
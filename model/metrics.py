@@ -0,0 +1,199 @@
+from bisect import bisect_left
+from functools import wraps
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Union
+from urllib.parse import urlsplit
+import json
+import time
+
+
+# Upper bounds in seconds, Prometheus style
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Path markers of page kinds on chiasenhac.vn, checked in order
+PAGE_KINDS = (
+    ('tab_artist', 'tab_artist'),
+    ('/mp3/', 'track_page'),
+    ('/nghe-album/', 'album_page'),
+    ('/hd/', 'video_page'),
+    ('/ca-si/', 'artist_page'),
+)
+
+
+def url_kind(method: str, url: str) -> str:
+    """Classify a request for metrics labels.
+
+    Args:
+        method (str): HTTP method
+        url (str): URL
+
+    Returns:
+        str: Page kind on chiasenhac.vn, e.g. 'track_page', otherwise 'media_head' or 'media_get'
+    """
+    if urlsplit(url).netloc.endswith('chiasenhac.vn'):
+        for marker, kind in PAGE_KINDS:
+            if marker in url:
+                return kind
+        return 'other_page'
+    return f'media_{method.lower()}'
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> list:
+        """Return (upper bound, cumulative count) pairs, ending with +Inf."""
+        res = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            res.append((bound, total))
+        return res
+
+
+class Metrics:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        """Thread-safe registry of latency histograms, counters and gauges, keyed by name and labels.
+
+        Args:
+            buckets (tuple, optional): Histogram upper bounds in seconds. Defaults to DEFAULT_BUCKETS.
+        """
+        self.buckets = buckets
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = Lock()
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(self.buckets)
+            self.histograms[key].observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.gauges[key] = value
+
+    def to_json(self) -> dict:
+        """Return all metrics as a JSON serializable dict."""
+        with self._lock:
+            histograms = [
+                {
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': hist.count,
+                    'sum': round(hist.sum, 6),
+                    'buckets': {str(bound): count for bound, count in hist.cumulative()},
+                }
+                for (name, labels), hist in sorted(self.histograms.items())
+            ]
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            gauges = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self.gauges.items())
+            ]
+        return {'histograms': histograms, 'counters': counters, 'gauges': gauges}
+
+    def to_prometheus(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        def fmt(labels: tuple, extra: tuple = ()) -> str:
+            items = [f'{k}="{v}"' for k, v in labels + extra]
+            return '{' + ','.join(items) + '}' if items else ''
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), hist in sorted(self.histograms.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f'# TYPE {name} histogram')
+                for bound, count in hist.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{fmt(labels, (("le", le),))} {count}')
+                lines.append(f'{name}_sum{fmt(labels)} {hist.sum:.6f}')
+                lines.append(f'{name}_count{fmt(labels)} {hist.count}')
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f'# TYPE {name} counter')
+                lines.append(f'{name}{fmt(labels)} {value}')
+            for (name, labels), value in sorted(self.gauges.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name}{fmt(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: Union[str, Path]):
+        """Write metrics to `path`, as JSON if it ends with .json, otherwise as Prometheus text."""
+        path = Path(path)
+        if path.suffix == '.json':
+            path.write_text(json.dumps(self.to_json(), indent=2), encoding='utf-8')
+        else:
+            path.write_text(self.to_prometheus(), encoding='utf-8')
+
+
+_metrics = None
+
+
+def enable_metrics(**kwargs) -> Metrics:
+    """Start recording metrics of requests, downloads and parsers.
+
+    Args:
+        **kwargs: Arguments passed to `Metrics`
+
+    Returns:
+        Metrics: Registry
+    """
+    global _metrics
+    _metrics = Metrics(**kwargs)
+    return _metrics
+
+
+def disable_metrics():
+    global _metrics
+    _metrics = None
+
+
+def get_metrics() -> Union[Metrics, None]:
+    """Return the active registry, or None if metrics are disabled."""
+    return _metrics
+
+
+def timed(name: str) -> Callable:
+    """Decorator recording the duration of each call in `csn_parse_seconds{parser=name}`.
+    Costs one global lookup per call while metrics are disabled.
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            metrics = _metrics
+            if metrics is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe('csn_parse_seconds', time.perf_counter() - start, parser=name)
+        return wrapper
+    return decorator
@@ -0,0 +1,317 @@
+from typing import Union
+
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.element import Tag
+
+from model.exceptions import *
+from model.metrics import timed
+from model.utils import extract_id, is_error
+
+try:
+    import lxml  # noqa: F401
+    DEFAULT_BACKEND = 'lxml'
+except ImportError:
+    DEFAULT_BACKEND = 'html.parser'
+
+
+_backend = DEFAULT_BACKEND
+
+
+def set_backend(backend: str):
+    """Set the BeautifulSoup tree builder used by all model classes.
+
+    Args:
+        backend (str): Tree builder name, e.g. 'lxml' or 'html.parser'
+    """
+    global _backend
+    _backend = backend
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def class_strainer(*classes: str) -> SoupStrainer:
+    """Return a SoupStrainer keeping only elements (and their subtrees) having one of `classes`.
+
+    Args:
+        *classes (str): CSS classes to keep
+
+    Returns:
+        SoupStrainer: Strainer
+    """
+    wanted = set(classes)
+
+    def match(value):
+        if value is None:
+            return False
+        # The class attribute is still a raw string while parsing
+        values = value.split() if isinstance(value, str) else value
+        return not wanted.isdisjoint(values)
+
+    return SoupStrainer(class_=match)
+
+
+# Model pages only need the main content and the download links
+PAGE_STRAINER = class_strainer('wrapper_content', 'download_item')
+# Artist tab pages only need the pagination and the listed items
+TAB_STRAINER = class_strainer('pagination', 'media', 'card-title')
+
+
+def make_soup(text: str, parse_only: SoupStrainer = None, backend: str = None) -> BeautifulSoup:
+    """Parse HTML with the configured backend.
+
+    Args:
+        text (str): HTML
+        parse_only (SoupStrainer, optional): Only parse matching subtrees. Defaults to None (whole page).
+        backend (str, optional): Tree builder, overriding the configured one. Defaults to None.
+
+    Returns:
+        BeautifulSoup: Parsed tree
+    """
+    return BeautifulSoup(text, backend or _backend, parse_only=parse_only)
+
+
+def parse_page(text: str, not_found_message: str, backend: str = None) -> tuple:
+    """Parse a model page and check it for errors.
+
+    Args:
+        text (str): HTML
+        not_found_message (str): Message of the NotFoundError raised on 404
+        backend (str, optional): Tree builder. Defaults to the configured one.
+
+    Raises:
+        NotFoundError: If site returns 404
+        Error: Unknown errors
+
+    Returns:
+        tuple: (soup, wrapper_content tag, container tag)
+    """
+    soup = make_soup(text, PAGE_STRAINER, backend)
+    wrapper = soup.findChildren(class_='wrapper_content')[0]
+    container = wrapper.findChildren(class_='container', recursive=False)[0]
+
+    # Check for error
+    error_code = is_error(container)
+    if error_code == '404':
+        raise NotFoundError(not_found_message)
+    elif error_code != False:
+        raise Error(f'Unknown error. Code: {error_code}')
+
+    return soup, wrapper, container
+
+
+def parse_info_list(card_body: Tag, skip_search_links: bool = True) -> dict:
+    """Get artists, composers, album and year info of a track or video.
+
+    Args:
+        card_body (Tag): Card body containing the info list
+        skip_search_links (bool, optional): Do not take artist ids from search links. Defaults to True.
+
+    Returns:
+        dict: Info
+    """
+    info = {
+        'artists': [],
+        'artist_ids': [],
+        'composers': None,
+        'album': None,
+        'album_id': None,
+        'published_year': None,
+    }
+
+    for item in card_body.find('ul').findAll('li'):
+        text = item.text
+        if text[:text.find(':')] == 'Ca sĩ':
+            artists = item.findAll('a')
+            for artist in artists:
+                info['artists'].append(artist.text)
+                if skip_search_links and 'tim-kiem?q' in artist['href']:
+                    continue
+                info['artist_ids'].append(extract_id(artist['href']))
+        elif text[:text.find(':')] == 'Sáng tác':
+            info['composers'] = text[text.find(':') + 2:]
+        elif text[:text.find(':')] == 'Năm phát hành':
+            info['published_year'] = int(text[text.rfind(' ') + 1:])
+        elif text[:text.find(':')] == 'Album':
+            info['album'] = text[text.find(':') + 2:]
+            info['album_id'] = extract_id(item.findAll('a')[0]['href'])
+
+    return info
+
+
+def parse_download_link(soup: BeautifulSoup) -> dict:
+    """Get filename and base download path from the first download link.
+
+    Args:
+        soup (BeautifulSoup): Parsed page
+
+    Returns:
+        dict: `filename` and `base_download_path`
+    """
+    download_items = soup.findChildren(class_='download_item')
+    _download_link = download_items[0]['href']
+    # Filename
+    filename = _download_link.split('/')[-1]
+    filename = filename[:filename.rfind('.')]
+    # Base download path
+    base_download_path = _download_link[:_download_link.rfind('/')]
+    base_download_path = base_download_path[:base_download_path.rfind('/')]
+    return {'filename': filename, 'base_download_path': base_download_path}
+
+
+@timed('parse_track')
+def parse_track(text: str, track_id: str, backend: str = None) -> dict:
+    """Get info of a track from its page.
+
+    Args:
+        text (str): HTML of https://chiasenhac.vn/mp3/<track_id>.html
+        track_id (str): Track id
+        backend (str, optional): Tree builder. Defaults to the configured one.
+
+    Raises:
+        NotFoundError: If site returns 404
+        Error: Unknown errors
+
+    Returns:
+        dict: Track info
+    """
+    soup, _, container = parse_page(text, f'Song id {track_id} not found.', backend)
+    card_body = container.findAll(class_='card-body')[0]
+
+    info = {'song_title': card_body.findAll(class_='card-title')[0].text}
+    info.update(parse_info_list(card_body))
+    info.update(parse_download_link(soup))
+    return info
+
+
+@timed('parse_video')
+def parse_video(text: str, video_id: str, backend: str = None) -> dict:
+    """Get info of a video from its page.
+
+    Args:
+        text (str): HTML of https://chiasenhac.vn/hd/<video_id>.html
+        video_id (str): Video id
+        backend (str, optional): Tree builder. Defaults to the configured one.
+
+    Raises:
+        NotFoundError: If site returns 404
+        Error: Unknown errors
+
+    Returns:
+        dict: Video info
+    """
+    soup, _, container = parse_page(text, f'Video id {video_id} not found.', backend)
+    card_body = container.findAll(class_='card-body')[0]
+
+    info = {'video_title': card_body.findAll(class_='card-title')[0].text}
+    info.update(parse_info_list(card_body, skip_search_links=False))
+    del info['album'], info['album_id']
+    info.update(parse_download_link(soup))
+    return info
+
+
+@timed('parse_album')
+def parse_album(text: str, album_id: str, backend: str = None) -> dict:
+    """Get info and tracklist of an album from its page.
+
+    Args:
+        text (str): HTML of https://chiasenhac.vn/nghe-album/<album_id>.html
+        album_id (str): Album id
+        backend (str, optional): Tree builder. Defaults to the configured one.
+
+    Raises:
+        NotFoundError: If site returns 404
+        Error: Unknown errors
+
+    Returns:
+        dict: Album info
+    """
+    _, _, container = parse_page(text, f'Album id {album_id} not found.', backend)
+    card_body = container.findChildren(class_='card-details')[0].findChildren(class_='card-body')[0]
+
+    info = {'album_name': None, 'year_published': None}
+    for item in card_body.findAll('li'):
+        if item.text.startswith('Album: '):
+            info['album_name'] = item.text[item.text.find(':') + 2:]
+        elif item.text.startswith('Năm phát hành: '):
+            info['year_published'] = int(item.text[item.text.find(':') + 2:])
+
+    info['tracklist'] = parse_tracklist(container.find(class_='d-table'))
+    return info
+
+
+def parse_tracklist(song_table: Tag) -> list[dict]:
+    """Get tracklist of album
+
+    Args:
+        song_table (Tag): Song table from page
+
+    Returns:
+        list[dict]: List of songs
+    """
+    song_list = []
+
+    for tag in song_table:
+        if not isinstance(tag, Tag):
+            continue
+
+        if tag.attrs.get('id') is None or not tag.attrs['id'].startswith('music-listen'):
+            continue
+
+        song_no = tag.find(class_='name').find('a').text
+        song_no = int(song_no[:song_no.find('.')])
+        song_title = tag.find(class_='name').find('a')['title']
+        song_id = extract_id(tag.find(class_='list-inline-item').find('a')['href'])
+        song_list.append({
+            'title': song_title,
+            'number': song_no,
+            'id': song_id
+        })
+
+    return song_list
+
+
+@timed('parse_artist')
+def parse_artist(text: str, artist_id: Union[str, int], backend: str = None) -> dict:
+    """Get artist name from an artist page.
+
+    Args:
+        text (str): HTML of https://chiasenhac.vn/ca-si/<artist_id>.html
+        artist_id (Union[str, int]): Artist id or id number
+        backend (str, optional): Tree builder. Defaults to the configured one.
+
+    Raises:
+        NotFoundError: If site returns 404
+        Error: Unknown errors
+
+    Returns:
+        dict: Artist info
+    """
+    _, wrapper, _ = parse_page(text, f'Artist id {artist_id} not found.', backend)
+    return {'artist_name': wrapper.findChild(class_='artist_name_box').text}
+
+
+@timed('parse_tab')
+def parse_tab(text: str, tab: str, backend: str = None) -> tuple:
+    """Get number of pages and item IDs from a `tab_artist` page.
+
+    Args:
+        text (str): HTML of a tab_artist page
+        tab (str): Tab name (music, video or album)
+        backend (str, optional): Tree builder. Defaults to the configured one.
+
+    Returns:
+        tuple: (number of pages, list of item IDs)
+    """
+    soup = make_soup(text, TAB_STRAINER, backend)
+
+    pagination = soup.findAll(class_='pagination')
+    number_of_pages = int(pagination[0].findAll('li')[-1].text) if len(pagination) > 0 else 1
+
+    if tab == 'music':
+        ids = [extract_id(song.findChildren(class_='media-title')[0].find('a')['href']) for song in soup.findAll(class_='media')]
+    else:
+        ids = [extract_id(card.find('a')['href']) for card in soup.findAll(class_='card-title')]
+
+    return number_of_pages, ids
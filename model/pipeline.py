@@ -0,0 +1,156 @@
+from pathlib import Path
+from queue import Queue
+from threading import Lock, Thread
+from typing import Callable, Iterable
+import time
+
+from model.exceptions import *
+from model.logger import logging
+
+
+class PipelineStats:
+    def __init__(self):
+        self.downloaded = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.finished = None
+        self._lock = Lock()
+
+    def add(self, field: str, value: int = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + value)
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished if self.finished is not None else time.monotonic()
+        return end - self.started
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second."""
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f'Downloaded {self.downloaded}, skipped {self.skipped}, failed {self.failed} '
+            f'in {self.elapsed:.1f}s ({self.bytes / 1024 / 1024:.1f} MiB, '
+            f'{self.throughput / 1024 / 1024:.2f} MiB/s).'
+        )
+
+
+_STOP = object()
+
+
+class Pipeline:
+    def __init__(
+        self,
+        resolve: Callable,
+        download: Callable,
+        describe: Callable = None,
+        metadata_workers: int = 4,
+        download_workers: int = 2,
+    ):
+        """Bounded producer/consumer pipeline. Metadata workers turn jobs into model
+        objects with `resolve`, download workers fetch their media with `download`.
+
+        Jobs whose `resolve` or `download` raises `NotFoundError` are skipped, as are
+        jobs for which `resolve` returns None (e.g. already downloaded).
+
+        Args:
+            resolve (Callable): `resolve(job)` returns a model object (e.g. `Track`), or None to skip the job
+            download (Callable): `download(job, obj)` downloads the object and returns its path
+            describe (Callable, optional): `describe(job, obj)` returns a label used in skip messages. Defaults to `str(job)`.
+            metadata_workers (int, optional): Number of metadata workers. Defaults to 4.
+            download_workers (int, optional): Number of download workers. Defaults to 2.
+        """
+        self.resolve = resolve
+        self.download = download
+        self.describe = describe or (lambda job, obj: str(job))
+        self.metadata_workers = max(1, int(metadata_workers))
+        self.download_workers = max(1, int(download_workers))
+
+    def _metadata_worker(self, jobs: Queue, resolved: Queue, stats: PipelineStats):
+        while True:
+            job = jobs.get()
+            if job is _STOP:
+                break
+            try:
+                obj = self.resolve(job)
+                if obj is None:
+                    logging.info(f'Skipped {self.describe(job, None)} because it is already downloaded.')
+                    stats.add('skipped')
+                    continue
+                resolved.put((job, obj))
+            except NotFoundError:
+                logging.warning(f'Skipped {self.describe(job, None)} because it was not found.')
+                stats.add('skipped')
+            except Exception as e:
+                logging.error(f'Failed to get info of {self.describe(job, None)}: {e}')
+                stats.add('failed')
+
+    def _download_worker(self, resolved: Queue, stats: PipelineStats):
+        while True:
+            item = resolved.get()
+            if item is _STOP:
+                break
+            job, obj = item
+            try:
+                path = self.download(job, obj)
+            except NotFoundError:
+                logging.warning(f'Skipped {self.describe(job, obj)} because no download link is available.')
+                stats.add('skipped')
+                continue
+            except Exception as e:
+                logging.error(f'Failed to download {self.describe(job, obj)}: {e}')
+                stats.add('failed')
+                continue
+            stats.add('downloaded')
+            if path is not None and Path(path).exists():
+                stats.add('bytes', Path(path).stat().st_size)
+
+    def run(self, jobs: Iterable) -> PipelineStats:
+        """Run all jobs through the pipeline and wait for completion.
+
+        Args:
+            jobs (Iterable): Jobs passed to `resolve`
+
+        Raises:
+            Exception: Whatever iterating `jobs` raised, after the queued jobs finished
+
+        Returns:
+            PipelineStats: Counters, wall-clock time and throughput
+        """
+        stats = PipelineStats()
+        job_queue = Queue(maxsize=self.metadata_workers * 2)
+        resolved = Queue(maxsize=self.download_workers * 2)
+
+        metadata_threads = [
+            Thread(target=self._metadata_worker, args=(job_queue, resolved, stats), daemon=True)
+            for _ in range(self.metadata_workers)
+        ]
+        download_threads = [
+            Thread(target=self._download_worker, args=(resolved, stats), daemon=True)
+            for _ in range(self.download_workers)
+        ]
+        for thread in metadata_threads + download_threads:
+            thread.start()
+
+        try:
+            for job in jobs:
+                job_queue.put(job)
+        finally:
+            # Stop the workers even if `jobs` raised, jobs already queued still run
+            for _ in metadata_threads:
+                job_queue.put(_STOP)
+            for thread in metadata_threads:
+                thread.join()
+
+            for _ in download_threads:
+                resolved.put(_STOP)
+            for thread in download_threads:
+                thread.join()
+
+        stats.finished = time.monotonic()
+        return stats
@@ -0,0 +1,95 @@
+from model.exceptions import *
+from model.logger import logging
+from model.utils import head, iter_concurrent
+
+
+UNAVAILABLE_STATUS_CODES = [404, 302]
+
+
+def probe_qualities(base_download_path: str, filename: str, qualities: dict) -> dict:
+    """Send HEAD requests for every quality concurrently.
+
+    Args:
+        base_download_path (str): Base download path of the track or video
+        filename (str): Filename without extension
+        qualities (dict): Mapping of quality ID to (quality, extension)
+
+    Returns:
+        dict: Mapping of quality ID to (download link, HEAD response)
+    """
+    links = {
+        quality_id: f'{base_download_path}/{quality}/{filename}{extension}'
+        for quality_id, (quality, extension) in qualities.items()
+    }
+    quality_ids = sorted(links)
+    responses = iter_concurrent(lambda quality_id: head(links[quality_id]), quality_ids, len(quality_ids))
+    return {quality_id: (links[quality_id], resp) for quality_id, resp in zip(quality_ids, responses)}
+
+
+def find_download_link(
+    media_id: str,
+    base_download_path: str,
+    filename: str,
+    qualities: dict,
+    quality_id: int,
+    database=None
+) -> tuple:
+    """Find the best available download link, starting from `quality_id` and going down.
+
+    Available qualities are read from `database` if they were recorded before, and only
+    the chosen link is checked. Otherwise, or if the recorded link is gone, all qualities
+    are probed concurrently and the result is recorded.
+
+    Args:
+        media_id (str): Track or video id
+        base_download_path (str): Base download path of the track or video
+        filename (str): Filename without extension
+        qualities (dict): Mapping of quality ID to (quality, extension)
+        quality_id (int): Preferred quality ID
+        database (Database, optional): Database used to cache available qualities. Defaults to None.
+
+    Raises:
+        NotFoundError: No download links available
+        Error: Unknown error
+
+    Returns:
+        tuple: (quality ID, download link, HEAD response)
+    """
+    available = database.get_available_qualities(media_id) if database is not None else None
+    if available is not None:
+        q_id = next((q_id for q_id in sorted(qualities) if q_id >= quality_id and q_id in available), None)
+        if q_id is None:
+            raise NotFoundError(f'Cannot find available download link for {media_id}.')
+        quality, extension = qualities[q_id]
+        link = f'{base_download_path}/{quality}/{filename}{extension}'
+        resp = head(link)
+        if resp.status_code not in UNAVAILABLE_STATUS_CODES:
+            if resp.status_code >= 400:
+                raise Error(f'Unknown error.')
+            return q_id, link, resp
+        # Recorded availability is stale, probe all qualities again
+        logging.info(f'Recorded download link for quality "{quality}" of {media_id} returned {resp.status_code} error. Probing all qualities again.')
+        database.clear_available_qualities(media_id)
+
+    probes = probe_qualities(base_download_path, filename, qualities)
+
+    if database is not None and all(
+        resp.status_code < 400 or resp.status_code in UNAVAILABLE_STATUS_CODES for _, resp in probes.values()
+    ):
+        database.set_available_qualities(media_id, [
+            q_id for q_id, (_, resp) in probes.items() if resp.status_code not in UNAVAILABLE_STATUS_CODES
+        ])
+
+    for q_id in sorted(qualities):
+        if q_id < quality_id:
+            continue
+        link, resp = probes[q_id]
+        if resp.status_code in UNAVAILABLE_STATUS_CODES:
+            # If specified quality is not available, try lower quality
+            logging.warning(f'Download link for quality "{qualities[q_id][0]}" of {media_id} returned {resp.status_code} error. Trying lower quality.')
+            continue
+        if resp.status_code >= 400:
+            raise Error(f'Unknown error.')
+        return q_id, link, resp
+
+    raise NotFoundError(f'Cannot find available download link for {media_id}.')
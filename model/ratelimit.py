@@ -0,0 +1,148 @@
+from email.utils import parsedate_to_datetime
+from threading import Condition, Lock
+from typing import Union
+from urllib.parse import urlsplit
+import random
+import time
+
+
+# Responses meaning the server is overloaded or throttling us
+THROTTLE_STATUS_CODES = (429, 503)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class HostLimiter:
+    def __init__(
+        self,
+        rate: float = 10.0,
+        min_rate: float = 0.5,
+        max_rate: float = 50.0,
+        concurrency: float = 8,
+        max_concurrency: int = 16
+    ):
+        """Token bucket with AIMD concurrency for a single host.
+
+        Successful responses additively increase the request rate and concurrency,
+        throttling responses (429/503) halve them.
+
+        Args:
+            rate (float, optional): Initial requests per second. Defaults to 10.0.
+            min_rate (float, optional): Lowest requests per second. Defaults to 0.5.
+            max_rate (float, optional): Highest requests per second. Defaults to 50.0.
+            concurrency (float, optional): Initial number of requests in flight. Defaults to 8.
+            max_concurrency (int, optional): Highest number of requests in flight. Defaults to 16.
+        """
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+
+        self.in_flight = 0
+        self.throttled = 0
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._cond = Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        with self._cond:
+            while True:
+                self._refill()
+                if self.in_flight < int(self.concurrency) and self._tokens >= 1:
+                    self._tokens -= 1
+                    self.in_flight += 1
+                    return
+                if self.in_flight >= int(self.concurrency):
+                    self._cond.wait()
+                else:
+                    self._cond.wait((1 - self._tokens) / self.rate)
+
+    def release(self, throttled: bool):
+        """Report the outcome of a request sent after `acquire`.
+
+        Args:
+            throttled (bool): True if the server throttled the request
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.concurrency = max(1.0, self.concurrency / 2)
+            else:
+                self.rate = min(self.max_rate, self.rate + 1 / max(self.rate, 1))
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            self._cond.notify_all()
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        base_delay: float = 0.5,
+        max_delay: float = 60.0,
+        **host_kwargs
+    ):
+        """Per-host rate limiter shared by metadata and media requests.
+
+        Args:
+            base_delay (float, optional): First retry delay in seconds, doubled on each retry. Defaults to 0.5.
+            max_delay (float, optional): Longest retry delay in seconds. Defaults to 60.0.
+            **host_kwargs: Arguments passed to `HostLimiter`
+        """
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.host_kwargs = host_kwargs
+        self.retries = 0
+        self._hosts = {}
+        self._lock = Lock()
+
+    def host(self, url: str) -> HostLimiter:
+        netloc = urlsplit(url).netloc
+        with self._lock:
+            if netloc not in self._hosts:
+                self._hosts[netloc] = HostLimiter(**self.host_kwargs)
+            return self._hosts[netloc]
+
+    def backoff(self, attempt: int, retry_after: Union[str, None] = None) -> float:
+        """Return the delay before retry number `attempt` (starting from 0).
+
+        Exponential backoff with full jitter, or the server's `Retry-After` if given.
+
+        Args:
+            attempt (int): Retry number
+            retry_after (Union[str, None], optional): Value of the Retry-After header. Defaults to None.
+
+        Returns:
+            float: Delay in seconds
+        """
+        with self._lock:
+            self.retries += 1
+        if retry_after:
+            try:
+                return min(self.max_delay, max(0.0, float(retry_after)))
+            except ValueError:
+                try:
+                    return min(self.max_delay, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+                except (TypeError, ValueError):
+                    pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def stats(self) -> dict:
+        """Return the current rate, concurrency limit and requests in flight per host."""
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {
+            netloc: {
+                'rate': round(limiter.rate, 3),
+                'concurrency': round(limiter.concurrency, 3),
+                'in_flight': limiter.in_flight,
+                'throttled': limiter.throttled,
+            }
+            for netloc, limiter in hosts.items()
+        }
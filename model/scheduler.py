@@ -0,0 +1,239 @@
+from concurrent.futures import Future
+from itertools import count
+from pathlib import Path
+from queue import PriorityQueue
+from threading import Lock, Thread
+from typing import TextIO, Union
+from urllib.parse import urlsplit
+import json
+import sys
+import time
+
+from tqdm import tqdm
+
+from model.logger import logging
+from model.utils import download
+
+
+class BandwidthLimiter:
+    def __init__(self, rate: float):
+        """Token bucket limiting throughput to `rate` bytes per second.
+
+        Args:
+            rate (float): Bytes per second
+        """
+        self.rate = rate
+        self._allowance = 0.0
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def consume(self, nbytes: int):
+        """Account for `nbytes` transferred, sleeping if the cap is exceeded."""
+        with self._lock:
+            now = time.monotonic()
+            # Allow at most one second of burst
+            self._allowance = min(self.rate, self._allowance + (now - self._updated) * self.rate) - nbytes
+            self._updated = now
+            delay = -self._allowance / self.rate if self._allowance < 0 else 0
+        if delay > 0:
+            time.sleep(delay)
+
+
+class _Progress:
+    # Per-transfer progress handed to `utils.download`, reporting to the scheduler
+    def __init__(self, scheduler: 'DownloadScheduler', job: dict, total: Union[int, None], initial: int):
+        self.scheduler = scheduler
+        self.job = job
+        self.total = total
+        self.n = initial
+        self._last_event = 0.0
+        scheduler._on_start(job, total, initial)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def update(self, n: int):
+        self.n += n
+        self.scheduler._on_progress(self, n)
+
+
+class DownloadScheduler:
+    def __init__(
+        self,
+        max_transfers: int = 4,
+        bandwidth: float = None,
+        host_bandwidth: float = None,
+        progress: str = 'bar',
+        event_stream: TextIO = None
+    ):
+        """Global download scheduler. Downloads are queued by priority and run by at
+        most `max_transfers` workers, optionally capped in bandwidth, and reported
+        through one aggregated progress bar or a JSON lines event stream.
+
+        Args:
+            max_transfers (int, optional): Maximum number of concurrent transfers. Defaults to 4.
+            bandwidth (float, optional): Global cap in bytes per second. Defaults to None (no cap).
+            host_bandwidth (float, optional): Cap per data host in bytes per second. Defaults to None (no cap).
+            progress (str, optional): 'bar' for one aggregated progress bar, 'events' for JSON lines, 'none' to disable. Defaults to 'bar'.
+            event_stream (TextIO, optional): Stream receiving events when `progress` is 'events'. Defaults to stdout.
+        """
+        self.max_transfers = max(1, int(max_transfers))
+        self.bandwidth = BandwidthLimiter(bandwidth) if bandwidth else None
+        self.host_bandwidth = host_bandwidth
+        self.progress = progress
+        self.event_stream = event_stream or sys.stdout
+
+        self.queue = PriorityQueue()
+        self._seq = count()
+        self._hosts = {}
+        self._lock = Lock()
+        self._bar = None
+        self._active = 0
+        self._started = time.monotonic()
+        self._workers = [Thread(target=self._worker, daemon=True) for _ in range(self.max_transfers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, url: str, dest: Union[str, Path], size: int = None, priority: int = 0) -> Future:
+        """Queue a download.
+
+        Args:
+            url (str): Download link
+            dest (Union[str, Path]): Destination file
+            size (int, optional): Expected size in bytes. Defaults to None.
+            priority (int, optional): Lower values are downloaded first. Defaults to 0.
+
+        Returns:
+            Future: Resolves to the destination path
+        """
+        future = Future()
+        job = {'id': next(self._seq), 'url': url, 'dest': Path(dest), 'size': size, 'future': future}
+        self.queue.put((priority, job['id'], job))
+        self._emit('queued', job, priority=priority)
+        return future
+
+    def download(self, url: str, dest: Union[str, Path], size: int = None, priority: int = 0) -> Path:
+        """Queue a download and wait for it to finish.
+
+        Raises:
+            Exception: Whatever `utils.download` raised
+
+        Returns:
+            Path: Destination file
+        """
+        return self.submit(url, dest, size, priority).result()
+
+    def close(self):
+        """Close the aggregated progress bar. Queued downloads keep running."""
+        with self._lock:
+            if self._bar is not None:
+                self._bar.close()
+                self._bar = None
+
+    def _host_limiter(self, url: str) -> Union[BandwidthLimiter, None]:
+        if not self.host_bandwidth:
+            return None
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = BandwidthLimiter(self.host_bandwidth)
+            return self._hosts[host]
+
+    def _worker(self):
+        while True:
+            _, _, job = self.queue.get()
+            if not job['future'].set_running_or_notify_cancel():
+                continue
+            job['limiter'] = self._host_limiter(job['url'])
+            with self._lock:
+                self._active += 1
+            try:
+                path = download(
+                    job['url'],
+                    job['dest'],
+                    job['size'],
+                    progress=lambda desc, total, initial: _Progress(self, job, total, initial)
+                )
+            except BaseException as e:
+                logging.error(f'Failed to download {job["dest"].name}: {e}')
+                self._emit('error', job, error=str(e))
+                job['future'].set_exception(e)
+            else:
+                self._emit('done', job)
+                job['future'].set_result(path)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    if self._bar is not None:
+                        self._bar.set_postfix(active=self._active, refresh=False)
+
+    def _on_start(self, job: dict, total: Union[int, None], initial: int):
+        self._emit('start', job, total=total, initial=initial)
+        if self.progress != 'bar':
+            return
+        with self._lock:
+            if self._bar is None:
+                self._bar = tqdm(unit='B', unit_scale=True, unit_divisor=1024, total=0, desc='Downloads')
+            self._bar.total += total or 0
+            self._bar.update(initial)
+            self._bar.set_postfix(active=self._active)
+
+    def _on_progress(self, progress: _Progress, n: int):
+        if self.bandwidth is not None:
+            self.bandwidth.consume(n)
+        if progress.job['limiter'] is not None:
+            progress.job['limiter'].consume(n)
+
+        if self.progress == 'bar':
+            with self._lock:
+                self._bar.update(n)
+        elif self.progress == 'events':
+            now = time.monotonic()
+            if now - progress._last_event >= 1 or progress.n == progress.total:
+                progress._last_event = now
+                self._emit('progress', progress.job, bytes=progress.n, total=progress.total)
+
+    def _emit(self, event: str, job: dict, **fields):
+        if self.progress != 'events':
+            return
+        record = {'event': event, 'job': job['id'], 'dest': str(job['dest']), 'time': round(time.monotonic() - self._started, 3)}
+        record.update(fields)
+        with self._lock:
+            self.event_stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.event_stream.flush()
+
+
+_scheduler = None
+_scheduler_lock = Lock()
+
+
+def get_scheduler() -> DownloadScheduler:
+    """Return the process-wide download scheduler, creating it on first use.
+
+    Returns:
+        DownloadScheduler: Shared scheduler
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = DownloadScheduler()
+    return _scheduler
+
+
+def configure_scheduler(**kwargs) -> DownloadScheduler:
+    """Replace the shared scheduler. Must be called before any download is queued.
+
+    Args:
+        **kwargs: Arguments passed to `DownloadScheduler`
+
+    Returns:
+        DownloadScheduler: New shared scheduler
+    """
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = DownloadScheduler(**kwargs)
+    return _scheduler
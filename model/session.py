@@ -0,0 +1,189 @@
+from threading import Lock
+from typing import Union
+from urllib.parse import urlsplit
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from model.metrics import get_metrics, url_kind
+from model.ratelimit import RateLimiter, RETRY_STATUS_CODES, THROTTLE_STATUS_CODES
+
+
+DEFAULT_TIMEOUT = (10, 60)  # (connect, read) in seconds
+DEFAULT_HEADERS = {
+    'Connection': 'keep-alive',
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) CSN-crawler',
+}
+
+
+class Session:
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 16,
+        timeout: Union[float, tuple] = DEFAULT_TIMEOUT,
+        retries: int = 5,
+        rate_limiter: RateLimiter = None
+    ):
+        """Initialize a pooled HTTP session shared by all model classes.
+
+        Connections are kept alive and pooled per host, so consecutive requests
+        to chiasenhac.vn and its data hosts reuse established TCP/TLS connections.
+
+        Args:
+            pool_connections (int, optional): Number of hosts to keep a connection pool for. Defaults to 10.
+            pool_maxsize (int, optional): Maximum number of connections kept per host. Defaults to 16.
+            timeout (Union[float, tuple], optional): Default timeout, either a number or (connect, read). Defaults to DEFAULT_TIMEOUT.
+            retries (int, optional): Default number of retries on connection errors and retryable status codes. Defaults to 5.
+            rate_limiter (RateLimiter, optional): Per-host rate limiter. Defaults to a new RateLimiter.
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.retries = retries
+        self.rate_limiter = rate_limiter or RateLimiter(max_concurrency=pool_maxsize)
+
+        self._session = requests.Session()
+        self._session.headers.update(DEFAULT_HEADERS)
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=False
+        )
+        self._session.mount('https://', self._adapter)
+        self._session.mount('http://', self._adapter)
+
+    def request(self, method: str, url: str, retries: int = None, **kwargs) -> requests.Response:
+        """Send a request through the shared connection pool and rate limiter.
+
+        Connection errors and retryable status codes (429, 5xx) are retried with
+        exponential backoff, honoring `Retry-After`. A slot of the host's concurrency
+        limit is held until the response headers are received.
+
+        Args:
+            method (str): HTTP method
+            url (str): URL
+            retries (int, optional): Number of retries. Defaults to the session's.
+
+        Raises:
+            requests.RequestException: If the last attempt failed to connect
+
+        Returns:
+            requests.Response: Response of the last attempt
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        retries = self.retries if retries is None else retries
+        limiter = self.rate_limiter.host(url)
+        metrics = get_metrics()
+        kind = url_kind(method, url) if metrics is not None else None
+        host = urlsplit(url).netloc
+
+        attempt = 0
+        while True:
+            limiter.acquire()
+            start = time.perf_counter()
+            try:
+                resp = self._session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                limiter.release(throttled=True)
+                if metrics is not None:
+                    metrics.inc('csn_request_errors_total', kind=kind)
+                    self._record_limits(metrics, host, limiter)
+                if attempt >= retries:
+                    raise
+                if metrics is not None:
+                    metrics.inc('csn_retries_total', kind=kind)
+                time.sleep(self.rate_limiter.backoff(attempt))
+                attempt += 1
+                continue
+            except Exception:
+                limiter.release(throttled=False)
+                raise
+            limiter.release(throttled=resp.status_code in THROTTLE_STATUS_CODES)
+            if metrics is not None:
+                # Until the headers are parsed: DNS, connect, TLS and server time. Streamed bodies are not included.
+                metrics.observe('csn_response_headers_seconds', resp.elapsed.total_seconds(), kind=kind)
+                metrics.observe('csn_request_seconds', time.perf_counter() - start, kind=kind)
+                metrics.inc('csn_responses_total', kind=kind, code=resp.status_code)
+                self._record_limits(metrics, host, limiter)
+
+            if resp.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                return resp
+            if metrics is not None:
+                metrics.inc('csn_retries_total', kind=kind)
+            resp.close()
+            time.sleep(self.rate_limiter.backoff(attempt, resp.headers.get('Retry-After')))
+            attempt += 1
+
+    def _record_limits(self, metrics, host: str, limiter):
+        # Current AIMD state of the host's rate limiter
+        metrics.set('csn_host_rate', round(limiter.rate, 3), host=host)
+        metrics.set('csn_host_concurrency', round(limiter.concurrency, 3), host=host)
+        metrics.set('csn_host_throttled', limiter.throttled, host=host)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        # Like requests.head, do not follow redirects: unavailable qualities answer 302
+        kwargs.setdefault('allow_redirects', False)
+        return self.request('HEAD', url, **kwargs)
+
+    def stats(self) -> dict:
+        """Return connection reuse statistics per host.
+
+        Returns:
+            dict: Mapping of host to number of requests, new connections and reused connections
+        """
+        pools = self._adapter.poolmanager.pools
+        res = {}
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f'{key.key_scheme}://{key.key_host}'
+            entry = res.setdefault(host, {'requests': 0, 'connections': 0, 'reused': 0})
+            entry['requests'] += pool.num_requests
+            entry['connections'] += pool.num_connections
+            entry['reused'] += max(pool.num_requests - pool.num_connections, 0)
+        return res
+
+    def close(self):
+        self._session.close()
+
+
+_session = None
+_session_lock = Lock()
+
+
+def get_session() -> Session:
+    """Return the process-wide shared session, creating it on first use.
+
+    Returns:
+        Session: Shared session
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = Session()
+    return _session
+
+
+def configure_session(**kwargs) -> Session:
+    """Replace the shared session with one using the given pool settings.
+
+    Args:
+        **kwargs: Arguments passed to `Session`
+
+    Returns:
+        Session: New shared session
+    """
+    global _session
+    with _session_lock:
+        old = _session
+        _session = Session(**kwargs)
+    if old is not None:
+        old.close()
+    return _session
@@ -1,12 +1,12 @@
 from pathlib import Path
 from typing import Union
 
-import requests
-from bs4 import BeautifulSoup
-
 from model.exceptions import *
 from model.logger import logging
-from model.utils import is_error, download, extract_id, get
+from model.parser import parse_track
+from model.quality import find_download_link
+from model.scheduler import get_scheduler
+from model.utils import get, site_url
 
 
 DOWNLOAD_QUALITIES = {
@@ -34,67 +34,27 @@ class Track:
             Error: Unknown errors
         """
         self.track_id = track_id
-        
+
         # Parse page
         try:
-            page = get(f'https://chiasenhac.vn/mp3/{self.track_id}.html')
+            page = get(site_url(f'/mp3/{self.track_id}.html'))
         except NetworkError as e:
             logging.error(f'Failed to get info of track {self.track_id}.')
             raise e
 
-        soup = BeautifulSoup(page.text, 'html.parser')
-        wrapper = soup.findChildren(class_='wrapper_content')[0]
-        container = wrapper.findChildren(class_='container', recursive=False)[0]
-        
-        # Check for error
-        error_code = is_error(container)
-        if error_code == '404':
-            raise NotFoundError(f'Song id {self.track_id} not found.')
-        elif error_code != False:
-            raise Error(f'Unknown error. Code: {error_code}')
-        
+        info = parse_track(page.text, self.track_id)
+
         # Get info
         logging.info(f'Getting info of track {self.track_id}.')
-        card_body = container.findAll(class_='card-body')[0]
-
-        # Get song title
-        self.song_title = card_body.findAll(class_='card-title')[0].text
-
-        # Get artists, composers, album and year info
-        info_list = card_body.find('ul')
-        self.artists = []
-        self.artist_ids = []
-        self.composers = None
-        self.album = None
-        self.album_id = None
-        self.published_year = None
-        
-        for item in info_list.findAll('li'):
-            text = item.text
-            if text[:text.find(':')] == 'Ca sĩ':
-                artists = item.findAll('a')
-                for artist in artists:
-                    self.artists.append(artist.text)
-                    if 'tim-kiem?q' in artist['href']:
-                        continue
-                    self.artist_ids.append(extract_id(artist['href']))
-            elif text[:text.find(':')] == 'Sáng tác':
-                self.composers = text[text.find(':') + 2:]
-            elif text[:text.find(':')] == 'Năm phát hành':
-                self.published_year = int(text[text.rfind(' ') + 1:])
-            elif text[:text.find(':')] == 'Album':
-                self.album = text[text.find(':') + 2:]
-                self.album_id = extract_id(item.findAll('a')[0]['href'])
-
-        # Get download link
-        download_items = soup.findChildren(class_='download_item')
-        _download_link = download_items[0]['href']
-        # Filename
-        filename = _download_link.split('/')[-1]
-        self.filename = filename[:filename.rfind('.')]
-        # Base download path
-        base_download_path = _download_link[:_download_link.rfind('/')]
-        self.base_download_path = base_download_path[:base_download_path.rfind('/')]
+        self.song_title = info['song_title']
+        self.artists = info['artists']
+        self.artist_ids = info['artist_ids']
+        self.composers = info['composers']
+        self.album = info['album']
+        self.album_id = info['album_id']
+        self.published_year = info['published_year']
+        self.filename = info['filename']
+        self.base_download_path = info['base_download_path']
 
     @property
     def artists_name(self):
@@ -111,6 +71,8 @@ class Track:
         save_dir: Union[str, Path],
         quality_id: int = 0,
         number: str = '',
+        database=None,
+        priority: int = 0,
     ):
         """Download track to specified directory. If chosen quality is not available,
         automatically downgrade to highest one available.
@@ -119,6 +81,8 @@ class Track:
             save_dir (Union[str, Path]): Destination directory
             quality_id (int, optional): Quality ID. 0 = Lossless FLAC, 1 = M4A 500kbps, 2 = MP3 320kbps, 3 = MP3 128kbps, 4 = M4A 32kbps. Defaults to 0.
             number (str): Numbering (for album). Default to ''.
+            database (Database, optional): Database used to cache available qualities. Defaults to None.
+            priority (int, optional): Priority in the download scheduler, lower values first. Defaults to 0.
         Raises:
             InvalidQualityError: `quality_id` not in range [0, 4]
             NotFoundError: No download links available
@@ -131,28 +95,23 @@ class Track:
         # Create directory
         Path.mkdir(Path(save_dir).parent, exist_ok=True)
 
-        # Try download with specified quality.
+        # Find best available quality, starting with specified quality.
+        quality_id, download_link, resp = find_download_link(
+            self.track_id,
+            self.base_download_path,
+            self.filename,
+            DOWNLOAD_QUALITIES,
+            quality_id,
+            database
+        )
         quality, extension = DOWNLOAD_QUALITIES[quality_id]
-        download_link = f'{self.base_download_path}/{quality}/{self.filename}{extension}'
-        resp = requests.head(download_link)
-        while resp.status_code in [404, 302] and quality_id < 4:
-            # If specified quality is not available for current track, try lower quality
-            logging.warning(f'Download link for quality "{quality}" of track {self.track_id} returned 404 error. Trying lower quality.')
-            quality_id += 1
-            quality, extension = DOWNLOAD_QUALITIES[quality_id]
-            download_link = f'{self.base_download_path}/{quality}/{self.filename}{extension}'
-            resp = requests.head(download_link)
-        
-        if resp.status_code in [404, 302]:
-            raise NotFoundError(f'Cannot find available download link for {self.track_id}.')
-        elif resp.status_code >= 400:
-            raise Error(f'Unknown error.')
 
         # Download
         logging.info(f'Downloading track {self.track_id} with quality {quality}.')
         filename = f'{number}{self.artists_name} - {self.song_title} [{self.track_id}]{extension}'
         download_path = Path(save_dir) / filename
-        download(download_link, download_path)
+        size = int(resp.headers['Content-Length']) if 'Content-Length' in resp.headers else None
+        get_scheduler().download(download_link, download_path, size, priority)
         logging.info(f'Downloaded track {self.track_id} to {str(download_path.absolute())}.')
 
         return download_path
@@ -1,5 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from pathlib import Path
-from typing import Union
+from threading import Lock
+from typing import Callable, Iterable, Iterator, Union
+import glob
+import hashlib
+import os
 import time
 
 import requests
@@ -8,6 +14,19 @@ from bs4.element import Tag
 from tqdm import tqdm
 
 from model.exceptions import *
+from model.logger import logging
+from model.cache import ResponseCache
+from model.metrics import get_metrics, url_kind
+from model.ratelimit import RETRY_STATUS_CODES
+from model.session import get_session
+
+
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024  # 1 MiB
+DOWNLOAD_SEGMENTS = 1  # Parallel connections per large download, 1 disables segmenting
+SEGMENT_THRESHOLD = 32 * 1024 * 1024  # 32 MiB
+BASE_URL = 'https://chiasenhac.vn'  # Site pages are fetched from here
+
+_cache = None
 
 def is_error(container: Tag):
     # Check for error
@@ -18,15 +37,274 @@ def is_error(container: Tag):
     return False
 
 
-def download(url: str, dest: Union[Path, str]):
-    filename = Path(dest).name
-    size = int(requests.head(url).headers['Content-Length'])
+def _content_size(resp: requests.Response, offset: int) -> Union[int, None]:
+    # Total size from a full (200) or ranged (206) GET response
+    if resp.headers.get('Content-Encoding', 'identity') != 'identity':
+        # Content-Length is the size of the encoded body
+        return None
+    if resp.status_code == 206 and '/' in resp.headers.get('Content-Range', ''):
+        total = resp.headers['Content-Range'].split('/')[-1]
+        return int(total) if total.isdigit() else None
+    if 'Content-Length' in resp.headers:
+        return int(resp.headers['Content-Length']) + (offset if resp.status_code == 206 else 0)
+    return None
+
+
+def _copy_stream(src: requests.Response, write: Callable, buffer_size: int):
+    # Calls `write` with chunks of at most `buffer_size` bytes until the body is consumed
+    if src.headers.get('Content-Encoding', 'identity') != 'identity':
+        # requests opens the raw stream with decode_content=False, decode it here
+        while True:
+            chunk = src.raw.read(buffer_size, decode_content=True)
+            if not chunk:
+                break
+            write(memoryview(chunk))
+        return
+
+    # Plain bodies are read into one reusable buffer
+    buf = bytearray(buffer_size)
+    view = memoryview(buf)
+    while True:
+        n = src.raw.readinto(view)
+        if not n:
+            break
+        write(view[:n])
+
+
+def progress_bar(name: str, total: Union[int, None], initial: int) -> tqdm:
+    """Default progress display of `download`, one bar per file."""
+    return tqdm(unit='B', unit_scale=True, unit_divisor=1024, total=total, initial=initial, desc=name)
+
+
+def _pwrite(fd: int, data: memoryview, offset: int, lock: Lock):
+    if hasattr(os, 'pwrite'):
+        while len(data) > 0:
+            n = os.pwrite(fd, data, offset)
+            data, offset = data[n:], offset + n
+    else:
+        with lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            while len(data) > 0:
+                data = data[os.write(fd, data):]
+
+
+def _download_segment(
+    session,
+    url: str,
+    fd: int,
+    start: int,
+    end: int,
+    buffer_size: int,
+    progress,
+    lock: Lock,
+    retries: int
+) -> int:
+    # Download bytes [start, end] into `fd`, retrying from the last written byte
+    pos = start
+    attempt = 0
+    while True:
+        def write(view: memoryview):
+            nonlocal pos
+            _pwrite(fd, view, pos, lock)
+            pos += len(view)
+            with lock:
+                progress.update(len(view))
+
+        try:
+            with session.get(url, stream=True, headers={'Range': f'bytes={pos}-{end}'}) as src:
+                if src.status_code != 206:
+                    raise Error(f'Failed to download bytes {pos}-{end} of {url}. Code: {src.status_code}')
+                _copy_stream(src, write, buffer_size)
+        except (requests.RequestException, Error) as e:
+            error = e
+        else:
+            if pos > end:
+                return pos - start
+            error = Error(f'Connection closed after byte {pos - 1} of segment {start}-{end}.')
+
+        if attempt >= retries:
+            raise Error(f'Failed to download segment {start}-{end} of {url}: {error}')
+        attempt += 1
+        logging.warning(f'Retrying segment {start}-{end} of {url} from byte {pos} ({attempt}/{retries}).')
+
+
+def _download_segmented(
+    session,
+    url: str,
+    dest: Path,
+    size: int,
+    segments: int,
+    buffer_size: int,
+    progress: Callable = None,
+    retries: int = 5
+) -> bool:
+    """Download `url` as `segments` byte ranges fetched in parallel and written
+    directly into a preallocated file.
+
+    Returns:
+        bool: False if the server does not support range requests, nothing is written then
+    """
+    with session.get(url, stream=True, headers={'Range': 'bytes=0-0'}) as src:
+        if src.status_code != 206:
+            return False
+
+    tmp = dest.with_name(dest.name + '.segments.part')
+    segment_size = -(-size // segments)
+    ranges = [(start, min(size, start + segment_size) - 1) for start in range(0, size, segment_size)]
+    lock = Lock()
+
+    fd = os.open(tmp, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+    try:
+        os.ftruncate(fd, size)
+        with (progress or progress_bar)(dest.name, size, 0) as bar, \
+                ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [
+                executor.submit(_download_segment, session, url, fd, start, end, buffer_size, bar, lock, retries)
+                for start, end in ranges
+            ]
+            written = sum(future.result() for future in futures)
+    finally:
+        os.close(fd)
+
+    if written != size or tmp.stat().st_size != size:
+        raise Error(f'Downloaded size of {dest.name} does not match. Expected {size}, got {written}.')
+    os.replace(tmp, dest)
+    return True
+
+
+def _part_path(dest: Path, url: str) -> Path:
+    # Partial files are tied to their link, so a partial file of one quality is
+    # never resumed from the link of another quality saved to the same name
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+    return dest.with_name(f'{dest.name}.{digest}.part')
+
+
+def _remove_stale_parts(dest: Path):
+    # Partial files of other links of a completed download
+    for part in dest.parent.glob(glob.escape(dest.name) + '.' + '[0-9a-f]' * 16 + '.part'):
+        part.unlink(missing_ok=True)
+
+
+def _record_transfer(start: float, nbytes: int):
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.observe('csn_transfer_seconds', time.perf_counter() - start, kind='media_get')
+        metrics.inc('csn_bytes_total', nbytes, kind='media_get')
+
+
+def download(
+    url: str,
+    dest: Union[Path, str],
+    size: int = None,
+    buffer_size: int = DOWNLOAD_BUFFER_SIZE,
+    segments: int = None,
+    segment_threshold: int = None,
+    progress: Callable = None
+) -> Path:
+    """Download `url` to `dest`. Data is written to a `.part` file named after `dest`
+    and `url` first, which is renamed to `dest` once complete. An existing `.part`
+    file of the same `url` is resumed with a `Range` request when the server supports
+    it, and an existing `dest` with the expected size is not downloaded again.
+
+    Files of at least `segment_threshold` bytes can be split into `segments` byte
+    ranges fetched over parallel connections, if the server supports ranges.
+
+    Args:
+        url (str): Download link
+        dest (Union[Path, str]): Destination file
+        size (int, optional): Expected size, e.g. from a previous HEAD response. Read from the GET response if None.
+        buffer_size (int, optional): Read buffer size in bytes. Defaults to DOWNLOAD_BUFFER_SIZE.
+        segments (int, optional): Number of parallel connections for large files. Defaults to DOWNLOAD_SEGMENTS.
+        segment_threshold (int, optional): Minimum size in bytes of segmented downloads. Defaults to SEGMENT_THRESHOLD.
+        progress (Callable, optional): Called as `progress(name, total, initial)`, returns a context manager with `update(n)`. Defaults to `progress_bar`.
+
+    Raises:
+        Error: Server error or size mismatch after download
 
-    with requests.get(url, stream=True) as src, \
-            open(dest, 'wb') as f, \
-            tqdm(unit='B', unit_scale=True, unit_divisor=1024, total=size, desc=filename) as progress:
-        for chunk in src.iter_content(chunk_size=4096):
-            progress.update(f.write(chunk))
+    Returns:
+        Path: Destination file
+    """
+    dest = Path(dest)
+    part = _part_path(dest, url)
+    session = get_session()
+    start = time.perf_counter()
+
+    if dest.exists():
+        if size is None:
+            size = int(session.head(url).headers['Content-Length'])
+        if dest.stat().st_size == size:
+            logging.info(f'{dest.name} already downloaded. Skipped.')
+            return dest
+
+    segments = DOWNLOAD_SEGMENTS if segments is None else segments
+    segment_threshold = SEGMENT_THRESHOLD if segment_threshold is None else segment_threshold
+    # Interrupted single stream downloads are resumed instead
+    if segments > 1 and not part.exists():
+        if size is None:
+            resp = session.head(url)
+            size = int(resp.headers['Content-Length']) if 'Content-Length' in resp.headers else None
+        if size is not None and size >= segment_threshold and \
+                _download_segmented(session, url, dest, size, segments, buffer_size, progress):
+            _record_transfer(start, size)
+            _remove_stale_parts(dest)
+            return dest
+
+    offset = part.stat().st_size if part.exists() else 0
+    if size is not None and offset > size:
+        offset = 0
+
+    if size is None or offset < size:
+        headers = {'Range': f'bytes={offset}-'} if offset > 0 else {}
+        with session.get(url, stream=True, headers=headers) as src:
+            if src.status_code == 416 and offset > 0:
+                # Partial file is already complete
+                size = offset if size is None else size
+            elif src.status_code >= 400:
+                raise Error(f'Failed to download {url}. Code: {src.status_code}')
+            else:
+                if offset > 0 and src.status_code != 206:
+                    # Server ignored the Range header, restart from the beginning
+                    offset = 0
+                size = _content_size(src, offset) if size is None else size
+
+                with open(part, 'ab' if offset > 0 else 'wb') as f, \
+                        (progress or progress_bar)(dest.name, size, offset) as bar:
+                    _copy_stream(src, lambda view: bar.update(f.write(view)), buffer_size)
+
+    if size is not None and part.stat().st_size != size:
+        raise Error(f'Downloaded size of {dest.name} does not match. Expected {size}, got {part.stat().st_size}.')
+    _record_transfer(start, part.stat().st_size - offset)
+    os.replace(part, dest)
+    _remove_stale_parts(dest)
+    return dest
+
+
+def configure_segments(segments: int, segment_threshold: int = None):
+    """Set the default number of parallel connections used by `download` for large files.
+
+    Args:
+        segments (int): Number of connections, 1 disables segmented downloads
+        segment_threshold (int, optional): Minimum size in bytes of segmented downloads. Defaults to unchanged.
+    """
+    global DOWNLOAD_SEGMENTS, SEGMENT_THRESHOLD
+    DOWNLOAD_SEGMENTS = max(1, int(segments))
+    if segment_threshold is not None:
+        SEGMENT_THRESHOLD = segment_threshold
+
+
+def set_base_url(url: str):
+    """Fetch site pages from `url` instead of https://chiasenhac.vn, e.g. a mirror or a local stand-in.
+
+    Args:
+        url (str): Scheme and host, e.g. http://127.0.0.1:8000
+    """
+    global BASE_URL
+    BASE_URL = url.rstrip('/')
+
+
+def site_url(path: str) -> str:
+    """Return the URL of a site page, e.g. `site_url('/mp3/xxx.html')`."""
+    return BASE_URL + path
 
 
 def extract_id(url: str):
@@ -34,15 +312,86 @@ def extract_id(url: str):
     res = res[res.rfind('-') + 1 : res.rfind('.')]
     return res
 
+def enable_cache(directory: Union[Path, str], **kwargs) -> ResponseCache:
+    """Enable the on-disk cache of pages fetched by `get`.
+
+    Args:
+        directory (Union[Path, str]): Cache directory
+        **kwargs: Arguments passed to `ResponseCache`
+
+    Returns:
+        ResponseCache: Cache
+    """
+    global _cache
+    _cache = ResponseCache(directory, **kwargs)
+    return _cache
+
+
+def disable_cache():
+    global _cache
+    _cache = None
+
+
+def get_cache() -> Union[ResponseCache, None]:
+    return _cache
+
+
 def get(url: str, retry: int = 5) -> requests.Response:
-    consecutive_count = 0
-    while True:
-        try:
-            page = requests.get(url)
-            break
-        except Exception as e:
-            time.sleep(1)
-            consecutive_count += 1
-            if consecutive_count > retry:
-                raise NetworkError
+    cache = _cache
+    entry = cache.lookup(url) if cache is not None else None
+    if entry is not None and cache.is_fresh(entry):
+        cache.record(hit=True)
+        return entry.to_response()
+    headers = entry.validators() if entry is not None else {}
+
+    try:
+        page = get_session().get(url, headers=headers, retries=retry)
+    except requests.RequestException:
+        raise NetworkError
+    if page.status_code in RETRY_STATUS_CODES:
+        raise NetworkError
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.inc('csn_bytes_total', len(page.content), kind=url_kind('GET', url))
+
+    if cache is not None:
+        if page.status_code == 304 and entry is not None:
+            cache.refresh(url, entry)
+            cache.record(hit=True)
+            return entry.to_response()
+        cache.record(hit=False)
+        if page.status_code == 200:
+            cache.store(url, page)
     return page
+
+
+def head(url: str) -> requests.Response:
+    return get_session().head(url)
+
+
+def iter_concurrent(func: Callable, items: Iterable, max_workers: int = 8) -> Iterator:
+    """Apply `func` to every item using a bounded thread pool and yield the results
+    in the same order as `items`. At most `max_workers` calls are in flight at a time.
+
+    Args:
+        func (Callable): Function to apply
+        items (Iterable): Input items
+        max_workers (int, optional): Maximum number of concurrent calls. Defaults to 8.
+
+    Yields:
+        Results of `func`, in input order
+    """
+    max_workers = max(1, int(max_workers))
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -1,12 +1,12 @@
 from pathlib import Path
 from typing import Union
 
-import requests
-from bs4 import BeautifulSoup
-
 from model.exceptions import *
 from model.logger import logging
-from model.utils import is_error, download, extract_id, get
+from model.parser import parse_video
+from model.quality import find_download_link
+from model.scheduler import get_scheduler
+from model.utils import get, site_url
 
 
 DOWNLOAD_QUALITIES = {
@@ -34,60 +34,25 @@ class Video:
             Error: Unknown errors
         """
         self.video_id = video_id
-        
+
         # Parse page
         try:
-            page = get(f'https://chiasenhac.vn/hd/{self.video_id}.html')
+            page = get(site_url(f'/hd/{self.video_id}.html'))
         except NetworkError as e:
             logging.error(f'Failed to get info of video {self.video_id}.')
             raise e
 
-        soup = BeautifulSoup(page.text, 'html.parser')
-        wrapper = soup.findChildren(class_='wrapper_content')[0]
-        container = wrapper.findChildren(class_='container', recursive=False)[0]
-        
-        # Check for error
-        error_code = is_error(container)
-        if error_code == '404':
-            raise NotFoundError(f'Video id {self.video_id} not found.')
-        elif error_code != False:
-            raise Error(f'Unknown error. Code: {error_code}')
-        
+        info = parse_video(page.text, self.video_id)
+
         # Get info
-        logging.info(f'Getting info of track {self.video_id}.')
-        card_body = container.findAll(class_='card-body')[0]
-
-        # Get video title
-        self.video_title = card_body.findAll(class_='card-title')[0].text
-
-        # Get artists, composers, album and year info
-        info_list = card_body.find('ul')
-        self.artists = []
-        self.artist_ids = []
-        self.composers = None
-        self.published_year = None
-        
-        for item in info_list.findAll('li'):
-            text = item.text
-            if text[:text.find(':')] == 'Ca sĩ':
-                artists = item.findAll('a')
-                for artist in artists:
-                    self.artists.append(artist.text)
-                    self.artist_ids.append(extract_id(artist['href']))
-            elif text[:text.find(':')] == 'Sáng tác':
-                self.composers = text[text.find(':') + 2:]
-            elif text[:text.find(':')] == 'Năm phát hành':
-                self.published_year = int(text[text.rfind(' ') + 1:])
-
-        # Get download link
-        download_items = soup.findChildren(class_='download_item')
-        _download_link = download_items[0]['href']
-        # Filename
-        filename = _download_link.split('/')[-1]
-        self.filename = filename[:filename.rfind('.')]
-        # Base download path
-        base_download_path = _download_link[:_download_link.rfind('/')]
-        self.base_download_path = base_download_path[:base_download_path.rfind('/')]
+        logging.info(f'Getting info of video {self.video_id}.')
+        self.video_title = info['video_title']
+        self.artists = info['artists']
+        self.artist_ids = info['artist_ids']
+        self.composers = info['composers']
+        self.published_year = info['published_year']
+        self.filename = info['filename']
+        self.base_download_path = info['base_download_path']
 
     @property
     def artists_name(self):
@@ -103,6 +68,8 @@ class Video:
         self,
         save_dir: Union[str, Path],
         quality_id: int = 0,
+        database=None,
+        priority: int = 0,
     ):
         """Download video to specified directory. If chosen quality is not available,
         automatically downgrade to highest one available.
@@ -110,6 +77,8 @@ class Video:
         Args:
             save_dir (Union[str, Path]): Destination directory
             quality_id (int, optional): Quality ID. 0 = 10880p, 1 = 720p, 2 = 480p, 3 = 360p, 4 = 180p. Defaults to 0.
+            database (Database, optional): Database used to cache available qualities. Defaults to None.
+            priority (int, optional): Priority in the download scheduler, lower values first. Defaults to 0.
         Raises:
             InvalidQualityError: `quality_id` not in range [0, 4]
             NotFoundError: No download links available
@@ -122,28 +91,23 @@ class Video:
         # Create directory
         Path.mkdir(Path(save_dir).parent, exist_ok=True)
 
-        # Try download with specified quality.
+        # Find best available quality, starting with specified quality.
+        quality_id, download_link, resp = find_download_link(
+            self.video_id,
+            self.base_download_path,
+            self.filename,
+            DOWNLOAD_QUALITIES,
+            quality_id,
+            database
+        )
         quality, extension = DOWNLOAD_QUALITIES[quality_id]
-        download_link = f'{self.base_download_path}/{quality}/{self.filename}{extension}'
-        resp = requests.head(download_link)
-        while resp.status_code in [404, 302] and quality_id < 4:
-            # If specified quality is not available for current track, try lower quality
-            logging.warning(f'Download link for quality "{quality}" of video {self.video_id} returned 404 error. Trying lower quality.')
-            quality_id += 1
-            quality, extension = DOWNLOAD_QUALITIES[quality_id]
-            download_link = f'{self.base_download_path}/{quality}/{self.filename}{extension}'
-            resp = requests.head(download_link)
-        
-        if resp.status_code in [404, 302]:
-            raise NotFoundError(f'Cannot find available download link for {self.video_id}.')
-        elif resp.status_code >= 400:
-            raise Error(f'Unknown error.')
 
         # Download
         logging.info(f'Downloading video {self.video_id} with quality {quality}.')
         filename = f'{self.artists_name} - {self.video_title} [{self.video_id}]{extension}'
         download_path = Path(save_dir) / filename
-        download(download_link, download_path)
+        size = int(resp.headers['Content-Length']) if 'Content-Length' in resp.headers else None
+        get_scheduler().download(download_link, download_path, size, priority)
         logging.info(f'Downloaded video {self.video_id} to {str(download_path.absolute())}.')
 
         return download_path
@@ -32,3 +32,115 @@ def test_artist2():
     
     song = Track(random.choice(list(songs)))
     assert a_id in song.artist_ids
+
+
+class FakePage:
+    def __init__(self, text):
+        self.text = text
+
+
+def fake_tab_page(page_idx, number_of_pages=3):
+    pagination = ''.join(f'<li>{i + 1}</li>' for i in range(number_of_pages))
+    songs = ''.join(
+        f'<div class="media"><div class="media-title"><a href="/mp3/a/song-ts{page_idx}x{i}.html">Song</a></div></div>'
+        for i in range(3)
+    )
+    return FakePage(f'<ul class="pagination">{pagination}</ul>{songs}')
+
+
+def test_artist_concurrent_pagination(monkeypatch):
+    requested = []
+
+    def fake_get(url):
+        requested.append(url)
+        page_idx = int(url.split('page=')[1].split('&')[0]) if 'page=' in url else 1
+        return fake_tab_page(page_idx)
+
+    monkeypatch.setattr('model.artist.get', fake_get)
+    artist = Artist.__new__(Artist)
+    artist.artist_id, artist.artist_id_number, artist.artist_name = 'zss', 1, 'Test'
+    artist.max_workers = 2
+
+    songs = artist.get_all_songs()
+    assert songs == {f'ts{p}x{i}' for p in range(1, 4) for i in range(3)}
+    # First page is reused instead of being fetched twice
+    assert len(requested) == 3
+    assert not any('page=1&' in url for url in requested)
+
+
+def test_artist_iter_songs_streams(monkeypatch):
+    requested = []
+
+    def fake_get(url):
+        requested.append(url)
+        page_idx = int(url.split('page=')[1].split('&')[0]) if 'page=' in url else 1
+        # Pages 2 and 3 list the same songs
+        return fake_tab_page(min(page_idx, 2), number_of_pages=10)
+
+    monkeypatch.setattr('model.artist.get', fake_get)
+    artist = Artist.__new__(Artist)
+    artist.artist_id, artist.artist_id_number, artist.artist_name = 'zss', 1, 'Test'
+    artist.max_workers = 2
+
+    # Items of the first page are available before later pages are fetched
+    songs = artist.iter_songs()
+    assert [next(songs) for _ in range(3)] == ['ts1x0', 'ts1x1', 'ts1x2']
+    assert len(requested) <= 3
+    songs.close()
+
+    ids = list(artist.iter_songs())
+    assert ids == [f'ts{p}x{i}' for p in (1, 2) for i in range(3)]
+
+
+def test_artist_incremental_sync(monkeypatch, tmp_path):
+    from model.database import Database
+
+    requested = []
+    releases = {'count': 0}
+
+    def fake_get(url):
+        requested.append(url)
+        page_idx = int(url.split('page=')[1].split('&')[0]) if 'page=' in url else 1
+        # New releases are prepended to the first page
+        new = ''.join(
+            f'<div class="media"><div class="media-title"><a href="/mp3/a/new-tsnew{i}.html">New</a></div></div>'
+            for i in range(releases['count'])
+        ) if page_idx == 1 else ''
+        return FakePage(new + fake_tab_page(page_idx).text)
+
+    monkeypatch.setattr('model.artist.get', fake_get)
+    artist = Artist.__new__(Artist)
+    artist.artist_id, artist.artist_id_number, artist.artist_name = 'zss', 1, 'Test'
+    artist.max_workers = 2
+
+    db = Database(str(tmp_path / 'test.db'))
+    try:
+        # First sync is a full sweep
+        songs = artist.sync_songs(db)
+        assert len(songs) == 9
+        assert len(requested) == 3
+
+        # Items are listed again until they are recorded
+        requested.clear()
+        assert artist.sync_songs(db) == songs
+        assert len(requested) == 3
+        db.add_artist_items('zss', 'music', songs)
+
+        # Nothing new: only the first page is read
+        requested.clear()
+        assert artist.sync_songs(db) == set()
+        assert len(requested) == 1
+
+        releases['count'] = 2
+        requested.clear()
+        assert artist.sync_songs(db) == {'tsnew0', 'tsnew1'}
+        assert len(requested) == 1
+        db.add_artist_items('zss', 'music', ['tsnew0', 'tsnew1'])
+
+        # Full sweep again once the interval has passed
+        requested.clear()
+        assert artist.sync_songs(db, full_sync_interval=0) == set()
+        assert len(requested) == 3
+    finally:
+        db.close()
+        db.join()
@@ -0,0 +1,146 @@
+from tempfile import TemporaryDirectory
+from pathlib import Path
+import sys
+sys.path.append('./')
+
+from model import batch
+from model.batch import ArtistSync, MediaJobs, expand, read_manifest
+from model.database import Database
+from model.exceptions import NetworkError, NotFoundError
+
+
+def test_read_manifest():
+    lines = [
+        '# Favourites\n',
+        'https://chiasenhac.vn/mp3/ngo-kien-huy-thu-thuy/dinh-menh-ta-gap-nhau-ts36t0tbqkfnfq.html\n',
+        '\n',
+        'https://chiasenhac.vn/nghe-album/cham-tay-vao-dieu-uoc-xssmqqr0q8eean.html\n',
+        'https://chiasenhac.vn/mp3/ngo-kien-huy-thu-thuy/dinh-menh-ta-gap-nhau-ts36t0tbqkfnfq.html?playlist=1\n',
+        'https://chiasenhac.vn/ca-si/khanh-phuong-zsswzmq7q918et.html\n',
+        'https://chiasenhac.vn/hd/video/us-uk-video-clip/tones-and-i-dance-monkey-vs3zvdrrq12maa.html\n',
+        'https://example.com/unsupported.html\n',
+    ]
+    assert read_manifest(lines) == [
+        ('track', 'ts36t0tbqkfnfq'),
+        ('album', 'xssmqqr0q8eean'),
+        ('artist', 'zsswzmq7q918et'),
+        ('video', 'vs3zvdrrq12maa'),
+    ]
+
+
+class FakeAlbum:
+    def __init__(self, album_id):
+        if album_id == 'missing':
+            raise NotFoundError(f'Album id {album_id} not found.')
+        self.album_id = album_id
+        self.tracklist = [{'id': f'ts{i}', 'number': i} for i in range(1, 11)]
+
+
+def test_expand(monkeypatch):
+    monkeypatch.setattr(batch, 'Album', FakeAlbum)
+
+    assert expand(('track', 'ts1')) == [('ts1', 'track', '', 0)]
+    jobs = expand(('album', 'xs1'))
+    assert jobs[0] == ('ts1', 'track', '01. ', 1)
+    assert jobs[-1] == ('ts10', 'track', '10. ', 10)
+    assert expand(('album', 'missing')) == []
+
+
+class FakeArtist:
+    def __init__(self, artist_id, max_workers=8):
+        self.artist_id = artist_id
+
+    def iter_songs(self):
+        yield 'ts1'
+        # Second tab page fails
+        raise NetworkError
+
+    def iter_albums(self):
+        yield from ('xs1', 'missing', 'xs2')
+
+    def iter_videos(self):
+        yield 'vs1'
+
+
+def test_expand_artist_listing_errors(monkeypatch):
+    monkeypatch.setattr(batch, 'Album', FakeAlbum)
+    monkeypatch.setattr(batch, 'Artist', FakeArtist)
+
+    jobs = list(expand(('artist', 'zs1'), discography=True, videos=True))
+    assert jobs[0] == ('ts1', 'track', '', 0)
+    assert len(jobs) == 1 + 20 + 1
+    assert jobs[-1] == ('vs1', 'video', '', 0)
+
+
+class FakeMedia:
+    def __init__(self, media_id):
+        self.media_id = media_id
+        self.artists_name = 'Artist'
+        self.song_title = self.video_title = media_id
+
+    def download(self, save_dir, quality_id=0, number='', database=None, priority=0):
+        path = Path(save_dir) / f'{number}{self.media_id}'
+        path.write_bytes(b'x')
+        return path
+
+
+def test_media_jobs():
+    with TemporaryDirectory() as temp_dir:
+        jobs = MediaJobs(Path(temp_dir) / 'out', media=lambda kind, media_id: FakeMedia(media_id))
+        listing = [('ts1', 'track', '01. ', 1), ('ts2', 'track', '02. ', 2), ('ts1', 'track', '', 0), ('vs1', 'video', '', 0)]
+        stats = jobs.run(listing)
+        assert stats.downloaded == 3
+        assert (jobs.listed, len(jobs.seen)) == (4, 3)
+        assert sorted(Path(path).name for path in jobs.paths) == ['01. ts1', '02. ts2', 'vs1']
+
+
+class FakeSyncArtist:
+    def __init__(self):
+        self.artist_id = 'zs1'
+        self.songs = {'ts1', 'ts2'}
+
+    def sync_songs(self, database):
+        return self.songs - database.get_artist_items(self.artist_id, 'music')
+
+    def sync_albums(self, database):
+        return {'xs1', 'missing'} - database.get_artist_items(self.artist_id, 'album')
+
+    def sync_videos(self, database):
+        raise NetworkError
+
+
+def test_artist_sync(monkeypatch):
+    monkeypatch.setattr(batch, 'Album', FakeAlbum)
+    artist = FakeSyncArtist()
+    with TemporaryDirectory() as temp_dir:
+        db = Database(str(Path(temp_dir) / 'test.db'))
+        try:
+            fail = {'ts2'}
+
+            def media(kind, media_id):
+                if media_id in fail:
+                    raise NetworkError
+                # Downloads are recorded on the catalog rows
+                db.execute('INSERT OR IGNORE INTO tracks (id) VALUES (?)', (media_id,))
+                return FakeMedia(media_id)
+
+            sync = ArtistSync(artist, db, discography=True, videos=True)
+            jobs = MediaJobs(Path(temp_dir) / 'out', database=db, media=media)
+            stats = jobs.run(sync.iter_jobs())
+            # Album xs1 lists ts1 to ts10
+            assert stats.downloaded == 9
+            # ts2 failed, so neither the song nor album xs1 listing it is recorded
+            assert sync.commit() == 1
+            assert db.get_artist_items('zs1', 'music') == {'ts1'}
+            assert db.get_artist_items('zs1', 'album') == set()
+
+            fail.clear()
+            sync = ArtistSync(artist, db, discography=True)
+            jobs = MediaJobs(Path(temp_dir) / 'out', database=db, media=media)
+            stats = jobs.run(sync.iter_jobs())
+            assert stats.downloaded == 1
+            assert sync.commit() == 2
+            assert db.get_artist_items('zs1', 'album') == {'xs1'}
+        finally:
+            db.close()
+            db.join()
@@ -0,0 +1,87 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import TemporaryDirectory
+from threading import Thread
+import os
+import re
+import sys
+sys.path.append('./')
+
+import pytest
+
+from model import utils
+from model.cache import ResponseCache
+
+
+BODY = 'Lặng Yêu'.encode('utf-8') * 100
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.requests = []
+    thread = Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_cache_hit_and_revalidation(server):
+    temp_dir = TemporaryDirectory()
+    cache = utils.enable_cache(temp_dir.name, ttls=[(re.compile('/expired/'), 0)], default_ttl=3600)
+    try:
+        base = f'http://127.0.0.1:{server.server_address[1]}'
+
+        assert utils.get(f'{base}/mp3/a.html').text == BODY.decode('utf-8')
+        assert utils.get(f'{base}/mp3/a.html').text == BODY.decode('utf-8')
+        assert server.requests == [None]
+
+        # Expired entries are revalidated with their ETag
+        utils.get(f'{base}/expired/a.html')
+        page = utils.get(f'{base}/expired/a.html')
+        assert page.text == BODY.decode('utf-8')
+        assert server.requests == [None, None, '"v1"']
+        assert cache.stats()['hits'] == 2
+        assert cache.stats()['misses'] == 2
+        assert cache.stats()['revalidated'] == 1
+    finally:
+        utils.disable_cache()
+
+
+def test_cache_eviction():
+    temp_dir = TemporaryDirectory()
+    cache = ResponseCache(temp_dir.name, max_size=3000)
+
+    class FakeResponse:
+        url = 'https://chiasenhac.vn/mp3/a.html'
+        status_code = 200
+        encoding = 'utf-8'
+        headers = {}
+        content = os.urandom(1024)
+
+    for i in range(5):
+        cache.store(f'https://chiasenhac.vn/mp3/{i}.html', FakeResponse())
+    assert cache.stats()['size'] <= 3000
+    assert cache.lookup('https://chiasenhac.vn/mp3/4.html') is not None
+    assert cache.lookup('https://chiasenhac.vn/mp3/0.html') is None
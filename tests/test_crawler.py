@@ -0,0 +1,125 @@
+from collections import Counter
+from tempfile import TemporaryDirectory
+from pathlib import Path
+import sys
+sys.path.append('./')
+
+import pytest
+
+import model.crawler
+from model.crawler import Crawler, url_kind
+from model.database import Database
+from model.exceptions import NotFoundError
+
+
+ARTISTS = {'a1': {'albums': {'x1'}, 'songs': {'t1', 't2'}, 'videos': {'v1'}}}
+ALBUMS = {'x1': ['t1', 't3']}
+TRACKS = {'t1': (['a1', 'a2'], 'x1'), 't2': (['a1'], None), 't3': (['a2'], 'x1')}
+VIDEOS = {'v1': ['a1']}
+
+fetched = Counter()
+
+
+class FakeArtist:
+    def __init__(self, artist_id):
+        fetched[('artist', artist_id)] += 1
+        if artist_id not in ARTISTS:
+            raise NotFoundError(f'Artist {artist_id} not found.')
+        self.artist_id = artist_id
+
+    def get_all_albums(self):
+        return ARTISTS[self.artist_id]['albums']
+
+    def get_all_songs(self):
+        return ARTISTS[self.artist_id]['songs']
+
+    def get_all_videos(self):
+        return ARTISTS[self.artist_id]['videos']
+
+
+class FakeAlbum:
+    def __init__(self, album_id):
+        fetched[('album', album_id)] += 1
+        self.album_id = album_id
+        self.tracklist = [{'id': track_id} for track_id in ALBUMS[album_id]]
+
+
+class FakeTrack:
+    def __init__(self, track_id):
+        fetched[('track', track_id)] += 1
+        self.track_id = track_id
+        self.artist_ids, self.album_id = TRACKS[track_id]
+
+
+class FakeVideo:
+    def __init__(self, video_id):
+        fetched[('video', video_id)] += 1
+        self.video_id = video_id
+        self.artist_ids = VIDEOS[video_id]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fetched.clear()
+    monkeypatch.setattr(model.crawler, 'Artist', FakeArtist)
+    monkeypatch.setattr(model.crawler, 'Album', FakeAlbum)
+    monkeypatch.setattr(model.crawler, 'Track', FakeTrack)
+    monkeypatch.setattr(model.crawler, 'Video', FakeVideo)
+
+    temp_dir = TemporaryDirectory()
+    database = Database(str(Path(temp_dir.name) / 'test.db'))
+    for method in ('upsert_artist', 'upsert_album', 'upsert_track', 'upsert_video'):
+        monkeypatch.setattr(database, method, lambda obj: None)
+    yield database
+    database.close()
+    database.join()
+    temp_dir.cleanup()
+
+
+def test_url_kind():
+    assert url_kind('https://chiasenhac.vn/ca-si/son-tung-m-tp-zs1.html') == 'artist'
+    assert url_kind('https://chiasenhac.vn/nghe-album/xx.html') == 'album'
+    assert url_kind('https://chiasenhac.vn/mp3/xx.html') == 'track'
+    assert url_kind('https://chiasenhac.vn/hd/xx.html') == 'video'
+    with pytest.raises(ValueError):
+        url_kind('https://chiasenhac.vn/')
+
+
+def test_crawl(db):
+    crawler = Crawler(db, max_workers=4)
+    crawler.seed(['https://chiasenhac.vn/ca-si/a1.html'])
+    stats = crawler.run()
+
+    assert (stats['done'], stats['missing'], stats['failed']) == (6, 1, 0)
+    assert set(fetched) == {
+        ('artist', 'a1'), ('artist', 'a2'), ('album', 'x1'),
+        ('track', 't1'), ('track', 't2'), ('track', 't3'), ('video', 'v1')
+    }
+    assert all(count == 1 for count in fetched.values())
+    assert db.get_crawl_stats() == {'done': 6, 'missing': 1}
+    # Breadth first: depth of a page is its shortest distance from the seed
+    assert dict(((kind, page_id), depth) for kind, page_id, depth in db.select(
+        'SELECT kind, id, depth FROM crawl_frontier'
+    )) == {
+        ('artist', 'a1'): 0, ('album', 'x1'): 1, ('track', 't1'): 1, ('track', 't2'): 1,
+        ('video', 'v1'): 1, ('artist', 'a2'): 2, ('track', 't3'): 2
+    }
+
+
+def test_crawl_resumes(db):
+    crawler = Crawler(db, max_workers=2, checkpoint_interval=2)
+    crawler.seed(['https://chiasenhac.vn/ca-si/a1.html'])
+    assert crawler.run(limit=3)['done'] == 3
+
+    # A new crawler on the same database continues from the stored frontier
+    stats = Crawler(db, max_workers=2).run()
+    assert stats['done'] + stats['missing'] == 4
+    assert all(count == 1 for count in fetched.values())
+    assert Crawler(db).run()['done'] == 0
+
+
+def test_crawl_max_depth(db):
+    crawler = Crawler(db, max_depth=1, videos=False)
+    crawler.seed(['https://chiasenhac.vn/ca-si/a1.html'])
+    assert crawler.run()['done'] == 4
+    assert ('artist', 'a2') not in fetched and ('video', 'v1') not in fetched
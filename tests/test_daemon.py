@@ -0,0 +1,187 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import TemporaryDirectory
+from threading import Event, Thread, enumerate as threads
+from pathlib import Path
+import sys
+import time
+sys.path.append('./')
+
+import pytest
+import requests
+
+from model import daemon, session, utils
+from model.utils import set_base_url
+from model.daemon import JobManager, make_server
+from model.database import Database
+from model.exceptions import NetworkError, QueueFullError
+from model.ratelimit import RateLimiter
+
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+DATA = b'x' * 4096
+gate = Event()
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    # Stand-in for chiasenhac.vn and its data hosts
+    protocol_version = 'HTTP/1.1'
+
+    def _page(self, name: str) -> bytes:
+        text = (FIXTURES / name).read_text(encoding='utf-8')
+        base = f'http://{self.headers["Host"]}'
+        return text.replace('https://data3.chiasenhac.com', base).encode('utf-8')
+
+    def _respond(self, head: bool):
+        if self.path.startswith('/mp3/'):
+            body = self._page('track.html')
+        elif self.path.startswith('/nghe-album/'):
+            body = self._page('album.html')
+        elif self.path.startswith('/downloads/'):
+            gate.wait(10)
+            body = DATA
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond(head=False)
+
+    def do_HEAD(self):
+        self._respond(head=True)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(httpd):
+    thread = Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return f'http://127.0.0.1:{httpd.server_address[1]}'
+
+
+@pytest.fixture
+def site(monkeypatch):
+    gate.set()
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), SiteHandler)
+    base_url = serve(httpd)
+    default_base_url = utils.BASE_URL
+    set_base_url(base_url)
+    # The stand-in is a single host, lift the politeness limit of 10 requests per second
+    monkeypatch.setattr(session, '_session', session.Session(rate_limiter=RateLimiter(rate=1000, max_rate=1000)))
+    yield base_url
+    set_base_url(default_base_url)
+    gate.set()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def wait(api, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = requests.get(f'{api}/jobs/{job_id}').json()
+        if job['state'] in ('done', 'failed', 'cancelled'):
+            return job
+        time.sleep(0.05)
+    raise TimeoutError(job_id)
+
+
+def test_daemon_jobs(site):
+    with TemporaryDirectory() as temp_dir:
+        database = Database(str(Path(temp_dir) / 'csn.db'))
+        manager = JobManager(Path(temp_dir) / 'out', database, max_queued=1)
+        httpd = make_server(manager, port=0)
+        api = serve(httpd)
+        try:
+            resp = requests.post(f'{api}/jobs', json={'url': 'https://chiasenhac.vn/mp3/tu-minh-hy/lang-yeu-ts3w7z5wq9t1h9.html'})
+            assert resp.status_code == 201
+            job = wait(api, resp.json()['id'])
+            assert job['state'] == 'done'
+            assert job['downloaded'] == 1
+            assert Path(job['files'][0]).read_bytes() == DATA
+
+            # Album tracks are listed once, the metadata of the track above stays in memory
+            resp = requests.post(f'{api}/jobs', json={'url': 'https://chiasenhac.vn/nghe-album/hoa-hong-co-gai-xsswv5zqq92h1e.html', 'quality': 3})
+            job = wait(api, resp.json()['id'])
+            assert job['state'] == 'done'
+            assert job['items'] == 10
+            assert job['downloaded'] == 10
+            assert job['files'][0].endswith('.mp3')
+
+            status = requests.get(f'{api}/status').json()
+            assert status['jobs'] == {'done': 2}
+            assert status['metadata_cache']['size'] == 11
+            assert status['rate_limits'][site[len('http://'):]]['throttled'] == 0
+
+            assert requests.post(f'{api}/jobs', json={'url': 'https://example.com/x.html'}).status_code == 400
+            assert requests.get(f'{api}/jobs/99').status_code == 404
+            assert len(requests.get(f'{api}/jobs').json()) == 2
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            manager.close()
+            database.close()
+            database.join()
+
+
+def test_daemon_queue_and_cancel(site):
+    gate.clear()
+    with TemporaryDirectory() as temp_dir:
+        manager = JobManager(temp_dir, max_queued=1)
+        httpd = make_server(manager, port=0)
+        api = serve(httpd)
+        try:
+            url = 'https://chiasenhac.vn/mp3/tu-minh-hy/lang-yeu-ts3w7z5wq9t1h9.html'
+            running = requests.post(f'{api}/jobs', json={'url': url}).json()
+            while manager.get(running['id']).state == 'queued':
+                time.sleep(0.01)
+
+            queued = requests.post(f'{api}/jobs', json={'url': url, 'priority': 1}).json()
+            assert queued['state'] == 'queued'
+            resp = requests.post(f'{api}/jobs', json={'url': url})
+            assert resp.status_code == 503
+            with pytest.raises(QueueFullError):
+                manager.submit(url)
+
+            resp = requests.delete(f'{api}/jobs/{queued["id"]}')
+            assert resp.status_code == 200
+            assert resp.json()['state'] == 'cancelled'
+            assert requests.post(f'{api}/jobs', json={'url': url}).status_code == 201
+
+            gate.set()
+            assert wait(api, running['id'])['state'] == 'done'
+            assert requests.delete(f'{api}/jobs/{running["id"]}').status_code == 409
+        finally:
+            gate.set()
+            httpd.shutdown()
+            httpd.server_close()
+            manager.close()
+
+
+def test_daemon_failed_listing(site, monkeypatch):
+    def expand(entry, *args):
+        yield ('ts3w7z5wq9t1h9', 'track', '', 0)
+        raise NetworkError
+
+    monkeypatch.setattr(daemon, 'expand', expand)
+    with TemporaryDirectory() as temp_dir:
+        manager = JobManager(temp_dir)
+        try:
+            job = manager.submit('https://chiasenhac.vn/ca-si/khanh-phuong-zsswzmq7q918et.html')
+            deadline = time.monotonic() + 10
+            while job.state not in ('done', 'failed', 'cancelled') and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert job.state == 'failed'
+            assert job.error
+            # The item listed before the error is still downloaded
+            assert len(job.files) == 1
+            # and the pipeline workers of the job are gone
+            assert not [t for t in threads() if '_metadata_worker' in t.name or '_download_worker' in t.name]
+        finally:
+            manager.close()
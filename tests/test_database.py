@@ -0,0 +1,207 @@
+from tempfile import TemporaryDirectory
+from pathlib import Path
+import sys
+sys.path.append('./')
+
+import pytest
+
+from model.database import Database
+
+
+@pytest.fixture
+def db():
+    temp_dir = TemporaryDirectory()
+    database = Database(str(Path(temp_dir.name) / 'test.db'))
+    yield database
+    database.close()
+    database.join()
+    temp_dir.cleanup()
+
+
+def test_available_qualities(db):
+    assert db.get_available_qualities('ts1') is None
+    db.set_available_qualities('ts1', [3, 1, 2])
+    assert db.get_available_qualities('ts1') == [1, 2, 3]
+    db.set_available_qualities('ts1', [])
+    assert db.get_available_qualities('ts1') == []
+
+
+def test_executemany_batches(db):
+    rows = [(f'ts{i}', f'Track {i}') for i in range(10000)]
+    db.executemany('INSERT INTO tracks (id, name) VALUES (?, ?)', rows)
+    for i in range(10):
+        db.execute('INSERT INTO albums (id, name) VALUES (?, ?)', (f'xs{i}', f'Album {i}'))
+    # Failing statements do not abort the rest of the batch
+    db.execute('INSERT INTO tracks (id, name) VALUES (?, ?)', ('ts0', 'Duplicate'))
+    db.execute('INSERT INTO albums (id, name) VALUES (?, ?)', ('xs10', 'Album 10'))
+
+    assert list(db.select('SELECT count(*) FROM tracks')) == [(10000,)]
+    assert list(db.select('SELECT count(*) FROM albums')) == [(11,)]
+    assert list(db.select('SELECT name FROM tracks WHERE id = ?', ('ts0',))) == [('Track 0',)]
+
+
+def test_upserts_and_lookups(db):
+    from types import SimpleNamespace
+
+    temp_dir = TemporaryDirectory()
+    album = SimpleNamespace(album_id='xs1', album_name='Hoa Hồng Có Gai', year_published=2008, tracklist=[
+        {'id': 'ts1', 'title': 'Lặng Yêu', 'number': 1},
+        {'id': 'ts2', 'title': 'Hoa Hồng Có Gai', 'number': 2},
+    ])
+    track = SimpleNamespace(
+        track_id='ts1', song_title='Lặng Yêu', composers='Duy Anh', album_id='xs1', album='Hoa Hồng Có Gai',
+        published_year=2008, base_download_path='https://data/x', filename='Lang Yeu', artist_ids=['zs1', 'zs2']
+    )
+
+    # Upserts are idempotent
+    for _ in range(2):
+        db.upsert_album(album)
+        db.upsert_track(track)
+
+    assert db.tracks_for_album('xs1') == [('ts1', 1, 'Lặng Yêu', None), ('ts2', 2, 'Hoa Hồng Có Gai', None)]
+    assert db.tracks_for_artist('zs2') == [('ts1', 'Lặng Yêu', None)]
+    assert list(db.select('SELECT count(*) FROM artists_tracks')) == [(2,)]
+
+    assert not db.is_downloaded('ts1')
+    path = Path(temp_dir.name) / 'Lặng Yêu.flac'
+    path.write_bytes(b'flac')
+    db.mark_track_downloaded('ts1', path)
+    assert db.is_downloaded('ts1')
+    path.unlink()
+    assert not db.is_downloaded('ts1')
+
+
+def test_select_chunks():
+    temp_dir = TemporaryDirectory()
+    database = Database(str(Path(temp_dir.name) / 'test.db'), select_chunk_size=7)
+    database.executemany('INSERT INTO tracks (id, name) VALUES (?, ?)', [(f'ts{i:03}', f'Track {i}') for i in range(100)])
+    assert list(database.select('SELECT id FROM tracks ORDER BY id')) == [(f'ts{i:03}',) for i in range(100)]
+    assert list(database.select('SELECT id FROM tracks WHERE id = ?', ('missing',))) == []
+    database.close()
+    database.join()
+    temp_dir.cleanup()
+
+
+def test_submit(db):
+    import apsw
+
+    assert db.submit('INSERT INTO albums (id, name) VALUES (?, ?)', ('xs1', 'Album 1')).result() == 1
+    future = db.submit('INSERT INTO tracks (id, name) VALUES (?, ?)', [(f'ts{i}', 'Track') for i in range(5)], many=True)
+    assert future.result() == 5
+    # A failing statement fails its own future only
+    failed = db.submit('INSERT INTO albums (id, name) VALUES (?, ?)', ('xs1', 'Duplicate'))
+    updated = db.submit('UPDATE tracks SET name = ?', ('Renamed',))
+    with pytest.raises(apsw.ConstraintError):
+        failed.result()
+    assert updated.result() == 5
+
+
+def test_readers_do_not_block_writes(db):
+    assert list(db.select('PRAGMA journal_mode')) == [('wal',)]
+
+    db.executemany('INSERT INTO tracks (id, name) VALUES (?, ?)', [(f'ts{i}', 'Track') for i in range(100)])
+    rows = db.select('SELECT id FROM tracks')
+    assert next(rows) == ('ts0',)
+    # A write commits while a read transaction is open, the reader keeps its snapshot
+    assert db.submit('DELETE FROM tracks').result(timeout=5) == 100
+    assert len(list(rows)) == 99
+
+    # Selects see writes queued before them
+    db.execute('INSERT INTO albums (id, name) VALUES (?, ?)', ('xs1', 'Album'))
+    assert list(db.select('SELECT name FROM albums WHERE id = ?', ('xs1',))) == [('Album',)]
+    assert list(db.select('SELECT count(*) FROM tracks')) == [(0,)]
+
+
+def test_select_on_writer_thread():
+    temp_dir = TemporaryDirectory()
+    database = Database(str(Path(temp_dir.name) / 'test.db'), readers=0)
+    database.execute('INSERT INTO albums (id, name) VALUES (?, ?)', ('xs1', 'Album'))
+    assert list(database.select('SELECT name FROM albums')) == [('Album',)]
+    database.close()
+    database.join()
+    temp_dir.cleanup()
+
+
+def test_select_errors_are_raised(db):
+    import apsw
+
+    # A failed read must not look like missing rows
+    with pytest.raises(apsw.SQLError):
+        list(db.select('SELECT * FROM missing'))
+    with TemporaryDirectory() as temp_dir:
+        database = Database(str(Path(temp_dir) / 'test.db'), readers=0)
+        try:
+            with pytest.raises(apsw.SQLError):
+                list(database.select('SELECT * FROM missing'))
+            assert list(database.select('PRAGMA user_version'))
+        finally:
+            database.close()
+            database.join()
+
+
+def test_migrations(db):
+    from model.database import MIGRATIONS
+
+    db.flush()
+    assert list(db.select('PRAGMA user_version')) == [(len(MIGRATIONS),)]
+    tables = {rec[0] for rec in db.select("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'tracks', 'album_tracks', 'media_qualities', 'artist_syncs', 'crawl_frontier'} <= tables
+
+
+def test_migrate_unversioned_database(tmp_path):
+    import apsw
+
+    # Database created before schema versioning, with a duplicate link
+    path = str(tmp_path / 'old.db')
+    connection = apsw.Connection(path)
+    connection.cursor().execute("""
+        CREATE TABLE tracks (id text PRIMARY KEY, name text, composer text, album_id text, year_published integer,
+            download_path text, base_download_path text, filename text);
+        CREATE TABLE album_tracks (album_id text, track_id text, track_idx integer);
+        INSERT INTO tracks (id, name) VALUES ('ts1', 'Track');
+        INSERT INTO album_tracks VALUES ('xs1', 'ts1', 1), ('xs1', 'ts1', 1);
+    """)
+    connection.close()
+
+    database = Database(path)
+    assert list(database.select('SELECT name FROM tracks')) == [('Track',)]
+    assert list(database.select('SELECT count(*) FROM album_tracks')) == [(1,)]
+    database.close()
+    database.join()
+
+
+def test_failed_migration_rolls_back(tmp_path, monkeypatch):
+    import apsw
+    import model.database
+
+    migrations = model.database.MIGRATIONS + [('broken', 'CREATE TABLE extra (id text); SELECT * FROM missing;')]
+    monkeypatch.setattr(model.database, 'MIGRATIONS', migrations)
+
+    database = Database.__new__(Database)
+    database.cursor = apsw.Connection(str(tmp_path / 'test.db')).cursor()
+    with pytest.raises(apsw.SQLError):
+        database.check_and_init_db()
+    assert database.get_schema_version() == len(migrations) - 1
+    assert not list(database.cursor.execute("SELECT name FROM sqlite_master WHERE name = 'extra'"))
+
+
+def test_failed_migration_raises_in_callers(tmp_path, monkeypatch):
+    import apsw
+    import model.database
+
+    migrations = model.database.MIGRATIONS + [('broken', 'SELECT * FROM missing;')]
+    monkeypatch.setattr(model.database, 'MIGRATIONS', migrations)
+
+    # Callers get the error instead of waiting for the stopped writer thread
+    database = Database(str(tmp_path / 'test.db'))
+    database.join(10)
+    assert not database.is_alive()
+    with pytest.raises(apsw.SQLError):
+        database.flush()
+    with pytest.raises(apsw.SQLError):
+        database.get_available_qualities('ts1')
+    with pytest.raises(apsw.SQLError):
+        list(database.select('SELECT 1', wait=False))
+    with pytest.raises(apsw.SQLError):
+        database.set_available_qualities('ts1', [0])
+    database.close()
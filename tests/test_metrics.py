@@ -0,0 +1,105 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import TemporaryDirectory
+from threading import Thread
+from pathlib import Path
+import json
+import sys
+sys.path.append('./')
+
+import pytest
+
+from model import metrics as metrics_module
+from model.metrics import Metrics, enable_metrics, disable_metrics, get_metrics, url_kind
+from model.parser import parse_track
+from model.session import Session
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'x' * 100
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def metrics():
+    yield enable_metrics()
+    disable_metrics()
+
+
+def test_url_kind():
+    assert url_kind('GET', 'https://chiasenhac.vn/mp3/a/b-ts1.html') == 'track_page'
+    assert url_kind('GET', 'https://chiasenhac.vn/nghe-album/b-xs1.html') == 'album_page'
+    assert url_kind('GET', 'https://chiasenhac.vn/tab_artist?artist_id=1&tab=music') == 'tab_artist'
+    assert url_kind('HEAD', 'https://data3.chiasenhac.com/downloads/1/2/x.flac') == 'media_head'
+    assert url_kind('GET', 'https://data3.chiasenhac.com/downloads/1/2/x.flac') == 'media_get'
+
+
+def test_export():
+    m = Metrics(buckets=(0.1, 1.0))
+    m.observe('latency', 0.05, kind='a')
+    m.observe('latency', 0.5, kind='a')
+    m.observe('latency', 5, kind='a')
+    m.inc('bytes', 10, kind='a')
+    m.inc('bytes', 5, kind='a')
+    m.set('rate', 2.5, host='a')
+    m.set('rate', 4.0, host='a')
+
+    text = m.to_prometheus()
+    assert '# TYPE latency histogram' in text
+    assert 'latency_bucket{kind="a",le="0.1"} 1' in text
+    assert 'latency_bucket{kind="a",le="1.0"} 2' in text
+    assert 'latency_bucket{kind="a",le="+Inf"} 3' in text
+    assert 'latency_count{kind="a"} 3' in text
+    assert 'bytes{kind="a"} 15' in text
+    assert '# TYPE rate gauge' in text
+    assert 'rate{host="a"} 4.0' in text
+
+    with TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / 'metrics.json'
+        m.write(path)
+        data = json.loads(path.read_text())
+    assert data['histograms'][0]['count'] == 3
+    assert data['counters'] == [{'name': 'bytes', 'labels': {'kind': 'a'}, 'value': 15}]
+
+
+def test_request_and_parse_metrics(metrics):
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        session = Session()
+        for _ in range(3):
+            session.get(f'http://127.0.0.1:{httpd.server_address[1]}/')
+        session.close()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    text = (Path(__file__).parent / 'fixtures' / 'track.html').read_text(encoding='utf-8')
+    parse_track(text, 'ts3w7z5wq9t1h9')
+
+    data = metrics.to_json()
+    histograms = {(h['name'], tuple(h['labels'].values())): h['count'] for h in data['histograms']}
+    assert histograms[('csn_request_seconds', ('media_get',))] == 3
+    assert histograms[('csn_response_headers_seconds', ('media_get',))] == 3
+    assert histograms[('csn_parse_seconds', ('parse_track',))] == 1
+    assert {'name': 'csn_responses_total', 'labels': {'code': 200, 'kind': 'media_get'}, 'value': 3} in data['counters']
+    gauges = {g['name']: g for g in data['gauges']}
+    assert gauges['csn_host_rate']['labels'] == {'host': f'127.0.0.1:{httpd.server_address[1]}'}
+    assert gauges['csn_host_throttled']['value'] == 0
+
+
+def test_disabled():
+    disable_metrics()
+    assert get_metrics() is None
+    text = (Path(__file__).parent / 'fixtures' / 'track.html').read_text(encoding='utf-8')
+    assert parse_track(text, 'ts3w7z5wq9t1h9')['song_title']
+    assert metrics_module._metrics is None
@@ -0,0 +1,267 @@
+from pathlib import Path
+import sys
+sys.path.append('./')
+
+import pytest
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+
+from model.exceptions import *
+from model import parser
+from model.utils import extract_id
+
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+BACKENDS = ['html.parser']
+if parser.DEFAULT_BACKEND == 'lxml':
+    BACKENDS.append('lxml')
+
+
+def fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding='utf-8')
+
+
+# Baseline oracle: page parsing of the model classes before it moved to model.parser,
+# kept verbatim apart from returning dicts instead of setting attributes, and the album
+# 404 message, which read a missing attribute
+
+def baseline_is_error(container: Tag):
+    # Check for error
+    error_containers = container.findChildren(class_='error-container')
+    if len(error_containers) > 0:
+        error_code = error_containers[0].findChildren(class_='text-danger')[-1].text
+        return error_code
+    return False
+
+
+def baseline_page(text: str, not_found_message: str) -> tuple:
+    soup = BeautifulSoup(text, 'html.parser')
+    wrapper = soup.findChildren(class_='wrapper_content')[0]
+    container = wrapper.findChildren(class_='container', recursive=False)[0]
+
+    # Check for error
+    error_code = baseline_is_error(container)
+    if error_code == '404':
+        raise NotFoundError(not_found_message)
+    elif error_code != False:
+        raise Error(f'Unknown error. Code: {error_code}')
+    return soup, wrapper, container
+
+
+def baseline_download_link(soup: BeautifulSoup) -> dict:
+    # Get download link
+    download_items = soup.findChildren(class_='download_item')
+    _download_link = download_items[0]['href']
+    # Filename
+    filename = _download_link.split('/')[-1]
+    # Base download path
+    base_download_path = _download_link[:_download_link.rfind('/')]
+    return {
+        'filename': filename[:filename.rfind('.')],
+        'base_download_path': base_download_path[:base_download_path.rfind('/')],
+    }
+
+
+def baseline_track(text: str, track_id: str) -> dict:
+    soup, _, container = baseline_page(text, f'Song id {track_id} not found.')
+    card_body = container.findAll(class_='card-body')[0]
+
+    # Get song title
+    info = {'song_title': card_body.findAll(class_='card-title')[0].text}
+
+    # Get artists, composers, album and year info
+    info_list = card_body.find('ul')
+    info.update(artists=[], artist_ids=[], composers=None, album=None, album_id=None, published_year=None)
+
+    for item in info_list.findAll('li'):
+        text = item.text
+        if text[:text.find(':')] == 'Ca sĩ':
+            artists = item.findAll('a')
+            for artist in artists:
+                info['artists'].append(artist.text)
+                if 'tim-kiem?q' in artist['href']:
+                    continue
+                info['artist_ids'].append(extract_id(artist['href']))
+        elif text[:text.find(':')] == 'Sáng tác':
+            info['composers'] = text[text.find(':') + 2:]
+        elif text[:text.find(':')] == 'Năm phát hành':
+            info['published_year'] = int(text[text.rfind(' ') + 1:])
+        elif text[:text.find(':')] == 'Album':
+            info['album'] = text[text.find(':') + 2:]
+            info['album_id'] = extract_id(item.findAll('a')[0]['href'])
+
+    info.update(baseline_download_link(soup))
+    return info
+
+
+def baseline_video(text: str, video_id: str) -> dict:
+    soup, _, container = baseline_page(text, f'Video id {video_id} not found.')
+    card_body = container.findAll(class_='card-body')[0]
+
+    # Get video title
+    info = {'video_title': card_body.findAll(class_='card-title')[0].text}
+
+    # Get artists, composers and year info
+    info_list = card_body.find('ul')
+    info.update(artists=[], artist_ids=[], composers=None, published_year=None)
+
+    for item in info_list.findAll('li'):
+        text = item.text
+        if text[:text.find(':')] == 'Ca sĩ':
+            artists = item.findAll('a')
+            for artist in artists:
+                info['artists'].append(artist.text)
+                info['artist_ids'].append(extract_id(artist['href']))
+        elif text[:text.find(':')] == 'Sáng tác':
+            info['composers'] = text[text.find(':') + 2:]
+        elif text[:text.find(':')] == 'Năm phát hành':
+            info['published_year'] = int(text[text.rfind(' ') + 1:])
+
+    info.update(baseline_download_link(soup))
+    return info
+
+
+def baseline_album(text: str, album_id: str) -> dict:
+    _, _, container = baseline_page(text, f'Album id {album_id} not found.')
+    card_body = container.findChildren(class_='card-details')[0].findChildren(class_='card-body')[0]
+    card_body = card_body.findAll('li')
+
+    info = {'album_name': None, 'year_published': None}
+    for item in card_body:
+        if item.text.startswith('Album: '):
+            info['album_name'] = item.text[item.text.find(':') + 2:]
+        elif item.text.startswith('Năm phát hành: '):
+            info['year_published'] = int(item.text[item.text.find(':') + 2:])
+
+    # Get track list
+    song_list = []
+    for tag in container.find(class_='d-table'):
+        if not isinstance(tag, Tag):
+            continue
+
+        if tag.attrs.get('id') is None or not tag.attrs['id'].startswith('music-listen'):
+            continue
+
+        song_no = tag.find(class_='name').find('a').text
+        song_no = int(song_no[:song_no.find('.')])
+        song_title = tag.find(class_='name').find('a')['title']
+        song_id = extract_id(tag.find(class_='list-inline-item').find('a')['href'])
+        song_list.append({
+            'title': song_title,
+            'number': song_no,
+            'id': song_id
+        })
+    info['tracklist'] = song_list
+    return info
+
+
+def baseline_artist(text: str, artist_id: str) -> dict:
+    _, wrapper, _ = baseline_page(text, f'Artist id {artist_id} not found.')
+    return {'artist_name': wrapper.findChild(class_='artist_name_box').text}
+
+
+def baseline_tab(text: str, tab: str) -> tuple:
+    soup = BeautifulSoup(text, 'html.parser')
+    pagination = soup.findAll(class_='pagination')[0]
+    number_of_pages = int(pagination.findAll('li')[-1].text)
+
+    if tab == 'music':
+        ids = [extract_id(song.findChildren(class_='media-title')[0].find('a')['href']) for song in soup.findAll(class_='media')]
+    else:
+        ids = [extract_id(card.find('a')['href']) for card in soup.findAll(class_='card-title')]
+    return number_of_pages, ids
+
+
+CORPUS = [
+    (parser.parse_track, baseline_track, 'track.html', 'ts3w7z5wq9t1h9'),
+    (parser.parse_track, baseline_track, 'track_multi.html', 'tsvq3zb5qew1qh'),
+    (parser.parse_video, baseline_video, 'video.html', 'vs3zvdrrq12maa'),
+    (parser.parse_album, baseline_album, 'album.html', 'xsswv5zqq92h1e'),
+    (parser.parse_artist, baseline_artist, 'artist.html', 'zss7twqsqtf9e4'),
+]
+TABS = [('tab_music.html', 'music'), ('tab_album.html', 'album'), ('tab_video.html', 'video')]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('func, baseline, name, item_id', CORPUS)
+def test_parser_matches_baseline(func, baseline, name, item_id, backend):
+    text = fixture(name)
+    assert func(text, item_id, backend=backend) == baseline(text, item_id)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('name, tab', TABS)
+def test_tab_parser_matches_baseline(name, tab, backend):
+    text = fixture(name)
+    assert parser.parse_tab(text, tab, backend=backend) == baseline_tab(text, tab)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_parse_error_matches_baseline(backend):
+    for func, baseline, _, item_id in CORPUS:
+        with pytest.raises(NotFoundError) as expected:
+            baseline(fixture('error.html'), item_id)
+        with pytest.raises(NotFoundError) as actual:
+            func(fixture('error.html'), item_id, backend=backend)
+        assert actual.value.message == expected.value.message
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_parse_track(backend):
+    info = parser.parse_track(fixture('track.html'), 'ts3w7z5wq9t1h9', backend=backend)
+    assert info['song_title'] == 'Lặng Yêu'
+    assert info['artists'] == ['Từ Minh Hy', 'Khánh Phương']
+    assert info['artist_ids'] == ['zss7twqsqtf9e4', 'zsswzmq7q918et']
+    assert info['composers'] == 'Duy Anh'
+    assert info['published_year'] == 2008
+    assert info['album'] == 'Hoa Hồng Có Gai'
+    assert info['album_id'] == 'xsswv5zqq92h1e'
+    assert info['filename'] == 'Lang Yeu - Tu Minh Hy_ Khanh Phuong'
+    assert info['base_download_path'] == 'https://data3.chiasenhac.com/downloads/1021/0/1020834-4ffc2b62'
+
+    info = parser.parse_track(fixture('track_multi.html'), 'tsvq3zb5qew1qh', backend=backend)
+    assert info['artists'] == ['Yanbi', 'Da Vickie', 'T-akayz']
+    assert info['artist_ids'] == ['zsswv0mzq92n81', 'zssmwv75q892th']
+    assert info['album'] is None
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_parse_video(backend):
+    assert parser.parse_video(fixture('video.html'), 'vs3zvdrrq12maa', backend=backend) == {
+        'video_title': 'Đôi Mắt',
+        'artists': ['Wanbi Tuấn Anh'],
+        'artist_ids': ['zssmc36qq8vwke'],
+        'composers': 'Nguyễn Hải Phong',
+        'published_year': 2009,
+        'filename': 'Doi Mat - Wanbi Tuan Anh',
+        'base_download_path': 'https://data17.chiasenhac.com/downloads/1003/5/1002795-1f2d9a44',
+    }
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_parse_artist(backend):
+    assert parser.parse_artist(fixture('artist.html'), 'zss7twqsqtf9e4', backend=backend) == {'artist_name': 'Từ Minh Hy'}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_parse_album(backend):
+    info = parser.parse_album(fixture('album.html'), 'xsswv5zqq92h1e', backend=backend)
+    assert info['album_name'] == 'Hoa Hồng Có Gai'
+    assert info['year_published'] == 2008
+    assert len(info['tracklist']) == 10
+    assert info['tracklist'][0] == {'title': 'Bài 1', 'number': 1, 'id': 'ts3w7z0001q'}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_parse_tab(backend):
+    number_of_pages, ids = parser.parse_tab(fixture('tab_music.html'), 'music', backend=backend)
+    assert number_of_pages == 5
+    assert len(ids) == 20
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_parse_error(backend):
+    with pytest.raises(NotFoundError):
+        parser.parse_track(fixture('error.html'), 'ts1', backend=backend)
+    with pytest.raises(NotFoundError):
+        parser.parse_album(fixture('error.html'), 'xs1', backend=backend)
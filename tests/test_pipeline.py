@@ -0,0 +1,49 @@
+from tempfile import TemporaryDirectory
+from pathlib import Path
+import sys
+import threading
+sys.path.append('./')
+
+import pytest
+
+from model.exceptions import *
+from model.pipeline import Pipeline
+
+
+def test_pipeline():
+    temp_dir = TemporaryDirectory()
+
+    def resolve(job):
+        if job == 'missing':
+            raise NotFoundError(f'{job} not found.')
+        return job.upper()
+
+    def download(job, obj):
+        if obj == 'NOLINK':
+            raise NotFoundError(f'{job} has no link.')
+        path = Path(temp_dir.name) / obj
+        path.write_bytes(b'x' * 10)
+        return path
+
+    stats = Pipeline(resolve, download, metadata_workers=3, download_workers=2).run(['a', 'b', 'missing', 'nolink', 'c'])
+    assert stats.downloaded == 3
+    assert stats.skipped == 2
+    assert stats.failed == 0
+    assert stats.bytes == 30
+    assert sorted(p.name for p in Path(temp_dir.name).iterdir()) == ['A', 'B', 'C']
+
+
+def test_pipeline_stops_workers_when_jobs_raise():
+    done = []
+
+    def jobs():
+        yield 'a'
+        yield 'b'
+        raise NetworkError
+
+    before = threading.active_count()
+    pipeline = Pipeline(lambda job: job, lambda job, obj: done.append(job), metadata_workers=3, download_workers=2)
+    with pytest.raises(NetworkError):
+        pipeline.run(jobs())
+    assert sorted(done) == ['a', 'b']
+    assert threading.active_count() == before
@@ -0,0 +1,71 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from tempfile import TemporaryDirectory
+from threading import Thread
+from pathlib import Path
+import json
+import sys
+import time
+sys.path.append('./')
+
+import pytest
+
+from model.scheduler import DownloadScheduler
+
+
+DATA = bytes(range(256)) * 128  # 32 KiB
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(DATA)))
+        self.end_headers()
+        self.wfile.write(DATA)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_scheduler_priority_and_bandwidth(server):
+    events = StringIO()
+    # One transfer at a time, each file takes about 0.5 s at 64 KiB/s
+    scheduler = DownloadScheduler(max_transfers=1, bandwidth=64 * 1024, progress='events', event_stream=events)
+    with TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        start = time.monotonic()
+        first = scheduler.submit(f'{server}/first', temp_dir / 'first')
+        time.sleep(0.1)
+        low = scheduler.submit(f'{server}/low', temp_dir / 'low', priority=5)
+        high = scheduler.submit(f'{server}/high', temp_dir / 'high', priority=1)
+
+        assert low.result(timeout=10).read_bytes() == DATA
+        assert time.monotonic() - start >= 1.2
+        assert first.result() == temp_dir / 'first'
+        assert high.result().read_bytes() == DATA
+
+    records = [json.loads(line) for line in events.getvalue().splitlines()]
+    done = [Path(record['dest']).name for record in records if record['event'] == 'done']
+    assert done == ['first', 'high', 'low']
+    progress = [record for record in records if record['event'] == 'progress']
+    assert progress[-1]['bytes'] == progress[-1]['total'] == len(DATA)
+
+
+def test_scheduler_reports_errors(server):
+    scheduler = DownloadScheduler(progress='none')
+    with TemporaryDirectory() as temp_dir:
+        future = scheduler.submit(f'{server}/file', Path(temp_dir) / 'missing' / 'file')
+        with pytest.raises(OSError):
+            future.result(timeout=10)
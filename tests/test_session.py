@@ -0,0 +1,88 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+import sys
+sys.path.append('./')
+
+import pytest
+
+from model.session import Session
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_session_reuses_connections(server):
+    session = Session(pool_maxsize=2)
+    for _ in range(5):
+        assert session.get(f'{server}/').text == 'ok'
+
+    stats = session.stats()['http://127.0.0.1']
+    assert stats['requests'] == 5
+    assert stats['connections'] == 1
+    assert stats['reused'] == 4
+    session.close()
+
+
+class ThrottlingHandler(Handler):
+    def do_GET(self):
+        self.server.count += 1
+        if self.server.count <= 2:
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        super().do_GET()
+
+
+def test_session_retries_throttled_requests():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), ThrottlingHandler)
+    httpd.count = 0
+    thread = Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        session = Session()
+        resp = session.get(f'http://127.0.0.1:{httpd.server_address[1]}/')
+        assert resp.status_code == 200
+        assert httpd.count == 3
+
+        stats = session.rate_limiter.stats()[f'127.0.0.1:{httpd.server_address[1]}']
+        assert stats['throttled'] == 2
+        assert stats['rate'] < 10
+        assert stats['in_flight'] == 0
+        assert session.rate_limiter.retries == 2
+        session.close()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_backoff():
+    from model.ratelimit import RateLimiter
+
+    limiter = RateLimiter(base_delay=1, max_delay=10)
+    assert limiter.backoff(0, '3') == 3
+    assert limiter.backoff(0, '120') == 10
+    for attempt in range(10):
+        assert 0 <= limiter.backoff(attempt) <= min(10, 2 ** attempt)
@@ -1,4 +1,6 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from tempfile import TemporaryDirectory
+from threading import Thread
 from pathlib import Path
 import sys
 sys.path.append('./')
@@ -72,3 +74,97 @@ def test_track3():
 def test_track4():
     with pytest.raises(NotFoundError):
         Track('tsvq3zb5qew1qh1')
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.qualities = {}
+
+    def get_available_qualities(self, media_id):
+        return self.qualities.get(media_id)
+
+    def set_available_qualities(self, media_id, qualities):
+        self.qualities[media_id] = sorted(qualities)
+
+    def clear_available_qualities(self, media_id):
+        del self.qualities[media_id]
+
+
+def test_find_download_link_cache(monkeypatch):
+    from model.quality import find_download_link
+    from model.track import DOWNLOAD_QUALITIES
+
+    probed = []
+
+    def fake_head(url):
+        probed.append(url)
+        return FakeResponse(200 if '/128/' in url or '/32/' in url else 404)
+
+    monkeypatch.setattr('model.quality.head', fake_head)
+    database = FakeDatabase()
+
+    quality_id, link, resp = find_download_link('ts1', 'https://data/x', 'song', DOWNLOAD_QUALITIES, 0, database)
+    assert quality_id == 3
+    assert link == 'https://data/x/128/song.mp3'
+    assert resp.status_code == 200
+    assert len(probed) == 5
+    assert database.qualities['ts1'] == [3, 4]
+
+    # Second lookup is served from the recorded availability, only the chosen link is checked
+    quality_id, link, resp = find_download_link('ts1', 'https://data/x', 'song', DOWNLOAD_QUALITIES, 4, database)
+    assert (quality_id, link, resp.status_code) == (4, 'https://data/x/32/song.m4a', 200)
+    assert len(probed) == 6
+
+    # A recorded link that disappeared is not a failure: all qualities are probed again
+    database.qualities['ts1'] = [0, 3, 4]
+    probed.clear()
+    quality_id, link, resp = find_download_link('ts1', 'https://data/x', 'song', DOWNLOAD_QUALITIES, 0, database)
+    assert (quality_id, link) == (3, 'https://data/x/128/song.mp3')
+    assert len(probed) == 1 + 5
+    assert database.qualities['ts1'] == [3, 4]
+
+    database.qualities['ts2'] = []
+    with pytest.raises(NotFoundError):
+        find_download_link('ts2', 'https://data/x', 'song', DOWNLOAD_QUALITIES, 0, database)
+
+
+class RedirectHandler(BaseHTTPRequestHandler):
+    # Data host answering 302 for the missing FLAC and M4A qualities
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        if '/flac/' in self.path or '/m4a/' in self.path:
+            self.send_response(302)
+            self.send_header('Location', '/')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_find_download_link_skips_redirected_quality(monkeypatch):
+    from model import session
+    from model.quality import find_download_link
+    from model.track import DOWNLOAD_QUALITIES
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RedirectHandler)
+    Thread(target=httpd.serve_forever, daemon=True).start()
+    monkeypatch.setattr(session, '_session', session.Session())
+    base = f'http://127.0.0.1:{httpd.server_address[1]}/downloads'
+    database = FakeDatabase()
+    try:
+        quality_id, link, resp = find_download_link('ts1', base, 'song', DOWNLOAD_QUALITIES, 0, database)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    assert quality_id == 2
+    assert link == f'{base}/320/song.mp3'
+    assert database.qualities['ts1'] == [2, 3, 4]
@@ -0,0 +1,169 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import TemporaryDirectory
+from threading import Thread
+from pathlib import Path
+import gzip
+import sys
+sys.path.append('./')
+
+import pytest
+
+from model.utils import _part_path, download, extract_id
+
+
+DATA = bytes(range(256)) * 4096
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    support_range = True
+
+    def _send_headers(self):
+        start = 0
+        range_header = self.headers.get('Range')
+        if range_header and self.support_range:
+            start, end = range_header[len('bytes='):].split('-')
+            start = int(start)
+            end = int(end) if end else len(DATA) - 1
+            body = DATA[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(DATA)}')
+        else:
+            body = DATA
+            self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes' if self.support_range else 'none')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.server.requests.append((self.command, range_header))
+        return body
+
+    def do_HEAD(self):
+        self._send_headers()
+
+    def do_GET(self):
+        self.wfile.write(self._send_headers())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.requests = []
+    thread = Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_extract_id():
+    assert extract_id('https://chiasenhac.vn/mp3/a/lang-yeu-ts3w7z5wq9t1h9.html') == 'ts3w7z5wq9t1h9'
+
+
+def test_download_resume(server):
+    temp_dir = TemporaryDirectory()
+    url = f'http://127.0.0.1:{server.server_address[1]}/file.flac'
+    dest = Path(temp_dir.name) / 'file.flac'
+
+    # Interrupted download left a partial file
+    _part_path(dest, url).write_bytes(DATA[:1000])
+    assert download(url, dest) == dest
+    assert dest.read_bytes() == DATA
+    assert not _part_path(dest, url).exists()
+    assert ('GET', 'bytes=1000-') in server.requests
+
+    # Completed file is not downloaded again
+    server.requests.clear()
+    download(url, dest)
+    assert not any(method == 'GET' for method, _ in server.requests)
+
+
+def test_download_without_range_support(server):
+    temp_dir = TemporaryDirectory()
+    Handler.support_range = False
+    try:
+        url = f'http://127.0.0.1:{server.server_address[1]}/file.flac'
+        dest = Path(temp_dir.name) / 'file.flac'
+        _part_path(dest, url).write_bytes(b'garbage')
+        download(url, dest)
+        assert dest.read_bytes() == DATA
+    finally:
+        Handler.support_range = True
+
+
+def test_download_ignores_part_of_other_link(server):
+    temp_dir = TemporaryDirectory()
+    url = f'http://127.0.0.1:{server.server_address[1]}/720/video.mp4'
+    dest = Path(temp_dir.name) / 'video.mp4'
+
+    # Interrupted download of another quality saved to the same name
+    other = _part_path(dest, f'http://127.0.0.1:{server.server_address[1]}/1080/video.mp4')
+    other.write_bytes(b'x' * 1000)
+    download(url, dest)
+    assert dest.read_bytes() == DATA
+    assert server.requests == [('GET', None)]
+    assert not other.exists()
+
+
+def test_download_single_request(server):
+    temp_dir = TemporaryDirectory()
+    url = f'http://127.0.0.1:{server.server_address[1]}/file.flac'
+    dest = Path(temp_dir.name) / 'file.flac'
+
+    download(url, dest, buffer_size=1000)
+    assert dest.read_bytes() == DATA
+    assert server.requests == [('GET', None)]
+
+
+def test_download_segmented(server):
+    temp_dir = TemporaryDirectory()
+    url = f'http://127.0.0.1:{server.server_address[1]}/video.mp4'
+    dest = Path(temp_dir.name) / 'video.mp4'
+
+    download(url, dest, size=len(DATA), segments=4, segment_threshold=0)
+    assert dest.read_bytes() == DATA
+    ranges = sorted(r for method, r in server.requests if method == 'GET' and r != 'bytes=0-0')
+    assert len(ranges) == 4
+    assert not Path(f'{dest}.segments.part').exists()
+
+
+def test_download_segmented_without_range_support(server):
+    temp_dir = TemporaryDirectory()
+    Handler.support_range = False
+    try:
+        url = f'http://127.0.0.1:{server.server_address[1]}/video.mp4'
+        dest = Path(temp_dir.name) / 'video.mp4'
+        download(url, dest, segments=4, segment_threshold=0)
+        assert dest.read_bytes() == DATA
+    finally:
+        Handler.support_range = True
+
+
+class GzipHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = gzip.compress(DATA)
+        self.send_response(200)
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_download_decodes_content_encoding():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), GzipHandler)
+    Thread(target=httpd.serve_forever, daemon=True).start()
+    temp_dir = TemporaryDirectory()
+    dest = Path(temp_dir.name) / 'file.flac'
+    try:
+        download(f'http://127.0.0.1:{httpd.server_address[1]}/file.flac', dest, buffer_size=1000)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    assert dest.read_bytes() == DATA